@@ -1,17 +1,26 @@
 import os
+import threading
+import time
 
-from flask import Flask, request
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from flask_restx import Api
 
 import te_canvas.api_ns.canvas as canvas_api
 import te_canvas.api_ns.config as config_api
 import te_canvas.api_ns.connection as connection_api
+import te_canvas.api_ns.sync as sync_api
 import te_canvas.api_ns.timeedit as timeedit_api
 import te_canvas.api_ns.version as version_api
+from te_canvas import metrics, offload, responses, retry
+from te_canvas.cache import MetadataCache
 from te_canvas.canvas import Canvas
+from te_canvas.courses import CourseCatalogue
 from te_canvas.db import DB
-from te_canvas.log import get_logger
+from te_canvas.log import NO_RATE_LIMIT, get_logger
+from te_canvas.mirror import ObjectMirror
+from te_canvas.singleflight import SharedGroup
+from te_canvas.status_feed import StatusFeed
 from te_canvas.timeedit import TimeEdit
 
 
@@ -19,7 +28,9 @@ def create_app(db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None)
     db = db or DB()
     canvas = canvas or Canvas()
     timeedit = timeedit or TimeEdit()
-    
+    timeedit.cache = timeedit.cache or MetadataCache(db)
+    timeedit.singleflight = SharedGroup(db)
+
     STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
     flask = Flask(__name__, static_folder=STATIC_PATH)
     flask.config["SECRET_KEY"] = os.urandom(128)
@@ -27,14 +38,63 @@ def create_app(db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None)
     CORS(flask)
 
     # TODO: More standard option for logging request, e.g. werkzeug logger?
-    logger = get_logger()
+    logger = get_logger(__name__)
 
     @flask.after_request
     def log_request(response):
-        logger.info("[API] Method: {}, Status: {}, URL: {}".format(request.method, response.status_code, request.url))
+        logger.info(
+            "[API] Method: %s, Status: %s, URL: %s",
+            request.method,
+            response.status_code,
+            request.url,
+            extra=NO_RATE_LIMIT,
+        )
+        return response
+
+    # --- Metrics --------------------------------------------------------------
+
+    metrics.start_snapshots()
+
+    @flask.before_request
+    def start_request():
+        g.start = time.perf_counter()
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+
+    @flask.after_request
+    def observe_request(response):
+        if "start" in g:
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - g.start,
+                method=request.method,
+                endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+                status=response.status_code,
+            )
         return response
 
+    @flask.teardown_request
+    def end_request(exc):
+        if "start" in g:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+
+    @flask.route("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
     api = Api(flask, prefix="/api")
+    api.representations["application/json"] = responses.output_json
+    flask.after_request(responses.compress)
+
+    @api.errorhandler(retry.CircuitOpenError)
+    def upstream_unavailable(e):
+        return {"message": f"{e.upstream} is temporarily unavailable"}, 503
+
+    @api.errorhandler(offload.Overloaded)
+    def overloaded(e):
+        return {"message": "Too many requests in progress, try again shortly"}, 503, {"Retry-After": "5"}
+
+    @api.errorhandler(offload.UpstreamTimeout)
+    def upstream_timeout(e):
+        return {"message": "Upstream request timed out"}, 504
 
     # --- Version --------------------------------------------------------------
 
@@ -43,7 +103,12 @@ def create_app(db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None)
 
     # --- TimeEdit -------------------------------------------------------------
 
-    timeedit_api.ns.add_resource(timeedit_api.Objects, "/objects", resource_class_kwargs={"timeedit": timeedit})
+    mirror = ObjectMirror(db, timeedit)
+    timeedit_api.ns.add_resource(
+        timeedit_api.Objects,
+        "/objects",
+        resource_class_kwargs={"timeedit": timeedit, "mirror": mirror},
+    )
     timeedit_api.ns.add_resource(timeedit_api.Object, "/object", resource_class_kwargs={"timeedit": timeedit})
     timeedit_api.ns.add_resource(
         timeedit_api.Types,
@@ -51,19 +116,34 @@ def create_app(db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None)
         resource_class_kwargs={"timeedit": timeedit, "db": db},
     )
     timeedit_api.ns.add_resource(timeedit_api.Fields, "/fields", resource_class_kwargs={"timeedit": timeedit})
+    timeedit_api.ns.add_resource(timeedit_api.Cache, "/cache", resource_class_kwargs={"timeedit": timeedit})
     api.add_namespace(timeedit_api.ns)
 
     # --- Canvas ---------------------------------------------------------------
 
-    canvas_api.ns.add_resource(canvas_api.Courses, "/courses", resource_class_kwargs={"canvas": canvas})
+    canvas_api.ns.add_resource(
+        canvas_api.Courses, "/courses", resource_class_kwargs={"courses": CourseCatalogue(db, canvas)}
+    )
     api.add_namespace(canvas_api.ns)
 
     # --- Connection -----------------------------------------------------------
 
     connection_api.ns.add_resource(connection_api.Connection, "", resource_class_kwargs={"db": db})
     connection_api.ns.add_resource(connection_api.Status, "/status", resource_class_kwargs={"db": db})
+    connection_api.ns.add_resource(connection_api.Bulk, "/bulk", resource_class_kwargs={"db": db})
+    connection_api.ns.add_resource(
+        connection_api.StatusStream,
+        "/status/stream",
+        resource_class_kwargs={"db": db, "feed": StatusFeed(db)},
+    )
     api.add_namespace(connection_api.ns)
 
+    # --- Sync -----------------------------------------------------------------
+
+    sync_api.ns.add_resource(sync_api.Runs, "/runs", resource_class_kwargs={"db": db})
+    sync_api.ns.add_resource(sync_api.Summary, "/runs/summary", resource_class_kwargs={"db": db})
+    api.add_namespace(sync_api.ns)
+
     # --- Config ---------------------------------------------------------------
 
     config_api.ns.add_resource(
@@ -76,6 +156,16 @@ def create_app(db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None)
 
     config_api.ns.add_resource(config_api.WhitelistTypes, "/whitelist-types", resource_class_kwargs={"db": db})
 
+    # Warm the metadata cache in the background, so that startup does not depend on TimeEdit
+    def warm_cache():
+        try:
+            timeedit.warm_cache(db.get_whitelist_types())
+        except Exception as e:
+            logger.warning("Failed to warm metadata cache: %s", e)
+
+    if timeedit.cache.enabled:
+        threading.Thread(target=warm_cache, name="warm-cache", daemon=True).start()
+
     return flask
 
 
@@ -1,9 +1,10 @@
-from flask_restx import Namespace, Resource
+from flask_restx import Namespace, Resource, inputs, reqparse
 
 import te_canvas.log as log
-from te_canvas.canvas import Canvas
+from te_canvas.courses import CourseCatalogue
+from te_canvas.offload import offloaded
 
-logger = log.get_logger()
+logger = log.get_logger(__name__)
 
 ns = Namespace(
     "canvas",
@@ -15,8 +16,34 @@ ns = Namespace(
 class Courses(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api, args, kwargs)
-        self.canvas = kwargs["canvas"]
+        self.courses: CourseCatalogue = kwargs["courses"]
 
+    parser = reqparse.RequestParser()
+    parser.add_argument("term", type=int)
+    parser.add_argument("search", type=str)
+    parser.add_argument("ids", type=str)
+    parser.add_argument("limit", type=inputs.int_range(1, 1000))
+    parser.add_argument("offset", type=inputs.natural)
+
+    @ns.param("term", "Only courses in this enrollment term.")
+    @ns.param("search", "Only courses whose name or course code contains this string.")
+    @ns.param("ids", "Comma separated list of course ids.")
+    @ns.param("limit", "Number of courses to return, max 1000.")
+    @ns.param("offset", "Number of courses to skip.")
+    @offloaded
     def get(self):
-        data = self.canvas.get_courses()
-        return [c.id for c in data]
+        """
+        Without parameters, get the ids of all courses. With any parameter, get a page of courses as
+        {courses: [{id, name, course_code, term_id}], total}.
+        """
+        args = self.parser.parse_args(strict=True)
+        if all(v is None for v in args.values()):
+            courses, _ = self.courses.query()
+            return [c["id"] for c in courses]
+
+        try:
+            ids = None if args["ids"] is None else [int(i) for i in args["ids"].split(",") if i]
+        except ValueError:
+            return {"message": "Invalid ids"}, 400
+        courses, total = self.courses.query(args["term"], args["search"], ids, args["limit"], args["offset"] or 0)
+        return {"courses": courses, "total": total}
@@ -1,17 +1,33 @@
+from typing import Optional
+
 from flask_restx import Namespace, Resource, reqparse
 from psycopg2.errors import NoDataFound, UniqueViolation
+from sqlalchemy.exc import IntegrityError
 
-from te_canvas.log import get_logger
+from te_canvas.conditional import conditional
 from te_canvas.db import DB
+from te_canvas.log import get_logger
+from te_canvas.offload import offloaded
 from te_canvas.timeedit import TimeEdit
 from te_canvas.types.config_type import ConfigType  # type: ignore
 
-logger = get_logger()
+logger = get_logger(__name__)
 ns = Namespace("config", description="Config API", prefix="/api")
 
 LTI_ADMIN = "http://purl.imsglobal.org/vocab/lis/v2/institution/person#Administrator"
 
 
+def metadata_version(timeedit: TimeEdit, versions: "Optional[dict[str, int]]" = None):
+    """
+    Version of data depending on TimeEdit metadata and the given data versions, for
+    conditional.conditional, or None if the metadata cache is disabled.
+    """
+    cache_version = timeedit.cache.version() if timeedit.cache is not None else None
+    if cache_version is None:
+        return None
+    return [cache_version, versions]
+
+
 class Ok(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api, args, kwargs)
@@ -96,11 +112,11 @@ class Template(Resource):
 
     @ns.param("default", "Should we get default template?")
     @ns.param("canvas_group", "Canvas group")
+    @conditional(lambda self: metadata_version(self.timeedit, self.db.get_versions(["template_config"])))
+    @offloaded
     def get(self):
         args = self.get_parser.parse_args(strict=True)
-        logger.info("===============  config.Template(Resource) ====================")
-        logger.info(f"Template->args: {args}")
-        logger.info(f"Template->args.canvas_group: {args.canvas_group}")
+        logger.debug("Template args: %s", args)
 
         # if args.default == "true" and LTI_ADMIN not in args["X-LTI-ROLES"]:
         if args.get("default") == "true" and LTI_ADMIN not in (args.get("X-LTI-ROLES") or []):
@@ -112,14 +128,18 @@ class Template(Resource):
                 ConfigType.LOCATION.value: [],
                 ConfigType.DESCRIPTION.value: [],
             }
-            for [i, ct, t, f, cg] in self.db.get_template_config(canvas_group):
+            rows = self.db.get_template_config(canvas_group)
+            # Resolve all names with one request each, see TimeEdit.get_types
+            types = self.timeedit.get_types([t for [_, _, t, _, _] in rows])
+            fields = self.timeedit.get_field_defs_many([f for [_, _, _, f, _] in rows])
+            for [i, ct, t, f, cg] in rows:
                 template_config[ct].append(
                     {
                         "id": i,
                         "te_type": t,
                         "te_field": f,
-                        "te_type_name": self.timeedit.get_type(t)["name"],
-                        "te_field_name": self.timeedit.get_field_defs(f)["name"],
+                        "te_type_name": types[t]["name"],
+                        "te_field_name": fields[f]["name"],
                         "canvas_group": cg,
                     }
                 )
@@ -170,5 +190,6 @@ class Template(Resource):
         try:
             self.db.add_template_config(args.config_type, args.te_type, args.te_field, canvas_group)
             return "", 204
-        except UniqueViolation:
+        # IntegrityError when a concurrent request added the same template after the check
+        except (UniqueViolation, IntegrityError):
             return {"message": "Type and field combination already exist"}, 400
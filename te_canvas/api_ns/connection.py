@@ -1,8 +1,15 @@
-from flask_restx import Namespace, Resource, reqparse
+import json
+import queue
+
+from flask import Response, request
+from flask_restx import Namespace, Resource, fields, reqparse
 from psycopg2.errors import UniqueViolation
 from sqlalchemy.exc import NoResultFound  # type: ignore
 
+from te_canvas.api_ns.config import LTI_ADMIN
+from te_canvas.conditional import conditional
 from te_canvas.db import DB, DeleteFlagAlreadySet, NoDataFound
+from te_canvas.status_feed import StatusFeed
 
 ns = Namespace(
     "connection",
@@ -10,6 +17,12 @@ ns = Namespace(
     prefix="/api",
 )
 
+MAX_BULK_ITEMS = 50000
+MAX_STREAM_GROUPS = 1000
+
+# Per item status of bulk requests, as for the single connection endpoints
+BULK_STATUS = {"created": 204, "deleted": 204, "exists": 404, "not_found": 404, "flagged": 409}
+
 
 class Status(Resource):
     def __init__(self, api=None, *args, **kwargs):
@@ -29,6 +42,60 @@ class Status(Resource):
             return {"message" "no status found"}, 404
 
 
+class StatusStream(Resource):
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, args, kwargs)
+        self.db: DB = kwargs["db"]
+        self.feed: StatusFeed = kwargs["feed"]
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument("canvas_group", type=str, action="split", required=True)
+
+    @ns.param("canvas_group", "Comma separated Canvas group IDs")
+    @ns.response(200, "Event stream")
+    @ns.response(503, "Too many streams, poll /api/connection/status instead")
+    def get(self):
+        """
+        Server-Sent Events stream of sync status and progress for a set of Canvas groups.
+
+        Starts with a status event per group, followed by status events as syncs change status and
+        progress events (written, total, percent) while events are written to Canvas.
+        """
+        args = self.get_parser.parse_args(strict=True)
+        canvas_groups = sorted({g for g in args.canvas_group if g})
+        if not canvas_groups or len(canvas_groups) > MAX_STREAM_GROUPS:
+            return {"message": f"Between 1 and {MAX_STREAM_GROUPS} Canvas groups per stream."}, 400
+
+        sub = self.feed.subscribe(canvas_groups)
+        if sub is None:
+            return {"message": "Too many status streams, poll instead."}, 503, {"Retry-After": "30"}
+        try:
+            statuses = self.db.get_sync_statuses(canvas_groups)
+        except Exception:
+            self.feed.unsubscribe(sub)
+            raise
+
+        def stream():
+            try:
+                for canvas_group, status in statuses.items():
+                    yield _sse("status", {"canvas_group": canvas_group, "status": status})
+                while True:
+                    try:
+                        kind, data = sub.queue.get(timeout=self.feed.heartbeat)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"  # Also detects closed connections
+                        continue
+                    yield _sse(kind, data)
+            finally:
+                self.feed.unsubscribe(sub)
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
 class Connection(Resource):
     # TODO: Is this correct subclassing? We need to know the supertype constructor's signature?
     #       Used for the other APIs as well.
@@ -109,9 +176,101 @@ class Connection(Resource):
     get_parser.add_argument("canvas_group", type=str)
 
     @ns.param("canvas_group", "Canvas group ID")
+    @conditional(lambda self: self.db.get_versions(["connections"]))
     def get(self):
         args = self.get_parser.parse_args(strict=True)
         return [
             {"canvas_group": x, "te_group": y, "te_type": z, "delete_flag": d}
             for (x, y, z, d) in self.db.get_connections(args.canvas_group)
         ]
+
+
+class Bulk(Resource):
+    """
+    Add and delete many connections in one request, e.g. when onboarding courses at the start of a
+    term.
+    """
+
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, args, kwargs)
+        self.db: DB = kwargs["db"]
+
+    post_parser = reqparse.RequestParser()
+    post_parser.add_argument("X-LTI-ROLES", location="headers")
+
+    @ns.doc(
+        body=ns.model(
+            "BulkConnections",
+            {
+                "add": fields.List(
+                    fields.Nested(
+                        ns.model(
+                            "BulkAdd",
+                            {
+                                "canvas_group": fields.String(required=True),
+                                "te_group": fields.String(required=True),
+                                "te_type": fields.String(required=True),
+                            },
+                        )
+                    )
+                ),
+                "delete": fields.List(
+                    fields.Nested(
+                        ns.model(
+                            "BulkDelete",
+                            {
+                                "canvas_group": fields.String(required=True),
+                                "te_group": fields.String(required=True),
+                            },
+                        )
+                    )
+                ),
+            },
+        )
+    )
+    @ns.response(200, "Per item results, in the order of the request")
+    @ns.response(400, "Invalid payload")
+    def post(self):
+        """
+        Add connections and flag connections for deletion, in one transaction.
+
+        Each item gets a status with the same meaning as for single connections: 204 done, 404
+        connection already exists (add) or not found (delete), 409 flagged for deletion but not yet
+        deleted. The sync status of each affected Canvas group is reset once.
+        """
+        args = self.post_parser.parse_args()
+        if LTI_ADMIN not in (args.get("X-LTI-ROLES") or []):
+            return "", 403
+
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return {"message": "Expected a JSON object with lists add and delete."}, 400
+        try:
+            adds = [(str(i["canvas_group"]), str(i["te_group"]), str(i["te_type"])) for i in body.get("add", [])]
+            deletes = [(str(i["canvas_group"]), str(i["te_group"])) for i in body.get("delete", [])]
+        except (KeyError, TypeError) as e:
+            return {"message": f"Invalid item, missing {e}."}, 400
+        if len(adds) + len(deletes) > MAX_BULK_ITEMS:
+            return {"message": f"At most {MAX_BULK_ITEMS} items per request."}, 400
+        pairs = [(c, t) for c, t, _ in adds] + deletes
+        if len(set(pairs)) != len(pairs):
+            return {"message": "Each (canvas_group, te_group) may only occur once."}, 400
+
+        add_results, delete_results = self.db.apply_connections(adds, deletes)
+        return {
+            "add": [
+                {"canvas_group": c, "te_group": t, "status": BULK_STATUS[r], "result": r}
+                for (c, t, _), r in zip(adds, add_results)
+            ],
+            "delete": [
+                {"canvas_group": c, "te_group": t, "status": BULK_STATUS[r], "result": r}
+                for (c, t), r in zip(deletes, delete_results)
+            ],
+        }
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from flask_restx import Namespace, Resource, inputs, reqparse
+
+from te_canvas.api_ns.config import LTI_ADMIN
+from te_canvas.db import DB
+
+ns = Namespace(
+    "sync",
+    description="API for the ledger of sync runs, see te_canvas.ledger",
+    prefix="/api",
+)
+
+
+class Runs(Resource):
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, args, kwargs)
+        self.db: DB = kwargs["db"]
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument("canvas_group", type=str)
+    get_parser.add_argument("outcome", type=str, choices=("synced", "unchanged", "error", "skipped"))
+    get_parser.add_argument("since", type=inputs.datetime_from_iso8601)
+    get_parser.add_argument("order", type=str, choices=("recent", "duration"), default="recent")
+    get_parser.add_argument("limit", type=inputs.int_range(1, 1000), default=100)
+    get_parser.add_argument("X-LTI-ROLES", location="headers")
+
+    @ns.param("canvas_group", "Canvas group ID")
+    @ns.param("outcome", "Only runs with this outcome")
+    @ns.param("since", "Only runs started at or after this ISO 8601 time")
+    @ns.param("order", "recent (default) or duration, longest first")
+    @ns.param("limit", "Maximum number of runs, default 100")
+    def get(self):
+        """Sync runs of Canvas groups, with timing, call counts and outcome."""
+        args = self.get_parser.parse_args(strict=True)
+        if LTI_ADMIN not in (args.get("X-LTI-ROLES") or []):
+            return "", 403
+        return self.db.get_sync_runs(
+            canvas_group=args.canvas_group,
+            outcome=args.outcome,
+            since=args.since,
+            order=args.order,
+            limit=args.limit,
+        )
+
+
+class Summary(Resource):
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, args, kwargs)
+        self.db: DB = kwargs["db"]
+
+    get_parser = reqparse.RequestParser()
+    get_parser.add_argument("days", type=float, default=7)
+    get_parser.add_argument("limit", type=inputs.int_range(1, 1000), default=100)
+    get_parser.add_argument("X-LTI-ROLES", location="headers")
+
+    @ns.param("days", "Summarize runs of the last days, default 7")
+    @ns.param("limit", "Maximum number of groups, default 100")
+    def get(self):
+        """Per Canvas group totals of recent sync runs, most expensive first."""
+        args = self.get_parser.parse_args(strict=True)
+        if LTI_ADMIN not in (args.get("X-LTI-ROLES") or []):
+            return "", 403
+        since = datetime.now(timezone.utc) - timedelta(days=args.days)
+        return self.db.get_sync_run_summary(since, limit=args.limit)
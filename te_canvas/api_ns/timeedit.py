@@ -1,9 +1,23 @@
-from flask_restx import Namespace, Resource, reqparse
+import base64
+import itertools
+import json
+from typing import Iterator, Optional
+
+import requests
 import zeep
+from flask import Response
+from flask_restx import Namespace, Resource, reqparse
+
 import te_canvas.log as log
+from te_canvas import retry
+from te_canvas.api_ns.config import LTI_ADMIN, metadata_version
+from te_canvas.conditional import conditional
+from te_canvas.mirror import ObjectMirror
+from te_canvas.offload import Overloaded, UpstreamTimeout, offloaded, pool
+from te_canvas.responses import dumps
 from te_canvas.timeedit import TimeEdit
 
-logger = log.get_logger()
+logger = log.get_logger(__name__)
 
 ns = Namespace(
     "timeedit",
@@ -16,29 +30,69 @@ class Objects(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api, args, kwargs)
         self.timeedit = kwargs["timeedit"]
+        self.mirror: ObjectMirror = kwargs["mirror"]
 
     parser = reqparse.RequestParser()
     parser.add_argument("type", type=str, required=True)
     parser.add_argument("number_of_objects", type=int)
     parser.add_argument("begin_index", type=int)
     parser.add_argument("search_string", type=str)
+    parser.add_argument("cursor", type=str)
 
     @ns.param("type", "Type of object to get.")
     @ns.param("number_of_objects", "Number of objects to return, max 1000.")
     @ns.param("begin_index", "Starting index of requested object sequence.")
     @ns.param("search_string", "general.id or general.title must contain this string")
+    @ns.param(
+        "cursor",
+        "Get one page of objects as {objects, next_cursor}. Pass an empty cursor for the first page and "
+        "next_cursor for the following ones, until it is null.",
+    )
+    @offloaded
     def get(self):
         args = self.parser.parse_args(strict=True)
         type = args["type"]
         n = args["number_of_objects"]
         i = args["begin_index"]
         s = args["search_string"]
-        logger.info(f"objects.search->[type: {type}, #objects: {n}, index: {i}, s_string: {s}]")
+        logger.debug("objects.search: type %s, number %s, index %s, search %s", type, n, i, s)
+        # Whitelisted types are served from the local mirror, which has the same interface
+        source = self.mirror if self.mirror.has_type(type) else self.timeedit
+        if args["cursor"] is not None:
+            # TimeEdit returns at most 1000 objects per call, and a shorter page ends the listing
+            return self.page(source, type, min(n or 1000, 1000), s, args["cursor"])
         if n or i:
-            data = self.timeedit.find_objects(type, n or 1000, i or 0, s)
+            data = source.find_objects(type, n or 1000, i or 0, s)
+            return data
+
+        # Stream all objects as a JSON array, page by page as they arrive from TimeEdit. The first
+        # page is fetched before the response starts, so that upstream errors get a proper status.
+        # The remaining pages are fetched on the offload pool too, see _offloaded_pages. If that fails
+        # the array is followed by an error line, see _json_array; clients that must not lose the rest
+        # of a large listing should page with cursor instead, which can be retried page by page.
+        pages = source.iter_objects_all(type, s)
+        first = next(pages, [])
+        return Response(_json_array(itertools.chain([first], _offloaded_pages(pages))), mimetype="application/json")
+
+    def page(self, source, type: str, n: int, search_string: Optional[str], cursor: str):
+        if cursor == "":
+            i = 0
         else:
-            data = self.timeedit.find_objects_all(type, s)
-        return data
+            try:
+                c = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+                i = int(c["index"])
+                if c["type"] != type or c["search_string"] != search_string:
+                    raise ValueError("Cursor does not match query")
+            except Exception:
+                return {"message": "Invalid cursor"}, 400
+
+        objects = source.find_objects(type, n, i, search_string)
+        next_cursor = None
+        if len(objects) == n:
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps({"type": type, "search_string": search_string, "index": i + n}).encode()
+            ).decode("ascii")
+        return {"objects": objects, "next_cursor": next_cursor}
 
 
 class Object(Resource):
@@ -50,9 +104,11 @@ class Object(Resource):
     parser.add_argument("extid", type=str, required=True)
 
     @ns.param("extid", "External id.")
+    @offloaded
     def get(self):
         args = self.parser.parse_args(strict=True)
         extid = args["extid"]
+        # Not served from the mirror, which only has the search fields of each object
         res = self.timeedit.get_object(extid)
         if res is None:
             return {"message": f"Object {extid} not found"}, 404
@@ -68,6 +124,8 @@ class Types(Resource):
     parser = reqparse.RequestParser()
     parser.add_argument("whitelisted", type=str)
 
+    @conditional(lambda self: metadata_version(self.timeedit, self.db.get_versions(["whitelist_types"])))
+    @offloaded
     def get(self):
         try:
             args = self.parser.parse_args(strict=True)
@@ -95,12 +153,92 @@ class Fields(Resource):
     parser.add_argument("extid", type=str, required=True)
 
     @ns.param("extid", "External id.")
+    @conditional(lambda self: metadata_version(self.timeedit))
+    @offloaded
     def get(self):
         args = self.parser.parse_args(strict=True)
         if args["extid"] == "reservation":
-            return [self.timeedit.get_field_defs(field) for field in self.timeedit.find_reservation_fields()]
+            fields = self.timeedit.find_reservation_fields()
+            field_defs = self.timeedit.get_field_defs_many(fields)
+            return [field_defs[field] for field in fields]
         fields = self.timeedit.find_object_fields(args["extid"])
         if fields is None:
             return {"message": f"Object {args['extid']} not found"}, 404
-        field_defs = [self.timeedit.get_field_defs(field) for field in fields]
-        return list(filter(lambda field_def: field_def != {}, field_defs))
+        field_defs = self.timeedit.get_field_defs_many(fields)
+        return list(filter(lambda field_def: field_def != {}, [field_defs[field] for field in fields]))
+
+
+class Cache(Resource):
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, args, kwargs)
+        self.timeedit: TimeEdit = kwargs["timeedit"]
+
+    delete_parser = reqparse.RequestParser()
+    delete_parser.add_argument("X-LTI-ROLES", location="headers")
+
+    @ns.response(204, "Metadata cache cleared")
+    def delete(self):
+        """Clear cached TimeEdit metadata, e.g. after types or fields have been changed in TimeEdit."""
+        args = self.delete_parser.parse_args(strict=True)
+        if LTI_ADMIN not in (args.get("X-LTI-ROLES") or []):
+            return "", 403
+        if self.timeedit.cache is not None:
+            n = self.timeedit.cache.invalidate()
+            logger.info("Metadata cache cleared, %s entries dropped", n)
+        return "", 204
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _offloaded_pages(pages: "Iterator[list]") -> "Iterator[list]":
+    """
+    Advance pages on the offload pool, since the response body is produced after the endpoint has
+    returned.
+    """
+    while (page := pool().run(next, pages, None)) is not None:
+        yield page
+
+
+def _json_array(pages: "Iterator[list]") -> "Iterator[bytes]":
+    """
+    Serialize pages of items as one JSON array, one chunk per page.
+
+    The status has been sent with the first chunk, so if a later page cannot be fetched the array is
+    closed and followed by a line {"error": {"status", "message"}} with the status and message the
+    request would have failed with, outside of the data. The body is then no longer valid JSON, so
+    that clients cannot mistake the listing for a complete one.
+    """
+    yield b"["
+    first = True
+    error = None
+    try:
+        for page in pages:
+            if not page:
+                continue
+            yield (b"" if first else b",") + b",".join(dumps(item) for item in page)
+            first = False
+    except Exception as e:
+        error = _stream_error(e)
+        if error[0] == 500:
+            logger.exception("Objects stream failed")
+        else:
+            logger.warning("Objects stream ended early: %s %s", *error)
+    yield b"]"
+    if error is not None:
+        yield b"\n" + dumps({"error": {"status": error[0], "message": error[1]}}) + b"\n"
+
+
+def _stream_error(e: Exception) -> "tuple[int, str]":
+    """
+    Status and message for an error, as the error handlers of the API give them (see api.py).
+    """
+    if isinstance(e, Overloaded):
+        return 503, "Too many requests in progress, try again shortly"
+    if isinstance(e, UpstreamTimeout):
+        return 504, "Upstream request timed out"
+    if isinstance(e, retry.CircuitOpenError):
+        return 503, f"{e.upstream} is temporarily unavailable"
+    if isinstance(e, (zeep.exceptions.Error, requests.RequestException)):
+        return 502, "TimeEdit request failed"
+    return 500, "Internal Server Error"
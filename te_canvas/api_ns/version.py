@@ -1,8 +1,11 @@
 from flask_restx import Namespace, Resource
 
+from te_canvas.conditional import conditional
+
 ns = Namespace("version", description="Version API", prefix="/api")
 
 
 class Version(Resource):
+    @conditional(max_age=300)
     def get(self):
         return "v0.0.1"
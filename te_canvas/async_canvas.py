@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlencode
+
+import httpx
+from canvasapi.calendar_event import CalendarEvent
+from canvasapi.exceptions import (
+    CanvasException,
+    RateLimitExceeded,
+    ResourceDoesNotExist,
+)
+from canvasapi.util import combine_kwargs
+
+from te_canvas import ledger, metrics, retry, tracing
+from te_canvas.log import get_logger
+from te_canvas.translator import TAG_TITLE
+
+
+class AsyncCanvas:
+    """
+    Canvas client for the asyncio sync engine, covering the calendar event endpoints used by the
+    syncer.
+
+    Requests go directly to the Canvas REST API over an httpx connection pool. Errors are raised as
+    the same canvasapi exceptions the Canvas class raises, and events are returned as canvasapi
+    CalendarEvent objects, so that callers can treat both clients alike. The number of concurrent
+    requests is capped by env var CANVAS_CONCURRENCY, which should stay below the Canvas rate limit
+    (around 60 concurrent requests, see sync.Syncer).
+    """
+
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        try:
+            url = os.environ["CANVAS_URL"]
+            key = os.environ["CANVAS_KEY"]
+        except Exception as e:
+            self.logger.critical(f"Missing env var: {e}")
+            sys.exit(1)
+
+        self.client = httpx.AsyncClient(
+            base_url=url.rstrip("/") + "/api/v1",
+            headers={"Authorization": f"Bearer {key}"},
+            timeout=60,
+            limits=httpx.Limits(max_connections=None),
+            event_hooks={"response": [ledger.httpx_hook("canvas")]},
+        )
+        self.semaphore = asyncio.Semaphore(int(os.environ.get("CANVAS_CONCURRENCY", 50)))
+
+    async def _request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """
+        Make a request with retries and circuit breaking (see te_canvas.retry), raising canvasapi
+        exceptions for error responses.
+        """
+
+        async def request():
+            async with self.semaphore:
+                start = time.perf_counter()
+                response = await self.client.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - start
+            metrics.observe_canvas_response(method, str(response.url), response.status_code, elapsed, response.headers)
+            tracing.record("canvas.request", elapsed, method=method, url=response.url.path, status=response.status_code)
+            _raise_for_status(response)
+            return response
+
+        return await retry.call_async("canvas", request, idempotent=idempotent)
+
+    async def get_events(self, course: int) -> "list[CalendarEvent]":
+        """
+        Get all tagged events for a course.
+        """
+        events = []
+        url: Optional[str] = "calendar_events"
+        params: Optional[dict] = {
+            "context_codes[]": f"course_{course}",
+            "all_events": "true",
+            "per_page": 100,
+        }
+        while url is not None:
+            response = await self._request("GET", url, params=params)
+            events += [CalendarEvent(None, e) for e in response.json()]
+            next_link = response.links.get("next")
+            url = next_link["url"] if next_link else None
+            params = None  # The next link carries all parameters
+        return [e for e in events if e.title.endswith(TAG_TITLE)]
+
+    async def create_event(self, event: dict) -> CalendarEvent:
+        """
+        Create a calendar event.
+
+        Returns:
+            The created event.
+        """
+        # Encoded here, as httpx only form encodes dicts and calendar_event[...] keys can repeat
+        data = urlencode([(k, _format(v)) for k, v in combine_kwargs(calendar_event=event)])
+        response = await self._request(
+            "POST",
+            "calendar_events",
+            idempotent=False,
+            content=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        return CalendarEvent(None, response.json())
+
+    async def delete_event(self, event: CalendarEvent) -> Optional[CalendarEvent]:
+        """
+        Delete a tagged Canvas event.
+
+        If the event does not exist on Canvas, this is a NOOP and no exception is raised.
+
+        Returns:
+            The deleted event or None.
+        """
+        if (not event.title.endswith(TAG_TITLE)) or (event.workflow_state == "deleted"):
+            return None
+        try:
+            await self._request("DELETE", f"calendar_events/{event.id}")
+            return event
+        except ResourceDoesNotExist:
+            return None
+
+    async def delete_events(self, course: int) -> "list[CalendarEvent]":
+        """
+        Delete all tagged events, concurrently.
+
+        Returns:
+            List of deleted events.
+        """
+        events = await self.get_events(course)
+        res = await asyncio.gather(*[self.delete_event(e) for e in events])
+        return [e for e in res if e is not None]
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _format(value) -> str:
+    # Same conversions as canvasapi does for form data
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _raise_for_status(response: httpx.Response):
+    """
+    Raise the exception canvasapi would have raised for this response.
+    """
+    code = response.status_code
+    if code < 400:
+        return
+    if code == 403 and b"Rate Limit Exceeded" in response.content:
+        remaining = response.headers.get("X-Rate-Limit-Remaining", "Unknown")
+        raise RateLimitExceeded(f"Rate Limit Exceeded. X-Rate-Limit-Remaining: {remaining}")
+    if code == 404:
+        raise ResourceDoesNotExist("Not Found")
+    raise CanvasException(f"Encountered an error: status code {code}")
@@ -0,0 +1,334 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from canvasapi.exceptions import CanvasException
+from pytz import utc
+
+from te_canvas import ledger, metrics, tracing
+from te_canvas.async_canvas import AsyncCanvas
+from te_canvas.async_timeedit import AsyncTimeEdit
+from te_canvas.db import DB, Connection, bump_version, flat_list
+from te_canvas.log import summarize
+from te_canvas.series import collapse, occurrence_days
+from te_canvas.status_feed import ProgressReporter
+from te_canvas.swap import SwapPlan
+from te_canvas.sync import (
+    CheckpointWriter,
+    Syncer,
+    connected_te_groups,
+    fingerprint,
+    state_canvas,
+    state_te,
+    upstream_down,
+)
+from te_canvas.translator import TemplateError, Translator
+from te_canvas.types.sync_state import SyncState
+
+
+class AsyncSyncer(Syncer):
+    """
+    Alternative to Syncer using asyncio instead of a thread pool, selected with env var
+    SYNC_ENGINE=asyncio.
+
+    Change detection, checkpoints and status updates work exactly as in Syncer, see its docstring.
+    The difference is in how concurrency is achieved: all upstream calls are made with async clients
+    (AsyncTimeEdit, AsyncCanvas) on one event loop, so the number of requests in flight is not bound
+    by the number of threads. MAX_WORKERS is the number of Canvas groups synced concurrently, and
+    TE_CONCURRENCY and CANVAS_CONCURRENCY cap the number of concurrent requests to each upstream.
+    Within a group, TimeEdit pages are fetched and Canvas events created and deleted concurrently,
+    also in SYNC_MODE=swap where SWAP_CONCURRENCY is not used.
+
+    Database access is still blocking and is offloaded to the default thread pool.
+
+    The event loop runs in a background thread for the lifetime of the syncer, since the async
+    clients' connection pools are bound to it. sync_all() is a blocking entry point for the
+    scheduler.
+    """
+
+    def __init__(self, db: DB = None, timeedit: AsyncTimeEdit = None, canvas: AsyncCanvas = None):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="sync-loop", daemon=True).start()
+        super().__init__(db, timeedit or AsyncTimeEdit(), canvas or AsyncCanvas())
+        self.timeedit: AsyncTimeEdit
+        self.canvas: AsyncCanvas
+
+    def sync_all(self):
+        with self.profiler.cycle():
+            asyncio.run_coroutine_threadsafe(self.async_sync_all(), self.loop).result()
+
+    def sync_one(self, canvas_group: str) -> bool:
+        return asyncio.run_coroutine_threadsafe(self.async_sync_one(canvas_group), self.loop).result()
+
+    async def __db(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    async def __status(self, canvas_group: str, status: str):
+        ledger.set_status(status)
+        await self.__db(self.db.update_sync_status, canvas_group, status)
+
+    async def __progress(self, progress: ProgressReporter):
+        # Counted on the loop, only a due notification goes to a thread
+        written = progress.count()
+        if written is not None:
+            await self.__db(progress.publish, written)
+
+    def __groups(self) -> "list[str]":
+        with self.db.sqla_session() as session:
+            return flat_list(session.query(Connection.canvas_group).distinct().order_by(Connection.canvas_group))
+
+    def __te_groups(self, canvas_group: str) -> "list[str]":
+        with self.db.sqla_session() as session:
+            return connected_te_groups(session, canvas_group, include_flagged=False)
+
+    def __prepare_create(self, canvas_group: str) -> "list[str]":
+        """
+        Delete flagged connections and get the TimeEdit groups to add events for.
+        """
+        with self.db.sqla_session() as session:
+            deleted_flagged_count = (
+                session.query(Connection)
+                .filter(
+                    Connection.canvas_group == canvas_group,
+                    Connection.delete_flag == "t",
+                )
+                .delete()
+            )
+            if deleted_flagged_count > 0:
+                bump_version(session, "connections")
+            self.logger.info("%s: Deleted %s flagged connections", canvas_group, deleted_flagged_count)
+            return connected_te_groups(session, canvas_group, include_flagged=True)
+
+    async def async_sync_all(self):
+        """
+        Sync events for all configured Canvas groups, at most MAX_WORKERS groups at a time.
+        """
+        self.logger.info("Sync job started (asyncio)")
+
+        if upstream_down():
+            self.logger.warning("Sync job skipped: upstream unavailable")
+            return
+
+        groups = await self.__db(self.__groups)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def bounded(canvas_group: str) -> bool:
+            async with semaphore:
+                metrics.SYNC_GROUPS_PENDING.dec()
+                return await self.async_sync_one(canvas_group)
+
+        self.cycle = datetime.now(utc).isoformat(timespec="seconds")
+        metrics.SYNC_GROUPS_PENDING.set(len(groups))
+        try:
+            with metrics.SYNC_CYCLE_SECONDS.time():
+                res = await asyncio.gather(*[bounded(g) for g in groups])
+        finally:
+            metrics.SYNC_GROUPS_PENDING.set(0)
+            await self.__db(self._write_runs)
+
+        self.logger.info(
+            "Sync job completed: %s Canvas groups synced:  %s skipped",
+            len([x for x in res if x]),
+            len([x for x in res if not x]),
+        )
+
+    async def __state(self, canvas_group: str, translator: Translator) -> SyncState:
+        te_groups = await self.__db(self.__te_groups, canvas_group)
+        te_events, canvas_events = await asyncio.gather(
+            self.timeedit.afind_reservations_all(te_groups, {}),
+            self.canvas.get_events(int(canvas_group)),
+        )
+        return state_te(te_groups, te_events) | state_canvas(canvas_events) | translator.get_state(canvas_group)
+
+    async def __swap(self, canvas_group: str, events: "list[tuple[dict, list[str]]]") -> bool:
+        """
+        Async counterpart of Syncer.__swap().
+        """
+        old_events = await self.canvas.get_events(int(canvas_group))
+        plan = SwapPlan(old_events, [occurrence_days(event) for event, _ in events])
+        progress = ProgressReporter(self.db, canvas_group, len(events))
+        deletes = [asyncio.ensure_future(self.canvas.delete_event(e)) for e in plan.ready()]
+        failed = False
+
+        async def create(i: int) -> bool:
+            nonlocal failed
+            if self.stopping.is_set() or failed:
+                return False
+            try:
+                await self.canvas.create_event(events[i][0])
+            except Exception:
+                failed = True
+                raise
+            await self.__progress(progress)
+            deletes.extend(asyncio.ensure_future(self.canvas.delete_event(e)) for e in plan.created(i))
+            return True
+
+        created = await asyncio.gather(*[create(i) for i in range(len(events))], return_exceptions=True)
+        # All creates are done, so no more deletes will be added
+        deleted = await asyncio.gather(*deletes, return_exceptions=True)
+
+        errors = [r for r in created + deleted if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        self.logger.info(
+            "%s: Swapped in %s events, deleted %s", canvas_group, len(events), len([e for e in deleted if e])
+        )
+        return all(created)
+
+    async def async_sync_one(self, canvas_group: str) -> bool:
+        """
+        Sync events for one Canvas group, recording the run in the ledger.
+
+        Returns:
+            False if the group was skipped due to change detection or template error, otherwise True.
+        """
+        metrics.SYNC_WORKERS_BUSY.inc()
+        try:
+            with (
+                self.profiler.group(canvas_group),
+                tracing.trace("sync_one", canvas_group=canvas_group),
+                ledger.run(self.cycle or datetime.now(utc).isoformat(timespec="seconds"), canvas_group) as run,
+            ):
+                try:
+                    synced = await self.__sync_one(canvas_group)
+                except BaseException as e:
+                    self._finish_run(run, False, e)
+                    raise
+                self._finish_run(run, synced)
+                return synced
+        finally:
+            metrics.SYNC_WORKERS_BUSY.dec()
+
+    async def __sync_one(self, canvas_group: str) -> bool:
+        if self.stopping.is_set():
+            return False
+        if upstream_down():
+            self.logger.warning("%s: Upstream unavailable, postponing", canvas_group)
+            return False
+
+        self.logger.info("%s: Processing", canvas_group)
+
+        try:
+            translator = await self.__db(Translator, self.db, self.timeedit)
+        except TemplateError:
+            self.logger.warning("%s: Template error, skipping", canvas_group)
+            await self.__status(canvas_group, "error")
+            return False
+
+        # Change detection
+        prev_state = self.states.get(canvas_group)
+        try:
+            with ledger.phase("state"):
+                new_state = await self.__state(canvas_group, translator)
+            self.states[canvas_group] = new_state
+            self.logger.debug("%s: State: %s, previous: %s", canvas_group, summarize(new_state), summarize(prev_state))
+            if new_state == prev_state and self.sync_complete.get(canvas_group, False):
+                self.logger.info("%s: Nothing changed, skipping", canvas_group)
+                await self.__status(canvas_group, "success")
+                return False
+        except CanvasException as e:
+            self.logger.error("Canvas API error while getting state: %s", e.message)
+            await self.__status(canvas_group, "error")
+            return False
+        except Exception as e:
+            self.logger.error("%s: Error while getting state: %s", canvas_group, e, exc_info=True)
+            await self.__status(canvas_group, "error")
+            return False
+
+        self.sync_complete[canvas_group] = False
+        await self.__status(canvas_group, "in_progress")
+
+        # Resume from checkpoint or start over, see Syncer.sync_one
+        state_hash = fingerprint(new_state)
+        checkpoint = await self.__db(self.db.get_checkpoint, canvas_group) if self.sync_mode != "swap" else None
+        written: set[str] = set()
+        if checkpoint is not None and checkpoint[0] == "creating" and checkpoint[1] == state_hash:
+            written = set(checkpoint[2])
+            self.logger.info("%s: Resuming from checkpoint, %s events already added", canvas_group, len(written))
+        elif self.sync_mode != "swap":
+            await self.__db(self.db.set_checkpoint, canvas_group, "deleting", state_hash)
+            self.logger.info("%s: Deleting events", canvas_group)
+            try:
+                with ledger.phase("delete"):
+                    deleted = await self.canvas.delete_events(int(canvas_group))
+                self.logger.info("%s: Deleted %s events", canvas_group, len(deleted))
+            except Exception as e:
+                self.logger.error("Canvas API error: %s", e)
+                await self.__status(canvas_group, "error")
+                return False
+            await self.__db(self.db.set_checkpoint, canvas_group, "creating", state_hash)
+
+        te_groups = await self.__db(self.__prepare_create, canvas_group)
+
+        try:
+            with ledger.phase("fetch"):
+                reservations = await self.timeedit.afind_reservations_all(
+                    te_groups, translator.get_return_types(canvas_group)
+                )
+        except Exception as e:
+            self.logger.error("%s: TimeEdit error while getting reservations: %s", canvas_group, e)
+            await self.__status(canvas_group, "error")
+            return False
+
+        self.logger.info("%s: Adding events: %s (%s events)", canvas_group, summarize(te_groups), len(reservations))
+
+        with ledger.phase("translate"):
+            events = [
+                (
+                    translator.canvas_event(r, canvas_group) | {"context_code": f"course_{canvas_group}"},
+                    [str(r["id"])],
+                )
+                for r in reservations
+                if str(r["id"]) not in written
+            ]
+            if self.series:
+                events = collapse(events)
+        ledger.set_sizes(len(reservations), len(events))
+
+        if self.sync_mode == "swap":
+            try:
+                with ledger.phase("write"):
+                    completed = await self.__swap(canvas_group, events)
+            except Exception as e:
+                self.logger.error("Canvas API error: %s", e)
+                await self.__status(canvas_group, "error")
+                return False
+            if not completed:
+                self.logger.info("%s: Stopping, swap interrupted", canvas_group)
+                return False
+        else:
+            progress = ProgressReporter(self.db, canvas_group, len(events))
+            checkpoint_writer = CheckpointWriter(self.db, canvas_group)
+
+            async def create(event: dict, reservation_ids: "list[str]") -> bool:
+                if self.stopping.is_set():
+                    return False
+                await self.canvas.create_event(event)
+                await self.__db(checkpoint_writer.add, reservation_ids)
+                await self.__progress(progress)
+                return True
+
+            with ledger.phase("write"):
+                res = await asyncio.gather(*[create(e, r) for e, r in events], return_exceptions=True)
+                await self.__db(checkpoint_writer.flush)
+            errors = [e for e in res if isinstance(e, BaseException)]
+            if errors:
+                self.logger.error("Canvas API error: %s", errors[0])
+                await self.__status(canvas_group, "error")
+                return False
+            if self.stopping.is_set():
+                self.logger.info("%s: Stopping, progress saved in checkpoint", canvas_group)
+                return False
+
+        # Record new Canvas state, see Syncer.sync_one
+        with ledger.phase("state"):
+            self.states[canvas_group] = self.states[canvas_group] | state_canvas(
+                await self.canvas.get_events(int(canvas_group))
+            )
+
+        self.sync_complete[canvas_group] = True
+        await self.__db(self.db.delete_checkpoint, canvas_group)
+        await self.__status(canvas_group, "success")
+
+        return True
@@ -0,0 +1,98 @@
+import asyncio
+import itertools
+import os
+import time
+
+import zeep
+from zeep.transports import AsyncTransport
+
+from te_canvas import ledger, metrics, retry, tracing
+from te_canvas.log import get_logger, summarize
+from te_canvas.timeedit import TimeEdit, _span_attributes, _unpack_reservations
+
+logger = get_logger(__name__)
+
+
+class AsyncTimeEdit(TimeEdit):
+    """
+    TimeEdit client for the asyncio sync engine.
+
+    Setup (WSDL loading, register, env vars) is shared with TimeEdit and done synchronously. The SOAP
+    operations used by the syncer are available as coroutines, sent over an httpx connection pool so
+    that many requests can be in flight at once from a single thread. The number of concurrent
+    requests is capped by env var TE_CONCURRENCY.
+    """
+
+    def __init__(self):
+        super().__init__()
+        transport = AsyncTransport()
+        transport.client.event_hooks["response"].append(ledger.httpx_hook("timeedit"))
+        self.aclient = zeep.AsyncClient(self.wsdl, transport=transport)  # type: ignore
+        self.semaphore = asyncio.Semaphore(int(os.environ.get("TE_CONCURRENCY", 20)))
+
+    async def _acall(self, operation: str, **kwargs):
+        """
+        Async counterpart of TimeEdit._call().
+        """
+
+        async def call():
+            async with self.semaphore:
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    res = await getattr(self.aclient.service, operation)(**kwargs)
+                    outcome = "ok"
+                    return res
+                finally:
+                    metrics.TIMEEDIT_CALL_SECONDS.observe(
+                        time.perf_counter() - start, operation=operation, outcome=outcome
+                    )
+
+        with tracing.span(f"timeedit.{operation}", **_span_attributes(kwargs)):
+            return await retry.call_async("timeedit", call)
+
+    async def afind_reservations_all(self, extids: "list[str]", return_types: "dict[str, list[str]]"):
+        """
+        Async counterpart of TimeEdit.find_reservations_all(). Pages are fetched concurrently.
+        """
+        if len(extids) == 0:
+            return []
+
+        res_return_fields, query = self._reservations_query(extids, return_types)
+
+        n = (
+            await self._acall(
+                "findReservations",
+                login=self.login,
+                searchobjects=query["searchobjects"],
+                numberofreservations=1,
+            )
+        ).totalnumberofreservations
+
+        num_pages = -(-n // 1000)
+
+        try:
+            pages = await asyncio.gather(
+                *[
+                    self._acall(
+                        "findReservations",
+                        numberofreservations=1000,
+                        beginindex=i * 1000,
+                        **query,
+                    )
+                    for i in range(num_pages)
+                ]
+            )
+            reservations = list(itertools.chain.from_iterable(p["reservations"]["reservation"] for p in pages))
+        except retry.CircuitOpenError:
+            raise
+        except Exception as e:
+            if retry.is_transient(e):
+                raise
+            logger.error("Error in afind_reservations_all(%s): %s", summarize(extids), e, stack_info=True)
+            return []
+
+        return _unpack_reservations(extids, reservations, res_return_fields)
+
+    async def aclose(self):
+        await self.aclient.transport.aclose()
@@ -0,0 +1,120 @@
+"""
+Synthetic TimeEdit data for the benchmark.
+
+Each Canvas group is connected to one TimeEdit course event object, with a number of reservations.
+A share of each group's reservations (overlap) also books the course event of the next group, as
+when courses share lectures, so those reservations are synced to two Canvas groups. Reservations
+book a room and a teacher from shared pools, and the default template built by template_config()
+uses a field of each object type, so that events are translated as in production.
+
+The data is a function of the parameters only, so the stand-in servers and the benchmark runner can
+generate it independently, in different processes.
+"""
+
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Canvas groups are numbered from here, to stay clear of real course IDs
+FIRST_GROUP = 900000
+
+TE_TYPE = "courseevt"
+START = datetime(2030, 1, 7, 8, 0)
+MODIFIED = datetime(2029, 12, 1, 12, 0)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    groups: int = 50
+    reservations: int = 200  # Per group, not counting those shared from the previous group
+    overlap: float = 0.2
+    rooms: int = 100
+    teachers: int = 300
+    seed: int = 0
+
+    def params(self) -> dict:
+        return asdict(self)
+
+    def canvas_groups(self) -> "list[str]":
+        return [str(FIRST_GROUP + i) for i in range(self.groups)]
+
+    def te_group(self, i: int) -> str:
+        return f"{TE_TYPE}_{i:06d}"
+
+    def generate(self) -> "list[dict]":
+        """
+        All reservations, as dicts with the fields of a TimeEdit reservation: id, begin, end,
+        length, modified and objects, a list of {type, extid, fields}.
+        """
+        rng = random.Random(self.seed)
+        reservations = []
+        for i in range(self.groups):
+            for k in range(self.reservations):
+                begin = START + timedelta(days=k // 4, hours=2 * (k % 4) + rng.randrange(2))
+                objects = [_course(i, self.te_group(i))]
+                if self.groups > 1 and rng.random() < self.overlap:
+                    j = (i + 1) % self.groups
+                    objects.append(_course(j, self.te_group(j)))
+                room = rng.randrange(self.rooms)
+                teacher = rng.randrange(self.teachers)
+                objects.append({"type": "room", "extid": f"room_{room:04d}", "fields": {"room.name": f"Room {room}"}})
+                objects.append(
+                    {
+                        "type": "person",
+                        "extid": f"person_{teacher:05d}",
+                        "fields": {"person.fullname": f"Teacher {teacher}", "person.email": f"t{teacher}@example.com"},
+                    }
+                )
+                reservations.append(
+                    {
+                        "id": len(reservations) + 1,
+                        "begin": begin,
+                        "end": begin + timedelta(hours=2),
+                        "length": "2:00",
+                        "modified": MODIFIED,
+                        "objects": objects,
+                    }
+                )
+        return reservations
+
+
+def mutate(reservations: "list[dict]", ratio: float, seed: int, now: Optional[datetime] = None) -> int:
+    """
+    Move a share of the reservations by an hour and bump their modification time, as when a
+    schedule is edited. The modification time is now, or just after the previous one for the
+    generated reservations modified in the future.
+
+    Returns:
+        Number of reservations changed.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now().replace(microsecond=0)
+    changed = 0
+    for r in reservations:
+        if rng.random() < ratio:
+            r["begin"] += timedelta(hours=1)
+            r["end"] += timedelta(hours=1)
+            r["modified"] = max(now, r["modified"] + timedelta(seconds=1))
+            changed += 1
+    return changed
+
+
+def template_config() -> "list[tuple[str, str, str]]":
+    """
+    Default template for the dataset, as (config_type, te_type, te_field).
+    """
+    return [
+        ("title", TE_TYPE, "courseevt.name"),
+        ("title", TE_TYPE, "courseevt.code"),
+        ("location", "room", "room.name"),
+        ("description", "person", "person.fullname"),
+    ]
+
+
+def _course(i: int, extid: str) -> dict:
+    return {
+        "type": TE_TYPE,
+        "extid": extid,
+        "fields": {"courseevt.name": f"Course {i}", "courseevt.code": f"BENCH{i:05d}"},
+    }
@@ -0,0 +1,177 @@
+"""
+Stand-in for the calendar events part of the Canvas REST API.
+
+Implements GET /api/v1/calendar_events (context_codes[], per_page and page, with Link headers like
+Canvas: 10 events per page by default, at most 100), POST /api/v1/calendar_events (form encoded
+calendar_event[...]) and DELETE /api/v1/calendar_events/:id. Point te-canvas at it with env var
+CANVAS_URL=http://<host>:<port>.
+
+Throttling follows Canvas' leaky bucket: each request costs request_cost units, plus a pre-flight
+penalty of 50 units while it is in flight, the bucket leaks leak_rate units per second and requests
+which would overflow the bucket (capacity units) are rejected with 403 "Rate Limit Exceeded".
+Every response carries X-Rate-Limit-Remaining and X-Request-Cost. Each request sleeps latency
+seconds.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlencode
+
+PREFLIGHT_PENALTY = 50.0
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+# Ids all have the same number of digits, so that response sizes do not depend on the order in
+# which concurrent syncs create events
+FIRST_EVENT_ID = 1_000_000
+
+
+class FakeCanvas:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        capacity: float = 700.0,
+        leak_rate: float = 10.0,
+        request_cost: float = 1.0,
+    ):
+        self.latency = latency
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.request_cost = request_cost
+        self.lock = threading.Lock()
+        self.events: dict[str, dict[int, dict]] = {}  # Context code -> id -> event
+        self.contexts: dict[int, str] = {}  # Id -> context code
+        self.next_id = FIRST_EVENT_ID
+        self.calls: Counter[str] = Counter()
+        self.bytes = 0
+        self.throttled = 0
+        self.used = 0.0
+        self.last_leak = time.monotonic()
+        self.in_flight = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "bytes": self.bytes,
+                "throttled": self.throttled,
+                "events": len(self.contexts),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.bytes = 0
+            self.throttled = 0
+
+    def handle(self, method: str, path: str, query: str, body: bytes, base_url: str) -> "tuple[int, dict, bytes]":
+        """
+        Handle a request.
+
+        Returns:
+            HTTP status, headers and body.
+        """
+        with self.lock:
+            self.calls[f"{method} {endpoint(path)}"] += 1
+            self.__leak()
+            if self.used + self.request_cost + PREFLIGHT_PENALTY > self.capacity:
+                self.throttled += 1
+                return 403, self.__headers(), b"403 Forbidden (Rate Limit Exceeded)"
+            self.used += PREFLIGHT_PENALTY
+            self.in_flight += 1
+        try:
+            time.sleep(self.latency)
+            status, headers, data = self.__route(method, path, parse_qs(query), parse_qs(body.decode()), base_url)
+        finally:
+            with self.lock:
+                self.__leak()
+                self.used = max(0.0, self.used - PREFLIGHT_PENALTY) + self.request_cost
+                self.in_flight -= 1
+        response = json.dumps(data).encode()
+        with self.lock:
+            self.bytes += len(response)
+            headers |= self.__headers()
+        return status, headers, response
+
+    def __leak(self):
+        now = time.monotonic()
+        self.used = max(0.0, self.used - (now - self.last_leak) * self.leak_rate)
+        self.last_leak = now
+
+    def __headers(self) -> dict:
+        return {
+            "X-Rate-Limit-Remaining": f"{self.capacity - self.used:.1f}",
+            "X-Request-Cost": f"{self.request_cost:.1f}",
+        }
+
+    def __route(self, method: str, path: str, query: dict, form: dict, base_url: str) -> "tuple[int, dict, object]":
+        parts = path.strip("/").split("/")
+        if parts[:3] != ["api", "v1", "calendar_events"]:
+            return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+        if len(parts) == 3 and method == "GET":
+            return self.__list(query, base_url)
+        if len(parts) == 3 and method == "POST":
+            return self.__create(form)
+        if len(parts) == 4 and method == "DELETE":
+            return self.__delete(parts[3])
+        return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+
+    def __list(self, query: dict, base_url: str) -> "tuple[int, dict, object]":
+        contexts = set(query.get("context_codes[]", []))
+        per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = int(query.get("page", [1])[0])
+        with self.lock:
+            events = [e for context in sorted(contexts) for e in self.events.get(context, {}).values()]
+        items = events[(page - 1) * per_page : page * per_page]
+        params = {k: v for k, v in query.items() if k != "page"}
+
+        def link(p: int, rel: str) -> str:
+            return f'<{base_url}/api/v1/calendar_events?{urlencode(params | {"page": p}, doseq=True)}>; rel="{rel}"'
+
+        links = [link(page, "current"), link(1, "first")]
+        if page * per_page < len(events):
+            links.append(link(page + 1, "next"))
+        return 200, {"Link": ",".join(links)}, items
+
+    def __create(self, form: dict) -> "tuple[int, dict, object]":
+        fields = {k[len("calendar_event[") : -1]: v[0] for k, v in form.items() if k.startswith("calendar_event[")}
+        if "context_code" not in fields:
+            return 400, {}, {"errors": {"context_code": [{"message": "context_code is required"}]}}
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            event = {
+                "id": self.next_id,
+                "title": fields.get("title", ""),
+                "start_at": fields.get("start_at"),
+                "end_at": fields.get("end_at"),
+                "location_name": fields.get("location_name", ""),
+                "description": fields.get("description", ""),
+                "context_code": fields["context_code"],
+                "workflow_state": "active",
+                "created_at": now,
+                "updated_at": now,
+            }
+            self.events.setdefault(event["context_code"], {})[event["id"]] = event
+            self.contexts[event["id"]] = event["context_code"]
+            self.next_id += 1
+        return 201, {}, event
+
+    def __delete(self, event_id: str) -> "tuple[int, dict, object]":
+        with self.lock:
+            context = self.contexts.pop(int(event_id), None) if event_id.isdigit() else None
+            if context is None:
+                return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+            event = self.events[context].pop(int(event_id))
+        event["workflow_state"] = "deleted"
+        event["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        return 200, {}, event
+
+
+def endpoint(path: str) -> str:
+    """
+    The endpoint requested, for call counts and fault rules.
+    """
+    return "calendar_events" if path.rstrip("/").endswith("calendar_events") else "calendar_events/:id"
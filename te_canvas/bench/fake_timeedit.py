@@ -0,0 +1,398 @@
+"""
+Stand-in for the TimeEdit SOAP API, serving a Dataset.
+
+Implements the subset of operations used by te-canvas: register, findReservations, findObjects,
+findTypes, getTypes and getPrimaryFields, with a WSDL of its own on GET /wsdl. Point TimeEdit at it
+with env var TE_WSDL_URL=http://<host>:<port>/wsdl. Request fields the stand-in does not use (login,
+search fields) are accepted and ignored.
+
+findReservations pages like TimeEdit (numberofreservations, beginindex), returns the objects of the
+types in returntypes with the requested fields only, and sleeps latency seconds plus
+latency_per_item seconds per reservation returned.
+"""
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from xml.sax.saxutils import escape
+
+from te_canvas.bench.dataset import Dataset, mutate
+
+NS = "http://te-canvas.sunet.se/bench/timeedit"
+
+WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:tns="{ns}" targetNamespace="{ns}">
+  <types>
+    <xs:schema targetNamespace="{ns}" elementFormDefault="qualified">
+      <xs:complexType name="Login">
+        <xs:sequence>
+          <xs:element name="username" type="xs:string" minOccurs="0"/>
+          <xs:element name="password" type="xs:string" minOccurs="0"/>
+          <xs:element name="applicationkey" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Strings">
+        <xs:sequence><xs:element name="field" type="xs:string" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Field">
+        <xs:sequence>
+          <xs:element name="extid" type="xs:string"/>
+          <xs:element name="value" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Fields">
+        <xs:sequence><xs:element name="field" type="tns:Field" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Object">
+        <xs:sequence>
+          <xs:element name="type" type="xs:string" minOccurs="0"/>
+          <xs:element name="extid" type="xs:string"/>
+          <xs:element name="fields" type="tns:Fields" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Objects">
+        <xs:sequence><xs:element name="object" type="tns:Object" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="TypeField">
+        <xs:sequence>
+          <xs:element name="type" type="xs:string"/>
+          <xs:element name="field" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="ReturnTypes">
+        <xs:sequence><xs:element name="typefield" type="tns:TypeField" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Reservation">
+        <xs:sequence>
+          <xs:element name="id" type="xs:long"/>
+          <xs:element name="begin" type="xs:string"/>
+          <xs:element name="end" type="xs:string"/>
+          <xs:element name="length" type="xs:string"/>
+          <xs:element name="modified" type="xs:string"/>
+          <xs:element name="objects" type="tns:Objects" minOccurs="0"/>
+          <xs:element name="fields" type="tns:Fields" minOccurs="0"/>
+        </xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Reservations">
+        <xs:sequence><xs:element name="reservation" type="tns:Reservation" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      </xs:complexType>
+      <xs:complexType name="Type">
+        <xs:sequence>
+          <xs:element name="extid" type="xs:string"/>
+          <xs:element name="name" type="xs:string"/>
+        </xs:sequence>
+      </xs:complexType>
+
+      <xs:element name="register">
+        <xs:complexType><xs:sequence><xs:element name="certificate" type="xs:string"/></xs:sequence></xs:complexType>
+      </xs:element>
+      <xs:element name="registerResponse">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="applicationkey" type="xs:string"/>
+            <!-- Unused, but keeps zeep from unwrapping the response to a bare string, as for the real service -->
+            <xs:element name="validto" type="xs:string" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findReservations">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="login" type="tns:Login" minOccurs="0"/>
+            <xs:element name="searchobjects" type="tns:Objects" minOccurs="0"/>
+            <xs:element name="returntypes" type="tns:ReturnTypes" minOccurs="0"/>
+            <xs:element name="returnfields" type="tns:Strings" minOccurs="0"/>
+            <xs:element name="numberofreservations" type="xs:int" minOccurs="0"/>
+            <xs:element name="beginindex" type="xs:int" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findReservationsResponse">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="totalnumberofreservations" type="xs:int"/>
+            <xs:element name="reservations" type="tns:Reservations" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findObjects">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="login" type="tns:Login" minOccurs="0"/>
+            <xs:element name="type" type="xs:string" minOccurs="0"/>
+            <xs:element name="numberofobjects" type="xs:int" minOccurs="0"/>
+            <xs:element name="beginindex" type="xs:int" minOccurs="0"/>
+            <xs:element name="generalsearchfields" type="tns:Strings" minOccurs="0"/>
+            <xs:element name="generalsearchstring" type="xs:string" minOccurs="0"/>
+            <xs:element name="returnfields" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findObjectsResponse">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="totalnumberofobjects" type="xs:int"/>
+            <xs:element name="objects" type="tns:Objects" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findTypes">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="login" type="tns:Login" minOccurs="0"/>
+            <xs:element name="ignorealias" type="xs:boolean" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="findTypesResponse">
+        <xs:complexType>
+          <xs:sequence><xs:element name="type" type="tns:Type" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="getTypes">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="login" type="tns:Login" minOccurs="0"/>
+            <xs:element name="ignorealias" type="xs:boolean" minOccurs="0"/>
+            <xs:element name="types" type="xs:string" minOccurs="0" maxOccurs="unbounded"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="getTypesResponse">
+        <xs:complexType>
+          <xs:sequence><xs:element name="type" type="tns:Type" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="getPrimaryFields">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="login" type="tns:Login" minOccurs="0"/>
+            <xs:element name="type" type="xs:string" minOccurs="0"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>
+      <xs:element name="getPrimaryFieldsResponse">
+        <xs:complexType>
+          <xs:sequence><xs:element name="field" type="xs:string" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+        </xs:complexType>
+      </xs:element>
+    </xs:schema>
+  </types>
+{messages}
+  <portType name="TimeEditPortType">
+{operations}
+  </portType>
+  <binding name="TimeEditBinding" type="tns:TimeEditPortType">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+{bindings}
+  </binding>
+  <service name="TimeEditService">
+    <port name="TimeEditPort" binding="tns:TimeEditBinding">
+      <soap:address location="{location}"/>
+    </port>
+  </service>
+</definitions>
+"""
+
+OPERATIONS = ["register", "findReservations", "findObjects", "findTypes", "getTypes", "getPrimaryFields"]
+
+TYPES = {"courseevt": "Course event", "room": "Room", "person": "Person"}
+PRIMARY_FIELDS = {"courseevt": ["courseevt.code"], "room": ["room.name"], "person": ["person.fullname"]}
+
+
+def wsdl(location: str) -> str:
+    messages, operations, bindings = [], [], []
+    for op in OPERATIONS:
+        for suffix in ("", "Response"):
+            messages.append(
+                f'  <message name="{op}{suffix}Message"><part name="parameters" element="tns:{op}{suffix}"/></message>'
+            )
+        operations.append(
+            f'    <operation name="{op}"><input message="tns:{op}Message"/>'
+            f'<output message="tns:{op}ResponseMessage"/></operation>'
+        )
+        bindings.append(
+            f'    <operation name="{op}"><soap:operation soapAction="{op}"/>'
+            '<input><soap:body use="literal"/></input><output><soap:body use="literal"/></output></operation>'
+        )
+    return WSDL.format(
+        ns=NS,
+        location=escape(location),
+        messages="\n".join(messages),
+        operations="\n".join(operations),
+        bindings="\n".join(bindings),
+    )
+
+
+class FakeTimeEdit:
+    def __init__(self, dataset: Dataset, latency: float = 0.0, latency_per_item: float = 0.0):
+        self.dataset = dataset
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.lock = threading.Lock()
+        self.reservations = dataset.generate()
+        self.__index()
+        self.calls: Counter[str] = Counter()
+        self.bytes = 0
+
+    def __index(self):
+        self.by_extid: dict[str, list[dict]] = {}
+        self.objects: dict[str, dict[str, dict]] = {}
+        for r in self.reservations:
+            for o in r["objects"]:
+                self.by_extid.setdefault(o["extid"], []).append(r)
+                self.objects.setdefault(o["type"], {})[o["extid"]] = o
+
+    def mutate(self, ratio: float, seed: int) -> int:
+        with self.lock:
+            return mutate(self.reservations, ratio, seed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"calls": dict(self.calls), "bytes": self.bytes}
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.bytes = 0
+
+    def handle(self, body: bytes) -> "tuple[int, bytes]":
+        """
+        Handle a SOAP request.
+
+        Returns:
+            HTTP status and response body.
+        """
+        try:
+            request = _strip(ET.fromstring(body)).find("Body")[0]  # type: ignore
+        except (ET.ParseError, TypeError, IndexError):
+            return 400, _fault("Invalid SOAP request")
+        op = request.tag
+        handler = getattr(self, f"_op_{op}", None)
+        if handler is None:
+            return 500, _fault(f"Unknown operation {op}")
+        with self.lock:
+            self.calls[op] += 1
+        payload, items = handler(request)
+        time.sleep(self.latency + self.latency_per_item * items)
+        response = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+            f'<{op}Response xmlns="{NS}">{payload}</{op}Response>'
+            "</soap:Body></soap:Envelope>"
+        ).encode()
+        with self.lock:
+            self.bytes += len(response)
+        return 200, response
+
+    # ---- Operations, returning the response payload and the number of items --
+
+    def _op_register(self, request: ET.Element) -> "tuple[str, int]":
+        return "<applicationkey>bench-key</applicationkey>", 0
+
+    def _op_findReservations(self, request: ET.Element) -> "tuple[str, int]":
+        extids = [e.text for e in request.iterfind("searchobjects/object/extid")]
+        return_types = {
+            tf.findtext("type"): {f.text for f in tf.iterfind("field")}
+            for tf in request.iterfind("returntypes/typefield")
+        }
+        number = int(request.findtext("numberofreservations") or 1000)
+        begin = int(request.findtext("beginindex") or 0)
+        with self.lock:
+            seen: dict[int, dict] = {}
+            for extid in extids:
+                for r in self.by_extid.get(extid or "", []):
+                    seen[r["id"]] = r
+            matching = [seen[k] for k in sorted(seen)]
+            page = [_reservation(r, return_types) for r in matching[begin : begin + number]]
+        payload = f"<totalnumberofreservations>{len(matching)}</totalnumberofreservations>"
+        if page:
+            payload += f"<reservations>{''.join(page)}</reservations>"
+        return payload, len(page)
+
+    def _op_findObjects(self, request: ET.Element) -> "tuple[str, int]":
+        te_type = request.findtext("type") or ""
+        number = int(request.findtext("numberofobjects") or 1000)
+        begin = int(request.findtext("beginindex") or 0)
+        search = (request.findtext("generalsearchstring") or "").lower()
+        with self.lock:
+            objects = sorted(self.objects.get(te_type, {}).values(), key=lambda o: o["extid"])
+        if search:
+            objects = [o for o in objects if any(search in v.lower() for v in o["fields"].values())]
+        page = objects[begin : begin + number]
+        payload = f"<totalnumberofobjects>{len(objects)}</totalnumberofobjects>"
+        if page:
+            payload += f"<objects>{''.join(_object(o, None) for o in page)}</objects>"
+        return payload, len(page)
+
+    def _op_findTypes(self, request: ET.Element) -> "tuple[str, int]":
+        return "".join(_type(extid, name) for extid, name in TYPES.items()), len(TYPES)
+
+    def _op_getTypes(self, request: ET.Element) -> "tuple[str, int]":
+        extids = [e.text for e in request.iterfind("types") if e.text in TYPES]
+        return "".join(_type(extid, TYPES[extid]) for extid in extids), len(extids)  # type: ignore
+
+    def _op_getPrimaryFields(self, request: ET.Element) -> "tuple[str, int]":
+        fields = PRIMARY_FIELDS.get(request.findtext("type") or "", [])
+        return "".join(f"<field>{escape(f)}</field>" for f in fields), len(fields)
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _strip(element: ET.Element) -> ET.Element:
+    """
+    Remove namespaces from the tags of element and its descendants.
+    """
+    for e in element.iter():
+        e.tag = e.tag.rpartition("}")[2]
+    return element
+
+
+def _timestamp(t: datetime) -> str:
+    return t.strftime("%Y%m%dT%H%M%S")
+
+
+def _fields(fields: "dict[str, str]") -> str:
+    return "".join(f"<field><extid>{escape(k)}</extid><value>{escape(v)}</value></field>" for k, v in fields.items())
+
+
+def _object(o: dict, return_fields: "Optional[set[str]]") -> str:
+    fields = o["fields"] if return_fields is None else {k: v for k, v in o["fields"].items() if k in return_fields}
+    xml = f"<object><type>{o['type']}</type><extid>{escape(o['extid'])}</extid>"
+    if fields:
+        xml += f"<fields>{_fields(fields)}</fields>"
+    return xml + "</object>"
+
+
+def _reservation(r: dict, return_types: "dict[str, set[str]]") -> str:
+    """
+    A reservation with the objects and fields requested by returntypes. Without returntypes, objects
+    are returned without fields.
+    """
+    if return_types:
+        objects = [_object(o, return_types[o["type"]]) for o in r["objects"] if o["type"] in return_types]
+    else:
+        objects = [_object(o, set()) for o in r["objects"]]
+    return (
+        f"<reservation><id>{r['id']}</id><begin>{_timestamp(r['begin'])}</begin><end>{_timestamp(r['end'])}</end>"
+        f"<length>{r['length']}</length><modified>{_timestamp(r['modified'])}</modified>"
+        f"<objects>{''.join(objects)}</objects></reservation>"
+    )
+
+
+def _type(extid: str, name: str) -> str:
+    return f"<type><extid>{extid}</extid><name>{escape(name)}</name></type>"
+
+
+def _fault(message: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><soap:Fault>'
+        f"<faultcode>soap:Server</faultcode><faultstring>{escape(message)}</faultstring>"
+        "</soap:Fault></soap:Body></soap:Envelope>"
+    ).encode()
@@ -0,0 +1,143 @@
+"""
+Fault and latency injection for the TimeEdit and Canvas stand-ins.
+
+Faults are given as a spec of semicolon-separated rules, each applying to all requests or, with
+@<operation>, to one operation: a SOAP operation for TimeEdit (e.g. findReservations), a method
+or "<method> <endpoint>" for Canvas (e.g. POST, or GET calendar_events). E.g.
+
+    latency=lognormal:0.2:0.5; latency=const:5@findReservations; error=502:0.05; drip=20000
+
+Rules:
+
+    latency=<distribution>  Added delay before responding, in seconds, drawn from const:<s> (or
+                            just <s>), uniform:<low>:<high>, exp:<mean> or lognormal:<median>:<sigma>.
+                            Several latency rules add up.
+    error=<status>:<rate>   Respond with <status> instead of handling the request, with probability
+                            <rate>. A 403 from Canvas is sent as its "Rate Limit Exceeded" response.
+    drip=<bytes/s>          Send the response body at this rate, like a congested link.
+    truncate=<rate>         With probability <rate>, close the connection halfway through the body,
+                            as when a proxy or the upstream drops a page mid-response.
+
+Throttling is modelled by the leaky bucket of FakeCanvas. Decisions are drawn from a generator
+seeded by the seed given, so a run with the same requests in the same order gets the same faults.
+"""
+
+import math
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+DISTRIBUTIONS: "dict[str, tuple[int, Callable[..., float]]]" = {
+    # Name -> (number of parameters, sampler taking a random.Random and the parameters)
+    "const": (1, lambda rng, s: s),
+    "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+    "exp": (1, lambda rng, mean: rng.expovariate(1 / mean) if mean > 0 else 0.0),
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0),
+}
+
+
+@dataclass
+class Rule:
+    kind: str
+    args: "tuple[float, ...]"
+    distribution: Optional[str] = None
+    operation: Optional[str] = None
+
+    def matches(self, operation: str) -> bool:
+        return self.operation is None or self.operation == operation or self.operation == operation.split(" ")[0]
+
+
+@dataclass
+class Plan:
+    """
+    What to do to one request.
+    """
+
+    delay: float = 0.0
+    status: Optional[int] = None  # Respond with this error instead of handling the request
+    drip: Optional[float] = None  # Bytes per second
+    truncate: bool = False
+
+
+class Faults:
+    def __init__(self, rules: "list[Rule]", seed: int = 0):
+        self.rules = rules
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.injected: Counter[str] = Counter()  # "<operation> <status>" or "<operation> truncated" -> count
+        self.delay = 0.0
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "Faults":
+        """
+        Parse a fault spec, see the module docstring.
+
+        Raises:
+            ValueError: If the spec is invalid.
+        """
+        return cls([_rule(r.strip()) for r in spec.split(";") if r.strip()], seed)
+
+    def plan(self, operation: str) -> Plan:
+        """
+        Decide the faults for a request to operation.
+        """
+        plan = Plan()
+        with self.lock:
+            for rule in self.rules:
+                if not rule.matches(operation):
+                    continue
+                if rule.kind == "latency":
+                    assert rule.distribution is not None
+                    plan.delay += DISTRIBUTIONS[rule.distribution][1](self.rng, *rule.args)
+                elif rule.kind == "error":
+                    if plan.status is None and self.rng.random() < rule.args[1]:
+                        plan.status = int(rule.args[0])
+                        self.injected[f"{operation} {plan.status}"] += 1
+                elif rule.kind == "drip":
+                    plan.drip = rule.args[0]
+                elif rule.kind == "truncate":
+                    if self.rng.random() < rule.args[0]:
+                        plan.truncate = True
+                        self.injected[f"{operation} truncated"] += 1
+            self.delay += plan.delay
+        return plan
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"injected": dict(self.injected), "delay_seconds": round(self.delay, 3)}
+
+    def reset_stats(self):
+        with self.lock:
+            self.injected.clear()
+            self.delay = 0.0
+
+
+def _rule(text: str) -> Rule:
+    rule, _, operation = text.partition("@")
+    kind, sep, value = rule.strip().partition("=")
+    kind = kind.strip()
+    operation = operation.strip() or None
+    try:
+        if not sep:
+            raise ValueError("expected <rule>=<value>")
+        params = value.strip().split(":")
+        if kind == "latency":
+            name = "const" if len(params) == 1 else params.pop(0)
+            if name not in DISTRIBUTIONS:
+                raise ValueError(f"unknown distribution {name}, expected one of {', '.join(DISTRIBUTIONS)}")
+            args = tuple(float(p) for p in params)
+            if len(args) != DISTRIBUTIONS[name][0] or min(args) < 0:
+                raise ValueError(f"{name} takes {DISTRIBUTIONS[name][0]} non-negative parameters")
+            return Rule(kind, args, name, operation)
+        args = tuple(float(p) for p in params)
+        if kind == "error" and len(args) == 2 and 400 <= args[0] < 600 and 0 <= args[1] <= 1:
+            return Rule(kind, args, operation=operation)
+        if kind == "drip" and len(args) == 1 and args[0] > 0:
+            return Rule(kind, args, operation=operation)
+        if kind == "truncate" and len(args) == 1 and 0 <= args[0] <= 1:
+            return Rule(kind, args, operation=operation)
+        raise ValueError("unknown rule or invalid parameters")
+    except ValueError as e:
+        raise ValueError(f'Invalid fault rule "{text}": {e}') from None
@@ -0,0 +1,319 @@
+"""
+Benchmark full sync cycles against the TimeEdit and Canvas stand-ins.
+
+Usage:
+
+    docker-compose --profile test up -d postgres-test
+    python -m te_canvas.bench.runner [--engine threads|asyncio] [--groups N] [--reservations M] ...
+    python -m te_canvas.bench.runner --save-baseline   # Store the result as baseline
+    python -m te_canvas.bench.runner                   # Compare with the stored baseline
+
+Runs three sync_all() cycles: "initial" on empty Canvas groups, "unchanged" where change detection
+should skip every group, and "changed" after a share (--change-ratio) of the reservations have been
+moved. For each cycle it reports wall time, sync outcomes, seconds per sync phase (summed over
+groups, from the sync ledger), calls and bytes per upstream operation, Canvas requests throttled,
+and the peak RSS of the syncer process.
+
+To measure the syncer under stress, inject faults with --te-faults and --canvas-faults, e.g.
+--te-faults "latency=const:5@findReservations; error=502:0.02" --canvas-faults "error=403:0.05",
+see te_canvas.bench.faults.
+
+Uses the database given by env vars POSTGRES_*, by default the test database from docker-compose.yml.
+It refuses to run against a database with connections unless --reset-db is given, which empties the
+connections, template and sync tables. Never point it at a production database.
+
+Baselines are stored in te_canvas/bench/baselines/<name>.json. A run regresses if a cycle takes more
+than --tolerance longer, makes more than --tolerance more upstream calls or grows peak RSS by more
+than --tolerance relative to the baseline, and the runner then exits with status 1. Baselines are
+only comparable on the same machine and with the same dataset and stand-in options.
+
+Exact baselines (--save-baseline --exact) only hold what does not depend on the machine: the sync
+outcomes, upstream calls and bytes, throttled requests and Canvas events of each cycle. Runs must
+match them exactly, on any machine. The committed baseline "seeded" is one, see
+te_canvas/bench/baselines/README.md.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.request import Request, urlopen
+
+from te_canvas.bench import servers
+from te_canvas.bench.dataset import TE_TYPE, Dataset, template_config
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines")
+CYCLES = ["initial", "unchanged", "changed"]
+
+# What exact baselines hold of each cycle
+EXACT = ["outcomes", "timeedit", "canvas", "canvas_events"]
+
+# Tables emptied by --reset-db
+TABLES = ["connections", "template_config", "sync_status", "sync_checkpoints", "sync_runs"]
+
+
+def configure_env(te_port: int, canvas_port: int, engine: str):
+    """
+    Point te-canvas at the stand-ins and the benchmark database.
+    """
+    os.environ.update(
+        {
+            "TE_WSDL_URL": f"http://127.0.0.1:{te_port}/wsdl",
+            "TE_CERT": "bench",
+            "TE_USERNAME": "bench",
+            "TE_PASSWORD": "bench",
+            "TE_ID": "bench",
+            "TE_USERGROUP": "bench",
+            "TE_SEARCH_FIELDS": "courseevt.code",
+            "TE_RETURN_FIELDS": "courseevt.code",
+            "CANVAS_URL": f"http://127.0.0.1:{canvas_port}",
+            "CANVAS_KEY": "bench",
+            "SYNC_ENGINE": engine,
+        }
+    )
+    for k, v in {
+        "POSTGRES_HOSTNAME": "localhost",
+        "POSTGRES_PORT": "5433",
+        "POSTGRES_USER": "test_user",
+        "POSTGRES_PASSWORD": "test_password",
+        "POSTGRES_DB": "test_db",
+        "MAX_WORKERS": "10",
+    }.items():
+        os.environ.setdefault(k, v)
+
+
+def prepare_db(db, dataset: Dataset, reset: bool):
+    """
+    Connect each Canvas group of the dataset to its TimeEdit course event, and add the default
+    template.
+    """
+    from sqlalchemy import text
+
+    from te_canvas.db import Connection, TemplateConfig, bump_version
+
+    with db.sqla_session() as session:
+        if session.query(Connection).first() is not None and not reset:
+            sys.exit("Database has connections, use --reset-db to empty it (never on a production database)")
+        for table in TABLES:
+            session.execute(text(f"DELETE FROM {table}"))
+        session.add_all(
+            Connection(canvas_group=g, te_group=dataset.te_group(i), te_type=TE_TYPE)
+            for i, g in enumerate(dataset.canvas_groups())
+        )
+        session.add_all(
+            TemplateConfig(config_type=c, te_type=t, te_field=f, canvas_group="default")
+            for c, t, f in template_config()
+        )
+        # Invalidate what a previous run left in the API caches
+        bump_version(session, "connections")
+        bump_version(session, "template_config")
+
+
+def control(port: int, action: str, method: str = "GET") -> dict:
+    with urlopen(Request(f"http://127.0.0.1:{port}/_bench/{action}", method=method)) as response:
+        return json.load(response)
+
+
+def run_cycle(syncer, db, te_port: int, canvas_port: int) -> dict:
+    from sqlalchemy import func
+
+    from te_canvas.db import SyncRun
+
+    control(te_port, "reset", "POST")
+    control(canvas_port, "reset", "POST")
+    # Cycles are identified by their start time in seconds, so don't start two in the same second
+    time.sleep(1 - time.time() % 1)
+
+    start = time.perf_counter()
+    syncer.sync_all()
+    seconds = time.perf_counter() - start
+
+    with db.sqla_session() as session:
+        run_phases = [phases for (phases,) in session.query(SyncRun.phases).filter(SyncRun.cycle == syncer.cycle)]
+        outcomes = dict(
+            session.query(SyncRun.outcome, func.count())
+            .filter(SyncRun.cycle == syncer.cycle)
+            .group_by(SyncRun.outcome)
+            .all()
+        )
+    phases: dict[str, float] = {}
+    for p in run_phases:
+        for name, s in (p or {}).items():
+            phases[name] = round(phases.get(name, 0) + s, 3)
+
+    te = control(te_port, "stats")
+    canvas = control(canvas_port, "stats")
+    return {
+        "seconds": round(seconds, 3),
+        "outcomes": outcomes,
+        "phases": phases,
+        "timeedit": {"calls": te["calls"], "bytes": te["bytes"]},
+        "canvas": {"calls": canvas["calls"], "bytes": canvas["bytes"], "throttled": canvas["throttled"]},
+        "canvas_events": canvas["events"],
+        "faults": {"timeedit": te["faults"], "canvas": canvas["faults"]},
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    dataset = servers.dataset_from(args)
+    options = servers.options_from(args)
+    process, te_port, canvas_port = servers.start_process(dataset, **options)
+    try:
+        configure_env(te_port, canvas_port, args.engine)
+
+        from te_canvas.db import DB
+
+        db = DB()
+        prepare_db(db, dataset, args.reset_db)
+        if args.engine == "asyncio":
+            from te_canvas.async_sync import AsyncSyncer
+
+            syncer = AsyncSyncer(db=db)
+        else:
+            from te_canvas.sync import Syncer
+
+            syncer = Syncer(db=db)
+
+        cycles = {}
+        for name in CYCLES:
+            if name == "changed":
+                control(te_port, f"mutate?ratio={args.change_ratio}&seed={args.seed}", "POST")
+            cycles[name] = run_cycle(syncer, db, te_port, canvas_port)
+            print(report_line(name, cycles[name]), flush=True)
+    finally:
+        process.terminate()
+        process.join()
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "engine": args.engine,
+        "dataset": dataset.params(),
+        "options": options | {"change_ratio": args.change_ratio, "max_workers": os.environ["MAX_WORKERS"]},
+        "cycles": cycles,
+    }
+
+
+def report_line(name: str, cycle: dict) -> str:
+    te_calls = sum(cycle["timeedit"]["calls"].values())
+    canvas_calls = sum(cycle["canvas"]["calls"].values())
+    outcomes = ", ".join(f"{k} {v}" for k, v in sorted(cycle["outcomes"].items()))
+    injected = sum(sum(f.get("injected", {}).values()) for f in cycle.get("faults", {}).values())
+    return (
+        f"{name:<10} {cycle['seconds']:8.2f} s  [{outcomes}]  TimeEdit {te_calls} calls "
+        f"{cycle['timeedit']['bytes'] / 2**20:.1f} MiB  Canvas {canvas_calls} calls "
+        f"({cycle['canvas']['throttled']} throttled)  {injected} faults injected  "
+        f"max RSS {cycle['max_rss_kib'] / 1024:.0f} MiB"
+    )
+
+
+def exact(result: dict) -> dict:
+    """
+    The part of a result that is the same on every run, for an exact baseline.
+    """
+    return {
+        "created": result["created"],
+        "exact": True,
+        "engine": result["engine"],
+        "dataset": result["dataset"],
+        "options": result["options"],
+        "cycles": {name: {k: cycle[k] for k in EXACT} for name, cycle in result["cycles"].items()},
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> "list[str]":
+    """
+    Compare a result with a baseline, exactly if it is an exact baseline, else with tolerance.
+
+    Returns:
+        Descriptions of the regressions, empty if there are none.
+
+    Raises:
+        ValueError: If the runs are not comparable.
+    """
+    for key in ("engine", "dataset", "options"):
+        if result[key] != baseline[key]:
+            raise ValueError(f"Baseline has different {key}: {baseline[key]} != {result[key]}")
+
+    if baseline.get("exact"):
+        return [
+            f"{name} {k}: {cycle[k]} vs {baseline['cycles'][name][k]} in baseline"
+            for name, cycle in result["cycles"].items()
+            for k in EXACT
+            if cycle[k] != baseline["cycles"][name][k]
+        ]
+
+    regressions = []
+
+    def check(what: str, value: float, base: float):
+        if base > 0 and value > base * (1 + tolerance):
+            regressions.append(f"{what}: {value:g} vs {base:g} in baseline ({value / base - 1:+.0%})")
+
+    for name, cycle in result["cycles"].items():
+        base = baseline["cycles"][name]
+        check(f"{name} seconds", cycle["seconds"], base["seconds"])
+        for upstream in ("timeedit", "canvas"):
+            check(
+                f"{name} {upstream} calls",
+                sum(cycle[upstream]["calls"].values()),
+                sum(base[upstream]["calls"].values()),
+            )
+        check(f"{name} max RSS KiB", cycle["max_rss_kib"], base["max_rss_kib"])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sync cycles against the TimeEdit and Canvas stand-ins.")
+    servers.add_arguments(parser)
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--change-ratio", type=float, default=0.05, help="Share of reservations changed")
+    parser.add_argument("--baseline", default="default", help="Name of the baseline in te_canvas/bench/baselines")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the result as baseline")
+    parser.add_argument(
+        "--exact", action="store_true", help="With --save-baseline, store only what runs must match exactly"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--output", help="Also write the result as JSON to this file")
+    parser.add_argument("--reset-db", action="store_true", help="Empty the connections and sync tables first")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    path = os.path.join(BASELINES, f"{args.baseline}.json")
+    if args.save_baseline:
+        with open(path, "w") as f:
+            json.dump(exact(result) if args.exact else result, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline {path}")
+        sys.exit(0)
+    if not os.path.exists(path):
+        print(f"No baseline {path}, run with --save-baseline to create it")
+        sys.exit(0)
+    with open(path) as f:
+        baseline = json.load(f)
+    try:
+        regressions = compare(result, baseline, args.tolerance)
+    except ValueError as e:
+        sys.exit(str(e))
+    if baseline.get("exact"):
+        print("Exact baseline from", baseline["created"])
+    else:
+        for name, cycle in baseline["cycles"].items():
+            print(report_line(f"{name}*", cycle))
+        print("* baseline from", baseline["created"])
+    if regressions:
+        print("Regressions:")
+        for r in regressions:
+            print(f"  {r}")
+        if baseline.get("exact"):
+            print("If the change is intended, save the baseline again with --save-baseline --exact")
+        sys.exit(1)
+    print("No regressions")
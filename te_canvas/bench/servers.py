@@ -0,0 +1,284 @@
+"""
+HTTP servers for the TimeEdit and Canvas stand-ins.
+
+Besides the upstream APIs, both servers answer GET /_bench/stats (calls per operation, bytes sent,
+throttled requests, faults injected) and POST /_bench/reset (zero the stats). The TimeEdit server
+also answers POST /_bench/mutate?ratio=<r>&seed=<s>, which edits a share of the reservations.
+
+Both servers take an optional te_canvas.bench.faults.Faults, injecting latency, errors, slow-drip and
+truncated responses.
+
+Run standalone, e.g. to point a full syncer or API at them:
+
+    python -m te_canvas.bench.servers [--groups N] [--reservations M] [--overlap R] [--te-port P] ...
+"""
+
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from te_canvas.bench.dataset import Dataset
+from te_canvas.bench.fake_canvas import FakeCanvas, endpoint
+from te_canvas.bench.fake_timeedit import FakeTimeEdit, wsdl
+from te_canvas.bench.faults import Faults, Plan
+
+# Seconds between the chunks of a slow-drip response
+DRIP_INTERVAL = 0.05
+
+ERROR_BODY = b"<html><head><title>{status}</title></head><body><h1>{status}</h1></body></html>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(
+        self, status: int, body: bytes, content_type: str, headers: "dict | None" = None, plan: Optional[Plan] = None
+    ):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        plan = plan or Plan()
+        if plan.truncate:
+            # Content-Length promises the whole body, so the client sees the connection drop mid-response
+            body = body[: len(body) // 2]
+            self.close_connection = True
+        if plan.drip is None:
+            self.wfile.write(body)
+            return
+        chunk = max(1, int(plan.drip * DRIP_INTERVAL))
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i : i + chunk])
+            self.wfile.flush()
+            time.sleep(len(body[i : i + chunk]) / plan.drip)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _plan(self, faults: Optional[Faults], operation: str) -> Plan:
+        """
+        Decide the faults for this request, and sleep the latency injected.
+        """
+        plan = faults.plan(operation) if faults is not None else Plan()
+        time.sleep(plan.delay)
+        return plan
+
+    def _error(self, status: int):
+        """
+        Send an error page, as a proxy or load balancer in front of the service would.
+        """
+        line = f"{status} {self.responses.get(status, ('Error',))[0]}"
+        self._send(status, ERROR_BODY.replace(b"{status}", line.encode()), "text/html")
+
+    def _control(self, fake, faults: Optional[Faults]) -> bool:
+        """
+        Handle the /_bench endpoints.
+
+        Returns:
+            False if the request is not for them.
+        """
+        url = urlsplit(self.path)
+        if not url.path.startswith("/_bench/"):
+            return False
+        self._body()
+        action = url.path.removeprefix("/_bench/")
+        if action == "stats":
+            data = fake.stats() | {"faults": faults.stats() if faults is not None else {}}
+        elif action == "reset":
+            fake.reset_stats()
+            if faults is not None:
+                faults.reset_stats()
+            data = {}
+        elif action == "mutate" and isinstance(fake, FakeTimeEdit):
+            query = parse_qs(url.query)
+            data = {"changed": fake.mutate(float(query["ratio"][0]), int(query.get("seed", [0])[0]))}
+        else:
+            self._send(404, b"{}", "application/json")
+            return True
+        self._send(200, json.dumps(data).encode(), "application/json")
+        return True
+
+
+def timeedit_server(
+    fake: FakeTimeEdit, host: str = "127.0.0.1", port: int = 0, faults: Optional[Faults] = None
+) -> ThreadingHTTPServer:
+    class Handler(_Handler):
+        def do_GET(self):
+            if self._control(fake, faults):
+                return
+            if urlsplit(self.path).path == "/wsdl":
+                location = f"http://{self.headers.get('Host', f'{host}:{server.server_port}')}/soap"
+                self._send(200, wsdl(location).encode(), "text/xml; charset=utf-8")
+            else:
+                self._send(404, b"", "text/plain")
+
+        def do_POST(self):
+            if self._control(fake, faults):
+                return
+            request = self._body()
+            # zeep sends the soapAction of the operation from the WSDL
+            plan = self._plan(faults, self.headers.get("SOAPAction", "").strip('"'))
+            if plan.status is not None:
+                self._error(plan.status)
+                return
+            status, body = fake.handle(request)
+            self._send(status, body, "text/xml; charset=utf-8", plan=plan)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    return server
+
+
+def canvas_server(
+    fake: FakeCanvas, host: str = "127.0.0.1", port: int = 0, faults: Optional[Faults] = None
+) -> ThreadingHTTPServer:
+    class Handler(_Handler):
+        def _api(self):
+            if self._control(fake, faults):
+                return
+            url = urlsplit(self.path)
+            request = self._body()
+            plan = self._plan(faults, f"{self.command} {endpoint(url.path)}")
+            if plan.status == 403:
+                # As Canvas throttles, so that canvasapi raises RateLimitExceeded
+                headers = {"X-Rate-Limit-Remaining": "0.0"}
+                self._send(403, b"403 Forbidden (Rate Limit Exceeded)", "text/plain", headers)
+                return
+            if plan.status is not None:
+                self._error(plan.status)
+                return
+            base_url = f"http://{self.headers.get('Host', f'{host}:{server.server_port}')}"
+            status, headers, body = fake.handle(self.command, url.path, url.query, request, base_url)
+            self._send(status, body, "application/json; charset=utf-8", headers, plan)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _api
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    return server
+
+
+def serve(
+    dataset: Dataset,
+    te_port: int = 0,
+    canvas_port: int = 0,
+    te_latency: float = 0.0,
+    te_latency_per_item: float = 0.0,
+    canvas_latency: float = 0.0,
+    canvas_capacity: float = 700.0,
+    canvas_leak_rate: float = 10.0,
+    te_faults: str = "",
+    canvas_faults: str = "",
+    started: "Callable[[int, int], None] | None" = None,
+):
+    """
+    Run both servers until interrupted. started is called with their ports once they listen.
+    te_faults and canvas_faults are fault specs, see te_canvas.bench.faults.
+    """
+    te = timeedit_server(
+        FakeTimeEdit(dataset, te_latency, te_latency_per_item),
+        port=te_port,
+        faults=Faults.parse(te_faults, dataset.seed) if te_faults else None,
+    )
+    canvas = canvas_server(
+        FakeCanvas(canvas_latency, canvas_capacity, canvas_leak_rate),
+        port=canvas_port,
+        faults=Faults.parse(canvas_faults, dataset.seed) if canvas_faults else None,
+    )
+    threading.Thread(target=canvas.serve_forever, name="fake-canvas", daemon=True).start()
+    if started is not None:
+        started(te.server_port, canvas.server_port)
+    try:
+        te.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def _serve_child(conn, dataset_params: dict, options: dict):
+    serve(Dataset(**dataset_params), started=lambda te, canvas: conn.send((te, canvas)), **options)
+
+
+def start_process(dataset: Dataset, **options) -> "tuple[multiprocessing.Process, int, int]":
+    """
+    Run the servers in a child process, so that they do not compete with the benchmarked syncer for
+    the GIL or count towards its memory.
+
+    Returns:
+        The process, the TimeEdit port and the Canvas port.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    process = ctx.Process(target=_serve_child, args=(child, dataset.params(), options), daemon=True)
+    process.start()
+    te_port, canvas_port = parent.recv()
+    return process, te_port, canvas_port
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """
+    Arguments for the dataset and the behaviour of the stand-ins, shared with the runner.
+    """
+    defaults = Dataset()
+    parser.add_argument("--groups", type=int, default=defaults.groups, help="Canvas groups")
+    parser.add_argument("--reservations", type=int, default=defaults.reservations, help="Reservations per group")
+    parser.add_argument("--overlap", type=float, default=defaults.overlap, help="Share of reservations in 2 groups")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--te-latency", type=float, default=0.05, help="Seconds per TimeEdit call")
+    parser.add_argument(
+        "--te-latency-per-item", type=float, default=0.0002, help="Seconds per reservation returned by TimeEdit"
+    )
+    parser.add_argument("--canvas-latency", type=float, default=0.03, help="Seconds per Canvas request")
+    parser.add_argument("--canvas-capacity", type=float, default=700.0, help="Canvas rate limit bucket size")
+    parser.add_argument("--canvas-leak-rate", type=float, default=10.0, help="Canvas rate limit units per second")
+    parser.add_argument(
+        "--te-faults", type=_fault_spec, default="", help="Faults injected by TimeEdit, see te_canvas.bench.faults"
+    )
+    parser.add_argument(
+        "--canvas-faults", type=_fault_spec, default="", help="Faults injected by Canvas, see te_canvas.bench.faults"
+    )
+
+
+def dataset_from(args: argparse.Namespace) -> Dataset:
+    return Dataset(groups=args.groups, reservations=args.reservations, overlap=args.overlap, seed=args.seed)
+
+
+def options_from(args: argparse.Namespace) -> dict:
+    return {
+        "te_latency": args.te_latency,
+        "te_latency_per_item": args.te_latency_per_item,
+        "canvas_latency": args.canvas_latency,
+        "canvas_capacity": args.canvas_capacity,
+        "canvas_leak_rate": args.canvas_leak_rate,
+        "te_faults": args.te_faults,
+        "canvas_faults": args.canvas_faults,
+    }
+
+
+def _fault_spec(spec: str) -> str:
+    try:
+        Faults.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the TimeEdit and Canvas stand-ins.")
+    add_arguments(parser)
+    parser.add_argument("--te-port", type=int, default=8081)
+    parser.add_argument("--canvas-port", type=int, default=8082)
+    args = parser.parse_args()
+
+    def started(te_port: int, canvas_port: int):
+        print(f"TE_WSDL_URL=http://127.0.0.1:{te_port}/wsdl")
+        print(f"CANVAS_URL=http://127.0.0.1:{canvas_port}")
+
+    serve(dataset_from(args), te_port=args.te_port, canvas_port=args.canvas_port, started=started, **options_from(args))
@@ -0,0 +1,135 @@
+"""
+Cache for TimeEdit metadata (types, search fields, field definitions), which is nearly static but
+costs one or more SOAP calls per lookup.
+
+Entries are stored in the database (db.CacheEntry), so that they are shared by all API workers and
+the syncer, and expire after TE_CACHE_TTL seconds. On top of that each process keeps entries in
+memory for at most TE_CACHE_LOCAL_TTL seconds, so that repeated lookups do not even hit the
+database. Invalidation (see MetadataCache.invalidate) clears the shared entries immediately, other
+processes see it once their in-memory entries expire.
+
+The cache is best effort: if the database is unavailable, lookups fall through to TimeEdit.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+from te_canvas import metrics
+from te_canvas.db import DB
+from te_canvas.log import get_logger
+
+
+class MetadataCache:
+    def __init__(
+        self,
+        db: DB,
+        ttl: Optional[float] = None,
+        local_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.logger = get_logger(__name__)
+        try:
+            self.ttl = float(os.environ.get("TE_CACHE_TTL", 3600)) if ttl is None else ttl
+            self.local_ttl = float(os.environ.get("TE_CACHE_LOCAL_TTL", 60)) if local_ttl is None else local_ttl
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.local_ttl = min(self.local_ttl, self.ttl)
+
+        self.db = db
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.local: dict[str, tuple[float, Any]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Get the value for key, calling fetch on a miss.
+
+        Values must be JSON serializable; anything else is stored as its string representation.
+        Values are always returned as they would be read back from the database, so that a hit and a
+        miss look the same to the caller.
+        """
+        return self.get_many([key], lambda keys: {key: fetch()})[key]
+
+    def get_many(self, keys: "list[str]", fetch: "Callable[[list[str]], dict[str, Any]]") -> "dict[str, Any]":
+        """
+        Get the values for several keys, calling fetch once with all keys that are missing.
+
+        fetch must return a value for each key it is given. See get() for the value format.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled:
+            return fetch(keys) if keys else {}
+
+        res = {}
+        now = self.clock()
+        with self.lock:
+            for key in keys:
+                entry = self.local.get(key)
+                if entry is not None and entry[0] > now:
+                    res[key] = entry[1]
+
+        missing = [k for k in keys if k not in res]
+        metrics.CACHE_LOOKUPS.inc(len(keys) - len(missing), result="local_hit")
+        if missing:
+            try:
+                rows = self.db.get_cache_entries(missing)
+            except Exception as e:
+                self.logger.warning("Metadata cache unavailable: %s", e)
+                rows = {}
+            utcnow = datetime.now(timezone.utc)
+            for key, (value, expires_at) in rows.items():
+                if expires_at > utcnow:
+                    res[key] = value
+                    self.__set_local(key, value, (expires_at - utcnow).total_seconds())
+
+        n_missing = len(missing)
+        missing = [k for k in keys if k not in res]
+        metrics.CACHE_LOOKUPS.inc(n_missing - len(missing), result="db_hit")
+        metrics.CACHE_LOOKUPS.inc(len(missing), result="miss")
+        if missing:
+            fetched = json.loads(json.dumps(fetch(missing), default=str))
+            try:
+                self.db.set_cache_entries(fetched, datetime.now(timezone.utc) + timedelta(seconds=self.ttl))
+            except Exception as e:
+                self.logger.warning("Metadata cache unavailable: %s", e)
+            for key, value in fetched.items():
+                self.__set_local(key, value, self.ttl)
+            res |= fetched
+
+        return res
+
+    def __set_local(self, key: str, value: Any, remaining: float):
+        with self.lock:
+            self.local[key] = (self.clock() + min(self.local_ttl, remaining), value)
+
+    def version(self) -> "Optional[tuple[int, int]]":
+        """
+        Version of the cached metadata for HTTP ETags, or None if caching is disabled.
+
+        Changes when the cache is invalidated, and at least every TTL seconds, since entries may
+        have been refetched with new content by then.
+        """
+        if not self.enabled:
+            return None
+        return (self.db.get_versions(["timeedit_metadata"])["timeedit_metadata"], int(time.time() // self.ttl))
+
+    def invalidate(self) -> int:
+        """
+        Drop all cached entries.
+
+        Returns:
+            Number of shared entries dropped.
+        """
+        with self.lock:
+            self.local.clear()
+        return self.db.delete_cache_entries()
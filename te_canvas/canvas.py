@@ -8,13 +8,14 @@ from canvasapi.calendar_event import CalendarEvent
 from canvasapi.course import Course
 from canvasapi.exceptions import ResourceDoesNotExist
 
-from te_canvas.log import get_logger
+from te_canvas import ledger, metrics, retry, singleflight, tracing
+from te_canvas.log import get_logger, summarize
 from te_canvas.translator import TAG_TITLE
 
 
 class Canvas:
     def __init__(self):
-        self.logger = get_logger()
+        self.logger = get_logger(__name__)
         try:
             url = os.environ["CANVAS_URL"]
             key = os.environ["CANVAS_KEY"]
@@ -23,6 +24,22 @@ class Canvas:
             sys.exit(1)
 
         self.canvas = CanvasAPI(url, key)
+        # Count bytes received in the current sync run, see te_canvas.ledger
+        self.canvas._Canvas__requester._session.hooks["response"].append(ledger.requests_hook("canvas"))
+        self.canvas._Canvas__requester._session.hooks["response"].append(metrics.requests_hook)
+        self.canvas._Canvas__requester._session.hooks["response"].append(tracing.requests_hook)
+        # Coalescing of identical concurrent calls. In-process only, since canvasapi objects are not
+        # JSON serializable.
+        self.singleflight = singleflight.Group()
+
+    def _call(self, fn, *args, idempotent: bool = True, **kwargs):
+        """
+        Call fn against Canvas, with retries and circuit breaking (see te_canvas.retry).
+
+        Paginated listings must be materialized inside fn, since the requests for later pages are
+        made lazily during iteration.
+        """
+        return retry.call("canvas", fn, *args, idempotent=idempotent, **kwargs)
 
     # ---- Courses -------------------------------------------------------------
 
@@ -30,8 +47,10 @@ class Canvas:
         """
         Get all courses.
         """
-        root_user = self.canvas.get_account(1)
-        res = list(root_user.get_courses())
+        res = self.singleflight.do(
+            "canvas.get_courses",
+            lambda: self._call(lambda: list(self.canvas.get_account(1).get_courses(per_page=100))),
+        )
         if len(res) == 0:
             self.logger.warning("canvas.get_courses() returned 0 courses.")
         return res
@@ -42,14 +61,15 @@ class Canvas:
         """
         Get all tagged events for a course.
         """
-        return [
-            e
-            for e in self.canvas.get_calendar_events(
-                context_codes=[f"course_{course}"],
-                all_events=True,
+        events = self._call(
+            lambda: list(
+                self.canvas.get_calendar_events(
+                    context_codes=[f"course_{course}"],
+                    all_events=True,
+                )
             )
-            if e.title.endswith(TAG_TITLE)
-        ]
+        )
+        return [e for e in events if e.title.endswith(TAG_TITLE)]
 
     def create_event(self, event: dict) -> CalendarEvent:
         """
@@ -58,10 +78,8 @@ class Canvas:
         Returns:
             The created event.
         """
-        self.logger.info("================== [CANVAS.create_event] ==================")
-        self.logger.info(event)
-        self.logger.info("===========================================================")
-        return self.canvas.create_calendar_event(event)
+        self.logger.debug("create_event: %s", summarize(event))
+        return self._call(self.canvas.create_calendar_event, event, idempotent=False)
 
     def delete_event(self, event: CalendarEvent) -> Optional[CalendarEvent]:
         """
@@ -75,7 +93,7 @@ class Canvas:
         if (not event.title.endswith(TAG_TITLE)) or (event.workflow_state == "deleted"):
             return None
         try:
-            event.delete()
+            self._call(event.delete)
             return event
         except ResourceDoesNotExist:
             return None
@@ -0,0 +1,149 @@
+"""
+Local catalogue of the Canvas courses in the account, so that listing and searching courses does not
+walk every page of the account's courses on each request.
+
+The sync service refreshes the catalogue every COURSES_INTERVAL seconds. As for the TimeEdit object
+mirror (see te_canvas.mirror), Canvas has no modified-since filter for courses, so a refresh reads the
+full listing but only writes courses that are new or have changed, and removes courses no longer
+listed.
+
+The API queries the catalogue while its last complete refresh is at most COURSES_MAX_AGE seconds old,
+and otherwise falls back to listing courses from Canvas.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from canvasapi.course import Course
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from te_canvas.canvas import Canvas
+from te_canvas.db import DB, CanvasCourse
+from te_canvas.log import get_logger
+
+# Number of courses written per statement during a refresh
+BATCH_SIZE = 1000
+
+
+class CourseCatalogue:
+    def __init__(self, db: DB, canvas: Canvas):
+        self.logger = get_logger(__name__)
+        try:
+            self.interval = int(os.environ.get("COURSES_INTERVAL", 3600))
+            self.max_age = int(os.environ.get("COURSES_MAX_AGE", 86400))
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.db = db
+        self.canvas = canvas
+
+    def refresh(self):
+        started = datetime.now(timezone.utc)
+        rows = list({r["id"]: r for r in (_row(c, started) for c in self.canvas.get_courses())}.values())
+        if not rows:
+            # Rather keep a stale catalogue than empty it
+            return
+
+        with self.db.sqla_session() as session:
+            digests = dict(session.query(CanvasCourse.id, CanvasCourse.digest))
+
+        new_rows = [r for r in rows if digests.get(r["id"]) != r["digest"]]
+        unchanged = [r["id"] for r in rows if digests.get(r["id"]) == r["digest"]]
+        with self.db.sqla_session() as session:
+            for i in range(0, len(new_rows), BATCH_SIZE):
+                stmt = insert(CanvasCourse).values(new_rows[i : i + BATCH_SIZE])
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[CanvasCourse.id],
+                        set_={c: stmt.excluded[c] for c in new_rows[0] if c != "id"},
+                    )
+                )
+            for i in range(0, len(unchanged), BATCH_SIZE):
+                session.query(CanvasCourse).filter(CanvasCourse.id.in_(unchanged[i : i + BATCH_SIZE])).update(
+                    {CanvasCourse.seen_at: started}, synchronize_session=False
+                )
+            removed = session.query(CanvasCourse).filter(CanvasCourse.seen_at < started).delete()
+
+        self.logger.info("Courses: %s courses, %s written, %s removed", len(rows), len(new_rows), removed)
+
+    def is_fresh(self) -> bool:
+        with self.db.sqla_session() as session:
+            refreshed_at = session.query(func.max(CanvasCourse.seen_at)).scalar()
+        return refreshed_at is not None and refreshed_at > datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+
+    def query(
+        self,
+        term: Optional[int] = None,
+        search: Optional[str] = None,
+        ids: "Optional[list[int]]" = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> "tuple[list[dict], int]":
+        """
+        Find courses, ordered by name.
+
+        Args:
+            term: Only courses in this enrollment term.
+            search: Only courses whose name or course code contains this string, case insensitive.
+            ids: Only courses with these ids.
+            limit, offset: Page of the result to return.
+
+        Returns:
+            The page of courses, and the total number of matching courses.
+        """
+        if not self.is_fresh():
+            return self.__query_live(term, search, ids, limit, offset)
+
+        with self.db.sqla_session() as session:
+            query = session.query(CanvasCourse)
+            if term is not None:
+                query = query.filter(CanvasCourse.term_id == term)
+            if search:
+                escaped = search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                query = query.filter(CanvasCourse.search_text.like(f"%{escaped}%", escape="\\"))
+            if ids is not None:
+                query = query.filter(CanvasCourse.id.in_(ids))
+            total = query.count()
+            query = query.order_by(CanvasCourse.name, CanvasCourse.id).offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            return [_public(c.id, c.name, c.course_code, c.term_id) for c in query], total
+
+    def __query_live(self, term, search, ids, limit, offset) -> "tuple[list[dict], int]":
+        self.logger.info("Courses: Catalogue not refreshed, listing courses from Canvas")
+        rows = [_row(c, None) for c in self.canvas.get_courses()]
+        if term is not None:
+            rows = [r for r in rows if r["term_id"] == term]
+        if search:
+            rows = [r for r in rows if search.lower() in r["search_text"]]
+        if ids is not None:
+            rows = [r for r in rows if r["id"] in ids]
+        rows.sort(key=lambda r: (r["name"] or "", r["id"]))
+        page = rows[offset : None if limit is None else offset + limit]
+        return [_public(r["id"], r["name"], r["course_code"], r["term_id"]) for r in page], len(rows)
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _row(course: Course, seen_at: Optional[datetime]) -> dict:
+    row = {
+        "id": course.id,
+        "name": getattr(course, "name", None),
+        "course_code": getattr(course, "course_code", None),
+        "term_id": getattr(course, "enrollment_term_id", None),
+        "workflow_state": getattr(course, "workflow_state", None),
+    }
+    row["search_text"] = "\n".join(str(row[k] or "") for k in ("name", "course_code")).lower()
+    row["digest"] = hashlib.sha256(json.dumps(row, sort_keys=True).encode()).hexdigest()
+    row["seen_at"] = seen_at
+    return row
+
+
+def _public(id: int, name: Optional[str], course_code: Optional[str], term_id: Optional[int]) -> dict:
+    return {"id": id, "name": name, "course_code": course_code, "term_id": term_id}
@@ -1,15 +1,39 @@
+import json
 import logging
 import os
 import sys
 from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from time import sleep
 from typing import Optional
 
 from psycopg2.errors import NoDataFound, UniqueViolation
-from sqlalchemy import ARRAY, Boolean, Column, Integer, String, create_engine, select
+from sqlalchemy import (
+    ARRAY,
+    DDL,
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    cast,
+    create_engine,
+    event,
+    false,
+    func,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base, sessionmaker  # type: ignore
 
+from te_canvas import log, migrations, tracing
 from te_canvas.log import get_logger
 
 
@@ -38,7 +62,12 @@ class Connection(Base):
     canvas_group = Column(String, primary_key=True)
     te_group = Column(String, primary_key=True)
     te_type = Column(String)
-    delete_flag = Column(Boolean, default=False)
+    delete_flag = Column(Boolean, default=False, server_default=false(), nullable=False)
+
+
+# Indexes and constraints are also created on existing databases by te_canvas.migrations
+Index("ix_connections_canvas_group_delete_flag", Connection.canvas_group, Connection.delete_flag)
+Index("ix_connections_te_group", Connection.te_group)
 
 
 class TemplateConfig(Base):
@@ -50,6 +79,17 @@ class TemplateConfig(Base):
     canvas_group = Column(String)
 
 
+Index("ix_template_config_canvas_group", TemplateConfig.canvas_group)
+Index(
+    "uq_template_config",
+    TemplateConfig.config_type,
+    TemplateConfig.te_type,
+    TemplateConfig.te_field,
+    func.coalesce(TemplateConfig.canvas_group, ""),
+    unique=True,
+)
+
+
 class WhitelistTypes(Base):
     __tablename__ = "whitelist_types"
     extid = Column(String, primary_key=True)
@@ -61,6 +101,179 @@ class SyncStatus(Base):
     status = Column(String)
 
 
+# Postgres NOTIFY channel for sync status and progress, see te_canvas.status_feed
+SYNC_STATUS_CHANNEL = "sync_status"
+
+
+def notify_sync_status(session, canvas_group: str, **payload):
+    """
+    Notify listeners on SYNC_STATUS_CHANNEL, when session commits.
+    """
+    message = json.dumps({"canvas_group": canvas_group, **payload})
+    session.execute(select(func.pg_notify(SYNC_STATUS_CHANNEL, message)))
+
+
+class SyncCheckpoint(Base):
+    """
+    Progress of an in-flight sync of one Canvas group, so that it can be resumed after a crash or
+    shutdown instead of starting over.
+
+    phase is "deleting" while old events are removed and "creating" while new events are added.
+    state is a fingerprint of the TimeEdit and template state the sync was started for, a checkpoint
+    is only resumed if this is unchanged. written holds the ids of reservations already created on
+    Canvas. The row is removed when the sync completes.
+    """
+
+    __tablename__ = "sync_checkpoints"
+    canvas_group = Column(String, primary_key=True)
+    phase = Column(String)
+    state = Column(String)
+    written = Column(ARRAY(String), default=[])
+
+
+class SyncRun(Base):
+    """
+    One sync of one Canvas group, see te_canvas.ledger. cycle identifies the sync_all() run. phases
+    maps phase name to seconds spent.
+    """
+
+    __tablename__ = "sync_runs"
+    cycle = Column(String, primary_key=True)
+    canvas_group = Column(String, primary_key=True)
+    started_at = Column(DateTime(timezone=True), index=True)
+    ended_at = Column(DateTime(timezone=True))
+    duration = Column(Float)
+    outcome = Column(String)
+    error_class = Column(String)
+    reservations = Column(Integer)
+    events = Column(Integer)
+    phases = Column(JSON)
+    timeedit_calls = Column(Integer)
+    canvas_calls = Column(Integer)
+    timeedit_bytes = Column(BigInteger)
+    canvas_bytes = Column(BigInteger)
+
+
+Index("ix_sync_runs_group_started", SyncRun.canvas_group, SyncRun.started_at)
+
+
+class CacheEntry(Base):
+    """
+    TimeEdit metadata cached by cache.MetadataCache, shared by all API workers and the syncer.
+    """
+
+    __tablename__ = "timeedit_cache"
+    key = Column(String, primary_key=True)
+    value = Column(JSON)
+    expires_at = Column(DateTime(timezone=True))
+
+
+class MirroredObject(Base):
+    """
+    Copy of a TimeEdit object of a whitelisted type, see mirror.ObjectMirror.
+
+    fields is the object as returned by TimeEdit.find_objects. search_text holds its search field
+    values, lowercased, and has a trigram index for substring search.
+    """
+
+    __tablename__ = "timeedit_objects"
+    te_type = Column(String, primary_key=True)
+    extid = Column(String, primary_key=True, index=True)
+    fields = Column(JSON)
+    search_text = Column(String)
+    sort_key = Column(String)
+    digest = Column(String)
+    seen_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(
+            "ix_timeedit_objects_search_text",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+        Index("ix_timeedit_objects_order", "te_type", "sort_key", "extid"),
+    )
+
+
+event.listen(MirroredObject.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+class MirrorState(Base):
+    """
+    When the objects of a type were last mirrored completely.
+    """
+
+    __tablename__ = "timeedit_mirror_state"
+    te_type = Column(String, primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True))
+    count = Column(Integer)
+
+
+class CanvasCourse(Base):
+    """
+    Copy of a Canvas course, see courses.CourseCatalogue.
+
+    search_text holds the name and course code, lowercased, and has a trigram index for substring
+    search.
+    """
+
+    __tablename__ = "canvas_courses"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    course_code = Column(String)
+    term_id = Column(Integer, index=True)
+    workflow_state = Column(String)
+    search_text = Column(String)
+    digest = Column(String)
+    seen_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(
+            "ix_canvas_courses_search_text",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
+
+
+event.listen(CanvasCourse.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+class SingleflightResult(Base):
+    """
+    Short-lived result of an upstream call, shared between API processes by
+    singleflight.SharedGroup.
+    """
+
+    __tablename__ = "singleflight_results"
+    key = Column(String, primary_key=True)
+    value = Column(JSON)
+    expires_at = Column(DateTime(timezone=True))
+
+
+class DataVersion(Base):
+    """
+    Counter per table (or other data source), bumped on every change, used for HTTP ETags (see
+    te_canvas.conditional).
+    """
+
+    __tablename__ = "data_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+
+def bump_version(session, name: str):
+    """
+    Bump the version of name, as part of the changes made in session.
+    """
+    stmt = insert(DataVersion).values(name=name, version=1)
+    session.execute(
+        stmt.on_conflict_do_update(index_elements=[DataVersion.name], set_={"version": DataVersion.version + 1})
+    )
+
+
 class Test(Base):
     """
     TODO: Can we avoid having this here and do this in test_db, perhaps dynamically in a test case?
@@ -85,7 +298,7 @@ class DB:
 
         Database settings can come either from env vars or kwargs, where kwargs have precedence.
         """
-        logger = get_logger()
+        logger = get_logger(__name__)
 
         env_var_mapping = {
             "hostname": "POSTGRES_HOSTNAME",
@@ -100,7 +313,7 @@ class DB:
 
         for k, v in env_var_mapping.items():
             if k not in conn:
-                logger.critical(f"Missing env var: {v}")
+                logger.critical("Missing env var: %s", v)
                 sys.exit(1)
 
         self.conn_str = "postgresql+psycopg2://{}:{}@{}:{}/{}".format(
@@ -112,14 +325,17 @@ class DB:
         )
 
         engine = create_engine(self.conn_str, pool_size=50, max_overflow=0)
+        self.engine = engine
         self.Session = sessionmaker(bind=engine)
+        event.listen(engine, "after_cursor_execute", _count_statement)
 
-        logging.getLogger("sqlalchemy.engine").addHandler(logger.handlers[0])
+        logging.getLogger("sqlalchemy.engine").addHandler(log.handler())
         logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 
         while True:
             try:
                 Base.metadata.create_all(engine)
+                migrations.migrate(engine)
                 break
             except OperationalError:
                 logger.info("Retrying database connection")
@@ -127,18 +343,20 @@ class DB:
 
     @contextmanager
     def sqla_session(self):
-        session = self.Session()
-        try:
-            yield session
-            session.commit()
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close()
+        with tracing.span("db.session", statements=0):
+            session = self.Session()
+            try:
+                yield session
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
 
     def add_connection(self, canvas_group: str, te_group: str, te_type: str):
         with self.sqla_session() as session:
+            bump_version(session, "connections")
             q = session.query(Connection).filter(
                 Connection.te_group == te_group,
                 Connection.canvas_group == canvas_group,
@@ -158,6 +376,7 @@ class DB:
 
     def delete_connection(self, canvas_group: str, te_group: str):
         with self.sqla_session() as session:
+            bump_version(session, "connections")
             row = (
                 session.query(Connection)
                 .filter(
@@ -170,6 +389,70 @@ class DB:
                 raise DeleteFlagAlreadySet
             row.delete_flag = True
 
+    def apply_connections(
+        self,
+        adds: "list[tuple[str, str, str]]",
+        deletes: "list[tuple[str, str]]",
+    ) -> "tuple[list[str], list[str]]":
+        """
+        Add connections (canvas_group, te_group, te_type) and flag connections (canvas_group,
+        te_group) for deletion, in one transaction. Pairs must be unique across adds and deletes.
+
+        The sync status of each affected Canvas group is reset once, as by the single connection
+        setters.
+
+        Returns:
+            A result for each add: "created", "exists" or "flagged" (flagged for deletion but not
+            yet deleted), and for each delete: "deleted", "not_found" or "flagged" (already).
+        """
+        with self.sqla_session() as session:
+            created: set[tuple[str, str]] = set()
+            for chunk in _chunks(adds, BULK_CHUNK_SIZE):
+                stmt = (
+                    insert(Connection)
+                    .values([{"canvas_group": c, "te_group": t, "te_type": ty} for c, t, ty in chunk])
+                    .on_conflict_do_nothing(index_elements=["canvas_group", "te_group"])
+                    .returning(Connection.canvas_group, Connection.te_group)
+                )
+                created.update((r[0], r[1]) for r in session.execute(stmt))
+
+            deleted: set[tuple[str, str]] = set()
+            for chunk in _chunks(deletes, BULK_CHUNK_SIZE):
+                stmt = (
+                    update(Connection)
+                    .where(tuple_(Connection.canvas_group, Connection.te_group).in_(chunk))
+                    .where(Connection.delete_flag == False)
+                    .values(delete_flag=True)
+                    .returning(Connection.canvas_group, Connection.te_group)
+                )
+                deleted.update((r[0], r[1]) for r in session.execute(stmt))
+
+            # The state of the pairs left unchanged decides why
+            rest = [(c, t) for c, t, _ in adds if (c, t) not in created] + [p for p in deletes if p not in deleted]
+            flagged: dict[tuple[str, str], bool] = {}
+            for chunk in _chunks(rest, BULK_CHUNK_SIZE):
+                query = session.query(Connection.canvas_group, Connection.te_group, Connection.delete_flag).filter(
+                    tuple_(Connection.canvas_group, Connection.te_group).in_(chunk)
+                )
+                flagged.update({(c, t): d for c, t, d in query})
+
+            affected = sorted({c for c, _ in created | deleted})
+            if affected:
+                bump_version(session, "connections")
+            for chunk in _chunks(affected, BULK_CHUNK_SIZE):
+                stmt = insert(SyncStatus).values([{"canvas_group": c, "status": ""} for c in chunk])
+                session.execute(stmt.on_conflict_do_update(index_elements=["canvas_group"], set_={"status": ""}))
+                for c in chunk:
+                    notify_sync_status(session, c, status="")
+
+            add_results = [
+                "created" if (c, t) in created else "flagged" if flagged.get((c, t)) else "exists" for c, t, _ in adds
+            ]
+            delete_results = [
+                "deleted" if p in deleted else "flagged" if flagged.get(p) else "not_found" for p in deletes
+            ]
+            return add_results, delete_results
+
     def get_connections(self, canvas_group: Optional[str] = None) -> "list[tuple[str, str, str, bool]]":
         with self.sqla_session() as session:
             # NOTE: We cannot return a list of Connection here, since the Session they are connected
@@ -183,21 +466,142 @@ class DB:
 
     def get_sync_status(self, canvas_group):
         with self.sqla_session() as session:
-            query = session.query(SyncStatus).where(SyncStatus.canvas_group == canvas_group)
-            if query.count() != 1:
+            row = session.get(SyncStatus, canvas_group)
+            if row is None:
                 session.add(SyncStatus(canvas_group=canvas_group, status=""))
                 return ""
-            return query.one().status
+            return row.status
+
+    def get_sync_statuses(self, canvas_groups: "list[str]") -> "dict[str, str]":
+        """
+        Get the sync status of many Canvas groups. Groups without a status get "".
+        """
+        with self.sqla_session() as session:
+            query = session.query(SyncStatus).filter(SyncStatus.canvas_group.in_(canvas_groups))
+            return {g: "" for g in canvas_groups} | {r.canvas_group: r.status for r in query}
 
     def update_sync_status(self, canvas_group, status: str):
         with self.sqla_session() as session:
-            query = session.query(SyncStatus).filter(
-                SyncStatus.canvas_group == canvas_group,
+            stmt = insert(SyncStatus).values(canvas_group=canvas_group, status=status)
+            session.execute(stmt.on_conflict_do_update(index_elements=["canvas_group"], set_={"status": status}))
+            notify_sync_status(session, canvas_group, status=status)
+
+    def notify_sync_progress(self, canvas_group: str, written: int, total: int):
+        with self.sqla_session() as session:
+            percent = 100 * written // total if total else 100
+            notify_sync_status(session, canvas_group, progress={"written": written, "total": total, "percent": percent})
+
+    def add_sync_runs(self, rows: "list[dict]", retention_days: float):
+        """
+        Upsert sync runs (see SyncRun and te_canvas.ledger) in one statement, and delete runs older
+        than retention_days.
+        """
+        with self.sqla_session() as session:
+            if rows:
+                stmt = insert(SyncRun).values(rows)
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["cycle", "canvas_group"],
+                        set_={c: stmt.excluded[c] for c in rows[0] if c not in ("cycle", "canvas_group")},
+                    )
+                )
+            cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+            session.query(SyncRun).filter(SyncRun.started_at < cutoff).delete()
+
+    def get_sync_runs(
+        self,
+        canvas_group: Optional[str] = None,
+        outcome: Optional[str] = None,
+        since: Optional[datetime] = None,
+        order: str = "recent",
+        limit: int = 100,
+    ) -> "list[dict]":
+        """
+        Get sync runs, most recent or longest first.
+        """
+        with self.sqla_session() as session:
+            query = session.query(SyncRun)
+            if canvas_group is not None:
+                query = query.filter(SyncRun.canvas_group == canvas_group)
+            if outcome is not None:
+                query = query.filter(SyncRun.outcome == outcome)
+            if since is not None:
+                query = query.filter(SyncRun.started_at >= since)
+            query = query.order_by(SyncRun.duration.desc() if order == "duration" else SyncRun.started_at.desc())
+            return [{c.name: getattr(r, c.name) for c in SyncRun.__table__.columns} for r in query.limit(limit)]
+
+    def get_sync_run_summary(self, since: datetime, limit: int = 100) -> "list[dict]":
+        """
+        Per Canvas group aggregates of the runs started after since, most expensive (by total
+        duration) first.
+        """
+        with self.sqla_session() as session:
+            query = (
+                session.query(
+                    SyncRun.canvas_group,
+                    func.count().label("runs"),
+                    func.count().filter(SyncRun.outcome == "synced").label("synced"),
+                    func.count().filter(SyncRun.outcome == "error").label("errors"),
+                    func.sum(SyncRun.duration).label("total_duration"),
+                    func.avg(SyncRun.duration).label("avg_duration"),
+                    func.max(SyncRun.duration).label("max_duration"),
+                    func.sum(SyncRun.timeedit_calls).label("timeedit_calls"),
+                    func.sum(SyncRun.canvas_calls).label("canvas_calls"),
+                    func.sum(SyncRun.timeedit_bytes + SyncRun.canvas_bytes).label("bytes"),
+                    func.max(SyncRun.reservations).label("max_reservations"),
+                )
+                .filter(SyncRun.started_at >= since)
+                .group_by(SyncRun.canvas_group)
+                .order_by(func.sum(SyncRun.duration).desc())
+                .limit(limit)
+            )
+            return [r._asdict() for r in query]
+
+    def get_checkpoint(self, canvas_group: str) -> "Optional[tuple[str, str, list[str]]]":
+        with self.sqla_session() as session:
+            row = session.get(SyncCheckpoint, canvas_group)
+            if row is None:
+                return None
+            return (row.phase, row.state, list(row.written or []))
+
+    def set_checkpoint(self, canvas_group: str, phase: str, state: str, written: "Optional[list[str]]" = None):
+        with self.sqla_session() as session:
+            session.merge(SyncCheckpoint(canvas_group=canvas_group, phase=phase, state=state, written=written or []))
+
+    def add_checkpoint_written(self, canvas_group: str, reservation_ids: "list[str]"):
+        with self.sqla_session() as session:
+            session.query(SyncCheckpoint).filter(SyncCheckpoint.canvas_group == canvas_group).update(
+                {SyncCheckpoint.written: func.array_cat(SyncCheckpoint.written, cast(reservation_ids, ARRAY(String)))},
+                synchronize_session=False,
             )
-            if query.count() != 1:
-                session.add(SyncStatus(canvas_group=canvas_group, status=status))
-                return
-            query.one().status = status
+
+    def delete_checkpoint(self, canvas_group: str):
+        with self.sqla_session() as session:
+            session.query(SyncCheckpoint).filter(SyncCheckpoint.canvas_group == canvas_group).delete()
+
+    def get_cache_entries(self, keys: "list[str]") -> "dict[str, tuple[object, datetime]]":
+        with self.sqla_session() as session:
+            query = session.query(CacheEntry).filter(CacheEntry.key.in_(keys))
+            return {r.key: (r.value, r.expires_at) for r in query}
+
+    def set_cache_entries(self, entries: "dict[str, object]", expires_at: datetime):
+        with self.sqla_session() as session:
+            for key, value in entries.items():
+                session.merge(CacheEntry(key=key, value=value, expires_at=expires_at))
+
+    def delete_cache_entries(self) -> int:
+        with self.sqla_session() as session:
+            bump_version(session, "timeedit_metadata")
+            return session.query(CacheEntry).delete()
+
+    def get_versions(self, names: "list[str]") -> "dict[str, int]":
+        """
+        Get data versions, see DataVersion. Data that has never changed has version 0.
+        """
+        with self.sqla_session() as session:
+            query = session.query(DataVersion).filter(DataVersion.name.in_(names))
+            versions = {r.name: r.version for r in query}
+            return {n: versions.get(n, 0) for n in names}
 
     def get_whitelist_types(self):
         with self.sqla_session() as session:
@@ -206,6 +610,7 @@ class DB:
 
     def add_whitelist_type(self, extid: str):
         with self.sqla_session() as session:
+            bump_version(session, "whitelist_types")
             duplicate_check = (
                 session.execute(select(WhitelistTypes).where(WhitelistTypes.extid == extid)).first() is None
             )
@@ -216,6 +621,7 @@ class DB:
 
     def delete_whitelist_type(self, extid: str):
         with self.sqla_session() as session:
+            bump_version(session, "whitelist_types")
             q = session.query(WhitelistTypes).filter(WhitelistTypes.extid == extid)
             if q.count() == 0:
                 raise NoDataFound
@@ -241,6 +647,7 @@ class DB:
 
     def delete_template_config(self, template_id: str):
         with self.sqla_session() as session:
+            bump_version(session, "template_config")
             q = session.query(TemplateConfig).filter(TemplateConfig.id == int(template_id))
             if q.count() == 0:
                 raise NoDataFound
@@ -248,21 +655,22 @@ class DB:
 
     def add_template_config(self, config_type: str, te_type: str, te_field: str, canvas_group: Optional[str]):
         with self.sqla_session() as session:
+            bump_version(session, "template_config")
+            # Compare canvas_group as uq_template_config does, where no group is the same as ''
+            same_group = func.coalesce(TemplateConfig.canvas_group, "") == (canvas_group or "")
             duplicate_check = (
                 session.execute(
                     select(TemplateConfig)
                     .where(TemplateConfig.config_type == config_type)
                     .where(TemplateConfig.te_type == te_type)
                     .where(TemplateConfig.te_field == te_field)
-                    .where(TemplateConfig.canvas_group == canvas_group)
+                    .where(same_group)
                 ).first()
                 is None
             )
             te_type_count = len(
                 session.execute(
-                    select(TemplateConfig)
-                    .where(TemplateConfig.config_type == config_type)
-                    .where(TemplateConfig.canvas_group == canvas_group)
+                    select(TemplateConfig).where(TemplateConfig.config_type == config_type).where(same_group)
                 ).all()
             )
             if duplicate_check is True and te_type_count < 3:
@@ -280,3 +688,19 @@ class DB:
 
 class DeleteFlagAlreadySet(Exception):
     pass
+
+
+# Rows per statement in bulk writes
+BULK_CHUNK_SIZE = 1000
+
+
+def _chunks(items: list, n: int):
+    for i in range(0, len(items), n):
+        yield items[i : i + n]
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    """
+    Count SQL statements on the current tracing span.
+    """
+    tracing.current().add("statements")
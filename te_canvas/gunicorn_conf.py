@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the API, see Dockerfile_api.
+
+Threaded workers let requests that only touch the database be served while other requests wait on
+TimeEdit or Canvas; the number of concurrent upstream requests is bounded separately, see
+te_canvas.offload.
+"""
+
+import os
+import tempfile
+
+from te_canvas import metrics
+
+bind = "0.0.0.0:5000"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_WORKERS", 4))
+threads = int(os.environ.get("WEB_THREADS", 32))
+
+# Requests time out with 504 after REQUEST_TIMEOUT (see te_canvas.offload), well before gunicorn
+# kills the worker.
+timeout = int(float(os.environ.get("REQUEST_TIMEOUT", 30))) + 30
+graceful_timeout = 30
+keepalive = 5
+
+# Workers share their metrics through snapshot files in this directory, see te_canvas.metrics
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="te-canvas-metrics-"))
+
+
+def child_exit(server, worker):
+    metrics.remove_snapshot(os.environ["METRICS_DIR"], worker.pid)
@@ -0,0 +1,202 @@
+"""
+Ledger of sync runs, for finding expensive Canvas groups and regressions.
+
+Each sync of a Canvas group is recorded as a GroupRun: start and end time, time spent per phase,
+number of reservations and events, calls made to and bytes received from each upstream, and the
+outcome. The run is held in a context variable while the group syncs, so that the upstream clients
+can count calls and bytes without being passed the run: retry.call() counts every attempt, and
+response hooks on the HTTP sessions count bytes. The asyncio engine gets this for free since tasks
+inherit the context; threads started by a sync must be given a copy of it (contextvars.copy_context).
+
+The syncer collects the runs of a cycle and writes them with one batched upsert when the cycle
+ends (see db.SyncRun and DB.add_sync_runs). Runs older than SYNC_RUNS_RETENTION days are deleted at
+the same time.
+
+Outcomes:
+    synced:    Events were replaced.
+    unchanged: Skipped by change detection.
+    error:     Failed, error_class holds the class name of the exception.
+    skipped:   Not started or interrupted, e.g. upstream unavailable or shutdown.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from te_canvas import tracing
+
+_current: "ContextVar[Optional[GroupRun]]" = ContextVar("sync_run", default=None)
+
+
+class GroupRun:
+    """
+    Measurements of one sync of one Canvas group. Thread safe.
+    """
+
+    def __init__(self, cycle: str, canvas_group: str):
+        self.cycle = cycle
+        self.canvas_group = canvas_group
+        self.started_at = datetime.now(timezone.utc)
+        self.ended_at: Optional[datetime] = None
+        self.lock = threading.Lock()
+        self.phases: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.bytes: dict[str, int] = {}
+        self.reservations = 0
+        self.events = 0
+        self.status: Optional[str] = None
+        self.outcome: Optional[str] = None
+        self.error_class: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Add the time spent in the block to phase name. The block is also a tracing span.
+        """
+        start = time.perf_counter()
+        try:
+            with tracing.span(name):
+                yield
+        finally:
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def add_call(self, upstream: str):
+        with self.lock:
+            self.calls[upstream] = self.calls.get(upstream, 0) + 1
+
+    def add_bytes(self, upstream: str, n: int):
+        with self.lock:
+            self.bytes[upstream] = self.bytes.get(upstream, 0) + n
+
+    def set_status(self, status: str):
+        """
+        Record a sync status written for the group. For "error", the exception being handled is
+        recorded as the cause.
+        """
+        self.status = status
+        if status == "error" and self.error_class is None:
+            e = sys.exc_info()[1]
+            self.error_class = type(e).__name__ if e is not None else "Error"
+
+    def finish(self, synced: bool, error: Optional[BaseException] = None):
+        """
+        End the run and derive its outcome from the return value of the sync and the last status
+        written.
+        """
+        self.ended_at = datetime.now(timezone.utc)
+        if error is not None:
+            self.error_class = type(error).__name__
+            self.outcome = "error"
+        elif synced:
+            self.outcome = "synced"
+        elif self.status == "error":
+            self.outcome = "error"
+        elif self.status == "success":
+            self.outcome = "unchanged"
+        else:
+            self.outcome = "skipped"
+
+    def duration(self) -> float:
+        end = self.ended_at or datetime.now(timezone.utc)
+        return (end - self.started_at).total_seconds()
+
+    def row(self) -> dict:
+        """
+        Column values for db.SyncRun.
+        """
+        with self.lock:
+            return {
+                "cycle": self.cycle,
+                "canvas_group": self.canvas_group,
+                "started_at": self.started_at,
+                "ended_at": self.ended_at,
+                "duration": self.duration(),
+                "outcome": self.outcome,
+                "error_class": self.error_class,
+                "reservations": self.reservations,
+                "events": self.events,
+                "phases": {k: round(v, 3) for k, v in self.phases.items()},
+                "timeedit_calls": self.calls.get("timeedit", 0),
+                "canvas_calls": self.calls.get("canvas", 0),
+                "timeedit_bytes": self.bytes.get("timeedit", 0),
+                "canvas_bytes": self.bytes.get("canvas", 0),
+            }
+
+
+@contextmanager
+def run(cycle: str, canvas_group: str) -> Iterator[GroupRun]:
+    """
+    Make a new GroupRun the current run for the duration of the block.
+    """
+    group_run = GroupRun(cycle, canvas_group)
+    token = _current.set(group_run)
+    try:
+        yield group_run
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[GroupRun]:
+    return _current.get()
+
+
+# ---- Recording on the current run --------------------------------------------
+#
+# All of these are no-ops outside of a sync, e.g. in the API.
+
+
+def phase(name: str):
+    group_run = _current.get()
+    return group_run.phase(name) if group_run is not None else nullcontext()
+
+
+def count_call(upstream: str):
+    group_run = _current.get()
+    if group_run is not None:
+        group_run.add_call(upstream)
+
+
+def count_bytes(upstream: str, n: int):
+    group_run = _current.get()
+    if group_run is not None:
+        group_run.add_bytes(upstream, n)
+
+
+def set_sizes(reservations: int, events: int):
+    group_run = _current.get()
+    if group_run is not None:
+        group_run.reservations = reservations
+        group_run.events = events
+
+
+def set_status(status: str):
+    group_run = _current.get()
+    if group_run is not None:
+        group_run.set_status(status)
+
+
+def requests_hook(upstream: str):
+    """
+    Response hook for a requests Session, counting bytes received.
+    """
+
+    def hook(response, *args, **kwargs):
+        count_bytes(upstream, len(response.content))
+
+    return hook
+
+
+def httpx_hook(upstream: str):
+    """
+    Response event hook for an httpx AsyncClient, counting bytes received.
+    """
+
+    async def hook(response):
+        count_bytes(upstream, len(await response.aread()))
+
+    return hook
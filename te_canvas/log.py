@@ -1,19 +1,145 @@
+"""
+Logging.
+
+All loggers are children of the "te-canvas" logger, which has the only handler. Modules get their
+logger with get_logger(__name__), once at import or construction. Levels are set once, from env vars:
+
+    LOG_LEVEL:       Level of all modules, default INFO.
+    LOG_LEVELS:      Per-module levels overriding LOG_LEVEL, e.g. "timeedit=DEBUG,translator=WARNING".
+    LOG_RATE_LIMIT:  Messages per LOG_RATE_WINDOW seconds from the same logging call, at level WARNING
+                     or below, before further ones are suppressed. The first message after the window
+                     tells how many were suppressed. Unset or 0 disables, so that no sync progress
+                     is lost unless a limit is asked for.
+    LOG_RATE_WINDOW: Default 60.
+    LOG_PAYLOAD_CHARS: Length at which payloads logged with summarize() are cut. 0 disables. Default 1000.
+
+Log with %-style arguments, not f-strings, so that messages below the level are never formatted.
+Data structures (reservations, API responses) are logged at DEBUG, wrapped in summarize().
+"""
+
 import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Optional
+
+ROOT = "te-canvas"
+
+# Pass as extra to exempt a message from rate limiting, e.g. the API request log
+NO_RATE_LIMIT = {"rate_limit": False}
+
+_lock = threading.Lock()
+_handler: Optional[logging.Handler] = None
+_payload_chars = 1000
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Suppress repetitive messages: at most limit records per window seconds from each logging call
+    site. Records above max_level, or logged with extra=NO_RATE_LIMIT, are never suppressed.
+    """
+
+    def __init__(self, limit: int, window: float, max_level: int = logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.max_level = max_level
+        self.lock = threading.Lock()
+        # Call site -> [window start, records in window, suppressed in window]
+        self.counts: dict[tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno > self.max_level or not getattr(record, "rate_limit", True):
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            count = self.counts.get(key)
+            if count is None or now - count[0] >= self.window:
+                suppressed = count[2] if count is not None else 0
+                if len(self.counts) > 10000:
+                    self.counts.clear()
+                self.counts[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+                return True
+            if count[1] < self.limit:
+                count[1] += 1
+                return True
+            count[2] += 1
+            return False
+
+
+class summarize:
+    """
+    Lazy summary of a payload for logging, formatted only if the message is emitted: the length of
+    collections, and the repr cut at LOG_PAYLOAD_CHARS.
+    """
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        s = repr(self.payload) if not isinstance(self.payload, str) else self.payload
+        if 0 < _payload_chars < len(s):
+            s = f"{s[:_payload_chars]}... ({len(s)} chars)"
+        if isinstance(self.payload, (list, tuple, set, dict)):
+            s = f"{type(self.payload).__name__} of {len(self.payload)}: {s}"
+        return s
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Invalid log level: {name}")
+    return level
+
+
+def _configure() -> logging.Handler:
+    """
+    Set up the handler and levels of the te-canvas loggers from env vars. Done once per process.
+    """
+    global _handler, _payload_chars
+    with _lock:
+        if _handler is not None:
+            return _handler
+        root = logging.getLogger(ROOT)
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s"))
+        try:
+            root.setLevel(_level(os.environ.get("LOG_LEVEL", "INFO")))
+            _payload_chars = int(os.environ.get("LOG_PAYLOAD_CHARS", 1000))
+            for spec in filter(None, os.environ.get("LOG_LEVELS", "").split(",")):
+                module, _, level = spec.partition("=")
+                logging.getLogger(f"{ROOT}.{module.strip()}").setLevel(_level(level))
+            handler.addFilter(
+                RateLimitFilter(int(os.environ.get("LOG_RATE_LIMIT", 0)), float(os.environ.get("LOG_RATE_WINDOW", 60)))
+            )
+        except ValueError as e:
+            root.addHandler(handler)
+            root.critical("Invalid log config: %s", e)
+            sys.exit(1)
+        root.addHandler(handler)
+        _handler = handler
+        return handler
 
-from flask import current_app
 
+def handler() -> logging.Handler:
+    """
+    The handler of the te-canvas loggers, for other libraries' loggers (e.g. SQLAlchemy).
+    """
+    return _handler or _configure()
 
-# TODO: Uses Flask logger if available? What is happening here?
-def get_logger():
-    if current_app:
-        logger = current_app.logger
-    else:
-        logger = logging.getLogger("te-canvas")
-        if not logger.handlers:
-            formatter = logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s")
-            handler = logging.StreamHandler()
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
 
-    return logger
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    """
+    Logger for a module, given its __name__: te_canvas.timeedit logs to "te-canvas.timeedit".
+    """
+    if _handler is None:
+        _configure()
+    if name is None or name in ("te_canvas", "__main__"):
+        return logging.getLogger(ROOT)
+    return logging.getLogger(f"{ROOT}.{name.removeprefix('te_canvas.')}")
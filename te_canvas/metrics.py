@@ -0,0 +1,409 @@
+"""
+Metrics in the Prometheus text format, for capacity and saturation monitoring.
+
+Metrics are defined at module level below and updated where things happen: upstream call latency
+in the TimeEdit and Canvas clients, sync durations and worker utilisation in the syncers, cache
+lookups in cache.MetadataCache, request latency and the offload pool in the API.
+
+The sync process serves them on port METRICS_PORT (default 9100, 0 disables, see serve()). The API
+serves them on /metrics. With several gunicorn workers, each worker writes a snapshot of its metrics
+to METRICS_DIR every few seconds (set up in gunicorn_conf.py), and /metrics merges the snapshots of
+all workers: counters and histograms are summed, gauges are merged as declared (sum, min or max).
+Other workers' values are thus up to SNAPSHOT_INTERVAL seconds old.
+
+Labels must have few distinct values: operation names and endpoint templates, never ids.
+"""
+
+import functools
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlparse
+
+from te_canvas.log import get_logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SNAPSHOT_INTERVAL = 5.0
+
+# Seconds, for upstream calls and syncs
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _key(labelnames: "tuple[str, ...]", labels: dict) -> "tuple[str, ...]":
+    return tuple(str(labels[n]) for n in labelnames)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: "tuple[str, ...]" = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values: dict[tuple[str, ...], object] = {}
+
+    def samples(self) -> "dict[tuple[str, ...], object]":
+        with self.lock:
+            return {k: list(v) if isinstance(v, list) else v for k, v in self.values.items()}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. Either set directly, or computed by callback when collected. merge
+    is how the values of several processes are combined: "sum", "min" or "max".
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: "tuple[str, ...]" = (),
+        merge: str = "sum",
+        callback: "Optional[Callable[[], dict[tuple[str, ...], float]]]" = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.merge = merge
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[_key(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> "dict[tuple[str, ...], object]":
+        if self.callback is not None:
+            try:
+                return dict(self.callback())
+            except Exception:
+                return {}
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: "tuple[str, ...]" = (), buckets: Iterable[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _key(self.labelnames, labels)
+        with self.lock:
+            # Per bucket counts (not cumulative), then +Inf, sum and count
+            v = self.values.get(key)
+            if v is None:
+                v = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            i = next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+            v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: "tuple[str, ...]" = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))  # type: ignore
+
+    def gauge(self, name: str, help: str, labelnames: "tuple[str, ...]" = (), **kwargs) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, **kwargs))  # type: ignore
+
+    def histogram(self, name: str, help: str, labelnames: "tuple[str, ...]" = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, **kwargs))  # type: ignore
+
+    def snapshot(self) -> "dict[str, list]":
+        """
+        Current values as JSON, for merging across processes: name -> [[label values, value], ...].
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {m.name: [[list(k), v] for k, v in m.samples().items()] for m in metrics}
+
+    def render(self, snapshots: "Iterable[dict[str, list]]" = ()) -> str:
+        """
+        Prometheus text format of the metrics of this process merged with snapshots of others.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        merged = {m.name: m.samples() for m in metrics}
+        for snapshot in snapshots:
+            for m in metrics:
+                for k, v in snapshot.get(m.name, []):
+                    merged[m.name][tuple(k)] = _merge(m, merged[m.name].get(tuple(k)), v)
+
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            for k, v in sorted(merged[m.name].items()):
+                labels = dict(zip(m.labelnames, k))
+                if isinstance(m, Histogram):
+                    cumulative = 0
+                    for b, count in zip(m.buckets + (float("inf"),), v[:-2]):  # type: ignore
+                        cumulative += count
+                        le = "+Inf" if b == float("inf") else repr(float(b))
+                        lines.append(f"{m.name}_bucket{_labels(labels | {'le': le})} {cumulative}")
+                    lines.append(f"{m.name}_sum{_labels(labels)} {v[-2]}")  # type: ignore
+                    lines.append(f"{m.name}_count{_labels(labels)} {v[-1]}")  # type: ignore
+                else:
+                    lines.append(f"{m.name}{_labels(labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(metric: Metric, a, b):
+    if a is None:
+        return b
+    if isinstance(metric, Histogram):
+        return [x + y for x, y in zip(a, b)]
+    if isinstance(metric, Gauge) and metric.merge == "min":
+        return min(a, b)
+    if isinstance(metric, Gauge) and metric.merge == "max":
+        return max(a, b)
+    return a + b
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+REGISTRY = Registry()
+
+# ---- Metrics -----------------------------------------------------------------
+
+TIMEEDIT_CALL_SECONDS = REGISTRY.histogram(
+    "te_canvas_timeedit_call_seconds", "Latency of TimeEdit SOAP calls, per attempt.", ("operation", "outcome")
+)
+CANVAS_CALL_SECONDS = REGISTRY.histogram(
+    "te_canvas_canvas_call_seconds", "Latency of Canvas API calls.", ("method", "endpoint", "status")
+)
+CANVAS_RATE_LIMIT_REMAINING = REGISTRY.gauge(
+    "te_canvas_canvas_rate_limit_remaining",
+    "Canvas X-Rate-Limit-Remaining of the latest response.",
+    merge="min",
+)
+SYNC_GROUP_SECONDS = REGISTRY.histogram(
+    "te_canvas_sync_group_seconds", "Duration of group syncs.", ("outcome",), buckets=DURATION_BUCKETS
+)
+SYNC_CYCLE_SECONDS = REGISTRY.histogram(
+    "te_canvas_sync_cycle_seconds", "Duration of sync cycles over all groups.", buckets=DURATION_BUCKETS
+)
+SYNC_GROUPS_PENDING = REGISTRY.gauge("te_canvas_sync_groups_pending", "Groups of the current cycle not yet started.")
+SYNC_WORKERS_BUSY = REGISTRY.gauge("te_canvas_sync_workers_busy", "Groups being synced right now.")
+SYNC_WORKERS = REGISTRY.gauge("te_canvas_sync_workers", "Groups that can be synced concurrently (MAX_WORKERS).")
+CACHE_LOOKUPS = REGISTRY.counter(
+    "te_canvas_cache_lookups_total", "Metadata cache lookups by result: local_hit, db_hit or miss.", ("result",)
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "te_canvas_http_request_seconds", "Latency of API requests.", ("method", "endpoint", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge("te_canvas_http_requests_in_flight", "API requests being served.")
+
+
+def _breakers() -> "dict[tuple[str, ...], float]":
+    from te_canvas import retry
+
+    return {(name,): float(retry.breaker(name).is_open()) for name in ("timeedit", "canvas")}
+
+
+CIRCUIT_OPEN = REGISTRY.gauge(
+    "te_canvas_circuit_open",
+    "1 if the upstream's circuit breaker is open.",
+    ("upstream",),
+    merge="max",
+    callback=_breakers,
+)
+
+
+# ---- Instrumentation helpers -------------------------------------------------
+
+_ID_RE = re.compile(r"/(\d+|[0-9a-f]{8}-[0-9a-f-]{27,})(?=/|$)")
+
+
+def endpoint(path: str) -> str:
+    """
+    Endpoint template of a Canvas API path, with ids replaced, e.g. /api/v1/calendar_events/:id.
+    """
+    return _ID_RE.sub("/:id", urlparse(path).path)
+
+
+def timed(histogram: Histogram, fn: Callable, **labels) -> Callable:
+    """
+    Wrap fn to observe the latency of each call in histogram, with label outcome "ok" or "error".
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            res = fn(*args, **kwargs)
+            outcome = "ok"
+            return res
+        finally:
+            histogram.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    return wrapper
+
+
+def observe_canvas_response(method: str, url: str, status: int, seconds: float, headers):
+    CANVAS_CALL_SECONDS.observe(seconds, method=method, endpoint=endpoint(url), status=status)
+    remaining = headers.get("X-Rate-Limit-Remaining")
+    if remaining is not None:
+        try:
+            CANVAS_RATE_LIMIT_REMAINING.set(float(remaining))
+        except ValueError:
+            pass
+
+
+def requests_hook(response, *args, **kwargs):
+    """
+    Response hook for the requests Session of canvasapi.
+    """
+    observe_canvas_response(
+        response.request.method, response.url, response.status_code, response.elapsed.total_seconds(), response.headers
+    )
+
+
+# ---- Exposition --------------------------------------------------------------
+
+
+def render() -> str:
+    """
+    Metrics of this process, merged with the snapshots of other workers if METRICS_DIR is set.
+    """
+    directory = os.environ.get("METRICS_DIR")
+    snapshots = []
+    if directory:
+        _start_snapshots(directory)
+        for name in os.listdir(directory):
+            if not name.endswith(".json") or name == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass  # Worker exiting or writing, skip it this time
+    return REGISTRY.render(snapshots)
+
+
+_snapshot_thread: Optional[threading.Thread] = None
+_snapshot_lock = threading.Lock()
+
+
+def start_snapshots():
+    """
+    Start writing snapshots of this process's metrics, if METRICS_DIR is set.
+    """
+    directory = os.environ.get("METRICS_DIR")
+    if directory:
+        _start_snapshots(directory)
+
+
+def _start_snapshots(directory: str):
+    global _snapshot_thread
+    with _snapshot_lock:
+        if _snapshot_thread is not None:
+            return
+
+        def write():
+            path = os.path.join(directory, f"{os.getpid()}.json")
+            while True:
+                try:
+                    with open(path + ".tmp", "w") as f:
+                        json.dump(REGISTRY.snapshot(), f)
+                    os.replace(path + ".tmp", path)
+                except OSError as e:
+                    get_logger(__name__).warning("Failed to write metrics snapshot: %s", e)
+                time.sleep(SNAPSHOT_INTERVAL)
+
+        _snapshot_thread = threading.Thread(target=write, name="metrics-snapshot", daemon=True)
+        _snapshot_thread.start()
+
+
+def remove_snapshot(directory: str, pid: int):
+    """
+    Remove the snapshot of an exited worker.
+    """
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def serve(port: int):
+    """
+    Serve /metrics on port in a background thread, for processes without a web server (the syncer).
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    get_logger(__name__).info("Serving metrics on port %s", port)
+    return server
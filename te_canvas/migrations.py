@@ -0,0 +1,113 @@
+"""
+Schema migrations.
+
+Tables are created from the models in te_canvas.db with Base.metadata.create_all, which only creates
+missing tables and never changes existing ones. Changes to existing tables (indexes, constraints)
+are made by the numbered migrations in MIGRATIONS, applied in order by migrate() when a DB is
+created. Applied versions are recorded in table schema_migrations.
+
+All processes (API workers, syncer) run migrate() at startup, so it holds a Postgres advisory lock
+while migrating: one process applies the pending migrations and the others wait for it and then
+find nothing to do. Pending migrations are applied in one transaction, so a failure leaves the
+schema unchanged.
+
+Models declare the same indexes and constraints, so that a new database gets them from create_all.
+Migrations must therefore be idempotent (CREATE INDEX IF NOT EXISTS etc.).
+
+Indexes are built without CONCURRENTLY, which cannot run inside a transaction. Writes to the table
+are blocked while an index is built, which takes well under a second at our table sizes.
+
+To add a migration, append a Migration with the next version number. Never change or remove a
+migration that has been released.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from te_canvas.log import get_logger
+
+# Key of the advisory lock held while migrating
+LOCK_ID = 7_310_540_211
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: "tuple[str, ...]"
+
+
+MIGRATIONS: "list[Migration]" = [
+    Migration(
+        1,
+        "Connections: delete_flag not null, index for flagged deletion scans and reverse lookups",
+        (
+            "UPDATE connections SET delete_flag = false WHERE delete_flag IS NULL",
+            "ALTER TABLE connections ALTER COLUMN delete_flag SET DEFAULT false",
+            "ALTER TABLE connections ALTER COLUMN delete_flag SET NOT NULL",
+            "CREATE INDEX IF NOT EXISTS ix_connections_canvas_group_delete_flag"
+            " ON connections (canvas_group, delete_flag)",
+            "CREATE INDEX IF NOT EXISTS ix_connections_te_group ON connections (te_group)",
+        ),
+    ),
+    Migration(
+        2,
+        "Template config: index on canvas_group, unique templates",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_template_config_canvas_group ON template_config (canvas_group)",
+            # Remove duplicates left from before the constraint, keeping the oldest. Duplicates are
+            # compared as by the index, where no canvas_group is the same as '' and other nulls differ.
+            "DELETE FROM template_config a USING template_config b"
+            " WHERE a.id > b.id"
+            " AND a.config_type = b.config_type"
+            " AND a.te_type = b.te_type"
+            " AND a.te_field = b.te_field"
+            " AND coalesce(a.canvas_group, '') = coalesce(b.canvas_group, '')",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_template_config"
+            " ON template_config (config_type, te_type, te_field, coalesce(canvas_group, ''))",
+        ),
+    ),
+]
+
+
+def migrate(engine: "Engine | Connection") -> "list[int]":
+    """
+    Apply pending migrations.
+
+    Returns:
+        Versions applied by this call.
+    """
+    logger = get_logger(__name__)
+
+    def run(conn: Connection) -> "list[int]":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": LOCK_ID})
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                " version integer PRIMARY KEY,"
+                " description text,"
+                " applied_at timestamptz NOT NULL DEFAULT now())"
+            )
+        )
+        done = {r[0] for r in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+        applied = []
+        for m in sorted(MIGRATIONS, key=lambda m: m.version):
+            if m.version in done:
+                continue
+            logger.info("Applying migration %s: %s", m.version, m.description)
+            for statement in m.statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": m.version, "d": m.description},
+            )
+            applied.append(m.version)
+        return applied
+
+    if isinstance(engine, Connection):
+        return run(engine)
+    with engine.begin() as conn:
+        return run(conn)
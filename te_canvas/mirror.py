@@ -0,0 +1,148 @@
+"""
+Local mirror of the TimeEdit objects of whitelisted types, so that object search in the UI does not
+cost a findObjects call per keystroke.
+
+The sync service refreshes the mirror every MIRROR_INTERVAL seconds (see refresh_all). A refresh
+pages through all objects of each whitelisted type and only writes objects that are new or have
+changed; objects no longer returned by TimeEdit are removed at the end.
+
+The API serves /api/timeedit/objects from the mirror for types whose last complete refresh is at
+most MIRROR_MAX_AGE seconds old, and falls back to TimeEdit otherwise. Search is a case insensitive
+substring match on the search fields, backed by a trigram index. /api/timeedit/object always asks
+TimeEdit, as the mirror only holds the search fields of each object.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+from sqlalchemy.dialects.postgresql import insert
+
+from te_canvas.db import DB, MirroredObject, MirrorState, WhitelistTypes, flat_list
+from te_canvas.log import get_logger
+from te_canvas.timeedit import TimeEdit
+
+PAGE_SIZE = 1000
+
+
+class ObjectMirror:
+    def __init__(self, db: DB, timeedit: TimeEdit):
+        self.logger = get_logger(__name__)
+        try:
+            self.interval = int(os.environ.get("MIRROR_INTERVAL", 3600))
+            self.max_age = int(os.environ.get("MIRROR_MAX_AGE", 86400))
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.db = db
+        self.timeedit = timeedit
+
+    # ---- Refresh -------------------------------------------------------------
+
+    def refresh_all(self):
+        """
+        Mirror all whitelisted types, and drop types that are no longer whitelisted.
+        """
+        with self.db.sqla_session() as session:
+            types = flat_list(session.query(WhitelistTypes.extid))
+            session.query(MirroredObject).filter(MirroredObject.te_type.not_in(types)).delete()
+            session.query(MirrorState).filter(MirrorState.te_type.not_in(types)).delete()
+
+        for te_type in types:
+            if te_type == "reservation":
+                continue
+            try:
+                self.refresh_type(te_type)
+            except Exception as e:
+                self.logger.error("Mirror: Failed to refresh %s: %s", te_type, e)
+
+    def refresh_type(self, te_type: str):
+        started = datetime.now(timezone.utc)
+        with self.db.sqla_session() as session:
+            digests = dict(
+                session.query(MirroredObject.extid, MirroredObject.digest).filter(MirroredObject.te_type == te_type)
+            )
+
+        count = 0
+        changed = 0
+        for page in self.timeedit.iter_objects_all(te_type, None):
+            # TimeEdit may return an object twice across pages, but not twice in one insert
+            rows = list({o["extid"]: _row(te_type, o, started) for o in page}.values())
+            new_rows = [r for r in rows if digests.get(r["extid"]) != r["digest"]]
+            unchanged = [r["extid"] for r in rows if digests.get(r["extid"]) == r["digest"]]
+            with self.db.sqla_session() as session:
+                if new_rows:
+                    stmt = insert(MirroredObject).values(new_rows)
+                    session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[MirroredObject.te_type, MirroredObject.extid],
+                            set_={
+                                c: stmt.excluded[c] for c in ("fields", "search_text", "sort_key", "digest", "seen_at")
+                            },
+                        )
+                    )
+                if unchanged:
+                    session.query(MirroredObject).filter(
+                        MirroredObject.te_type == te_type, MirroredObject.extid.in_(unchanged)
+                    ).update({MirroredObject.seen_at: started}, synchronize_session=False)
+            count += len(rows)
+            changed += len(new_rows)
+
+        with self.db.sqla_session() as session:
+            removed = (
+                session.query(MirroredObject)
+                .filter(MirroredObject.te_type == te_type, MirroredObject.seen_at < started)
+                .delete()
+            )
+            session.merge(MirrorState(te_type=te_type, refreshed_at=started, count=count))
+
+        self.logger.info("Mirror: %s: %s objects, %s written, %s removed", te_type, count, changed, removed)
+
+    # ---- Queries, same interface as TimeEdit ---------------------------------
+
+    def has_type(self, te_type: str) -> bool:
+        """
+        True if te_type is mirrored and the mirror is fresh enough to be served.
+        """
+        with self.db.sqla_session() as session:
+            state = session.get(MirrorState, te_type)
+            if state is None:
+                return False
+            return state.refreshed_at > datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+
+    def find_objects(self, type, number_of_objects, begin_index, search_string) -> "list[dict]":
+        with self.db.sqla_session() as session:
+            query = session.query(MirroredObject.fields).filter(MirroredObject.te_type == type)
+            if search_string:
+                escaped = search_string.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                query = query.filter(MirroredObject.search_text.like(f"%{escaped}%", escape="\\"))
+            query = query.order_by(MirroredObject.sort_key, MirroredObject.extid)
+            return flat_list(query.offset(begin_index).limit(number_of_objects))
+
+    def iter_objects_all(self, type, search_string) -> "Iterator[list[dict]]":
+        for i in itertools.count(0, PAGE_SIZE):
+            page = self.find_objects(type, PAGE_SIZE, i, search_string)
+            if page:
+                yield page
+            if len(page) < PAGE_SIZE:
+                return
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _row(te_type: str, o: dict, seen_at: datetime) -> dict:
+    values = [str(v) for k, v in o.items() if k != "extid" and v is not None]
+    return {
+        "te_type": te_type,
+        "extid": o["extid"],
+        "fields": o,
+        "search_text": "\n".join(values).lower(),
+        "sort_key": values[0].lower() if values else "",
+        "digest": hashlib.sha256(json.dumps(o, sort_keys=True, default=str).encode()).hexdigest(),
+        "seen_at": seen_at,
+    }
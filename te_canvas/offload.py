@@ -0,0 +1,133 @@
+"""
+Bounded offloading of API work that calls upstreams (TimeEdit, Canvas), with timeouts and load
+shedding.
+
+Endpoints decorated with offloaded run on a shared pool of UPSTREAM_WORKERS threads per API process.
+At most UPSTREAM_QUEUE further requests may wait for a thread; beyond that requests are rejected at
+once with 503 and a Retry-After header, instead of piling up behind a slow upstream. A request that
+has not completed after REQUEST_TIMEOUT seconds gets a 504; its upstream call is left to finish in
+the background, still occupying its thread, so that a slow upstream cannot make the pool grow.
+
+With gunicorn's gthread workers (see gunicorn_conf.py) this keeps endpoints that only touch the
+database responsive while TimeEdit or Canvas is slow.
+"""
+
+import functools
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from flask import copy_current_request_context
+
+from te_canvas import metrics
+from te_canvas.log import get_logger
+
+
+class Overloaded(Exception):
+    """
+    Raised instead of queueing a request when the pool is full.
+    """
+
+
+class UpstreamTimeout(Exception):
+    """
+    Raised when a request did not complete within the request timeout.
+    """
+
+
+class OffloadPool:
+    def __init__(self, workers: int = 16, queue: int = 32, timeout: float = 30.0):
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upstream")
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    @classmethod
+    def from_env(cls) -> "OffloadPool":
+        try:
+            return cls(
+                workers=int(os.environ.get("UPSTREAM_WORKERS", 16)),
+                queue=int(os.environ.get("UPSTREAM_QUEUE", 32)),
+                timeout=float(os.environ.get("REQUEST_TIMEOUT", 30.0)),
+            )
+        except ValueError as e:
+            get_logger(__name__).critical(f"Invalid env var: {e}")
+            sys.exit(1)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run fn on the pool and wait for its result.
+
+        Raises:
+            Overloaded: All threads are busy and the queue is full.
+            UpstreamTimeout: fn did not return within the timeout.
+        """
+        with self.lock:
+            if self.pending >= self.workers + self.queue:
+                raise Overloaded
+            self.pending += 1
+
+        def task():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+
+        future = self.executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise UpstreamTimeout
+
+
+_pool: Optional[OffloadPool] = None
+_pool_lock = threading.Lock()
+
+
+def pool() -> OffloadPool:
+    """
+    The pool of this process, created on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OffloadPool.from_env()
+        return _pool
+
+
+def _pool_samples(name: str) -> "dict[tuple[str, ...], float]":
+    if _pool is None:
+        return {}
+    with _pool.lock:
+        pending = _pool.pending
+    value = {"busy": min(pending, _pool.workers), "queued": max(0, pending - _pool.workers), "workers": _pool.workers}
+    return {(): value[name]}
+
+
+metrics.REGISTRY.gauge(
+    "te_canvas_upstream_pool_busy", "Pool threads running a request.", callback=lambda: _pool_samples("busy")
+)
+metrics.REGISTRY.gauge(
+    "te_canvas_upstream_pool_queued", "Requests waiting for a pool thread.", callback=lambda: _pool_samples("queued")
+)
+metrics.REGISTRY.gauge(
+    "te_canvas_upstream_pool_workers", "Pool threads (UPSTREAM_WORKERS).", callback=lambda: _pool_samples("workers")
+)
+
+
+def offloaded(f):
+    """
+    Decorator for Resource methods, running them on the pool.
+    """
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        return pool().run(copy_current_request_context(f), *args, **kwargs)
+
+    return wrapper
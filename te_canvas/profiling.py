@@ -0,0 +1,232 @@
+"""
+Opt-in CPU and memory profiling of the syncer, on real workloads.
+
+A profile covers either a whole sync cycle (sync_all) or the sync of one Canvas group (sync_one),
+and consists of two files in PROFILE_DIR:
+
+    <time>-<label>.collapsed  CPU samples as collapsed stacks ("frame;frame;frame count" per line),
+                              for flamegraph.pl, speedscope, inferno etc.
+    <time>-<label>.alloc.txt  Peak traced memory and the lines with the largest net allocations
+                              during the profile, from tracemalloc snapshots.
+
+CPU samples are taken by a thread reading the stacks of the profiled threads every PROFILE_INTERVAL
+seconds, so unlike cProfile the overhead does not grow with the number of calls. Cycle profiles
+sample all threads. Group profiles sample the thread running sync_one, so with the asyncio engine
+they include other groups synced concurrently on the event loop. Memory is traced only while a
+profile is running.
+
+What to profile is read from env vars, and from a trigger file so that profiles can be taken from a
+running syncer without a restart:
+
+    PROFILE_DIR:      Directory for profiles. Profiling is disabled if unset.
+    PROFILE_EVERY:    Profile every Nth sync cycle. 0 disables.
+    PROFILE_GROUPS:   Comma-separated Canvas groups to profile whenever they are synced.
+    PROFILE_DIR/trigger: Read and removed at the start of each cycle. If empty, the cycle is
+                      profiled. Otherwise it lists Canvas groups, one per line, to profile in that
+                      cycle. E.g. `touch $PROFILE_DIR/trigger` to profile the next cycle.
+
+PROFILE_INTERVAL, PROFILE_TOP, PROFILE_TRACEMALLOC_FRAMES and PROFILE_KEEP tune the profiles, see the
+README.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from te_canvas.log import get_logger
+
+TRIGGER = "trigger"
+
+
+class Sampler:
+    """
+    Sampling CPU profiler. Samples the stacks of the given threads, or of all other threads if None,
+    every interval seconds.
+    """
+
+    def __init__(self, interval: float, threads: "Optional[set[int]]" = None):
+        self.interval = interval
+        self.threads = threads
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.__run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> "Counter[str]":
+        self.stopping.set()
+        self.thread.join()
+        return self.stacks
+
+    def __run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.threads is not None and ident not in self.threads):
+                    continue
+                self.stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+
+
+class Profiler:
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self.directory = os.environ.get("PROFILE_DIR", "")
+        try:
+            self.every = int(os.environ.get("PROFILE_EVERY", 0))
+            self.interval = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+            self.top = int(os.environ.get("PROFILE_TOP", 30))
+            self.frames = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", 1))
+            self.keep = int(os.environ.get("PROFILE_KEEP", 20))
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.groups = {g.strip() for g in os.environ.get("PROFILE_GROUPS", "").split(",") if g.strip()}
+        self.triggered_groups: set[str] = set()
+        self.cycles = 0
+        self.in_cycle = False
+        self.lock = threading.Lock()
+        self.tracing = 0  # Running profiles using tracemalloc
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory != ""
+
+    def cycle(self):
+        """
+        Context manager for a sync cycle, profiling it if due.
+        """
+        if not self.enabled:
+            return nullcontext()
+        self.cycles += 1
+        triggered = self.__read_trigger()
+        if triggered or (self.every > 0 and self.cycles % self.every == 0):
+            return self.__profile("cycle", None)
+        return nullcontext()
+
+    def group(self, canvas_group: str):
+        """
+        Context manager for the sync of a Canvas group, profiling it if configured.
+        """
+        if not self.enabled or self.in_cycle:
+            return nullcontext()
+        if canvas_group in self.groups or canvas_group in self.triggered_groups:
+            return self.__profile(f"group-{canvas_group}", {threading.get_ident()})
+        return nullcontext()
+
+    def __read_trigger(self) -> bool:
+        """
+        Read and remove the trigger file.
+
+        Returns:
+            True if this cycle is to be profiled.
+        """
+        path = os.path.join(self.directory, TRIGGER)
+        try:
+            with open(path) as f:
+                groups = {line.strip() for line in f if line.strip()}
+            os.remove(path)
+        except FileNotFoundError:
+            self.triggered_groups = set()
+            return False
+        except OSError as e:
+            self.logger.warning("Failed to read profile trigger: %s", e)
+            return False
+        self.triggered_groups = groups
+        return not groups
+
+    @contextmanager
+    def __profile(self, label: str, threads: "Optional[set[int]]") -> Iterator[None]:
+        name = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{label}"
+        self.logger.info("Profiling %s", name)
+        with self.lock:
+            if self.tracing == 0:
+                tracemalloc.start(self.frames)
+            self.tracing += 1
+            if threads is None:
+                self.in_cycle = True
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        sampler = Sampler(self.interval, threads)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stacks = sampler.stop()
+            duration = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            with self.lock:
+                self.tracing -= 1
+                if self.tracing == 0:
+                    tracemalloc.stop()
+                if threads is None:
+                    self.in_cycle = False
+            try:
+                self.__write(name, stacks, sampler.samples, duration, before, after, peak)
+            except OSError as e:
+                self.logger.warning("Failed to write profile %s: %s", name, e)
+
+    def __write(
+        self,
+        name: str,
+        stacks: "Counter[str]",
+        samples: int,
+        duration: float,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+        peak: int,
+    ):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.collapsed", "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        exclude = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(exclude).compare_to(before.filter_traces(exclude), "lineno")
+        with open(f"{path}.alloc.txt", "w") as f:
+            f.write(f"{name}: {duration:.1f} s, {samples} CPU samples, peak traced memory {peak / 2**20:.1f} MiB\n\n")
+            f.write(f"Top {self.top} lines by net allocated size:\n")
+            for stat in diff[: self.top]:
+                f.write(f"{stat}\n")
+        self.logger.info("Wrote profile %s", path)
+        self.__prune()
+
+    def __prune(self):
+        """
+        Remove all but the last PROFILE_KEEP profiles.
+        """
+        names = sorted({n.split(".")[0] for n in os.listdir(self.directory) if n.endswith(".collapsed")})
+        for old in names[: -self.keep] if self.keep > 0 else []:
+            for suffix in (".collapsed", ".alloc.txt"):
+                try:
+                    os.remove(os.path.join(self.directory, old + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _collapse(thread_name: str, frame) -> str:
+    """
+    A stack in collapsed format, root first, with the thread name as root frame.
+    """
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}")
+        frame = frame.f_back
+    frames.append(thread_name.replace(" ", "_").replace(";", "_"))
+    return ";".join(reversed(frames))
@@ -0,0 +1,137 @@
+"""
+JSON serialization and compression of API responses.
+
+JSON is serialized with orjson when it is installed, which is several times faster than the standard
+library for the large object listings of /api/timeedit/objects. Env var JSON_SERIALIZER=json forces
+the standard library.
+
+Responses of at least COMPRESS_MIN_SIZE bytes are compressed with brotli (if installed) or gzip,
+depending on the client's Accept-Encoding. Streamed responses are compressed chunk by chunk, so that
+streaming is preserved.
+"""
+
+import gzip
+import json
+import os
+import zlib
+from datetime import date, time
+from typing import Callable, Iterator, Optional
+
+from flask import Response, make_response, request
+
+from te_canvas.log import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # type: ignore
+
+logger = get_logger(__name__)
+
+COMPRESS_LEVEL = {"br": 4, "gzip": 6}
+
+
+def _default(value) -> str:
+    # Dates in ISO 8601, as orjson serializes them
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps_json(data) -> bytes:
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+
+def _dumps_orjson(data) -> bytes:
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _serializer() -> Callable[[object], bytes]:
+    name = os.environ.get("JSON_SERIALIZER", "orjson" if orjson is not None else "json")
+    if name == "orjson" and orjson is not None:
+        return _dumps_orjson
+    if name != "json":
+        logger.warning("JSON serializer %s not available, using json", name)
+    return _dumps_json
+
+
+dumps: Callable[[object], bytes] = _serializer()
+
+
+def output_json(data, code, headers=None):
+    """
+    flask-restx representation for application/json, see Api.representations.
+    """
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
+
+
+# ---- Compression -------------------------------------------------------------
+
+
+def _encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress_stream(chunks: Iterator, encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESS_LEVEL["br"])
+        for chunk in chunks:
+            yield compressor.process(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL["gzip"], zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            yield compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        yield compressor.flush()
+
+
+def compress(response: Response) -> Response:
+    """
+    after_request handler compressing responses.
+    """
+    min_size = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.direct_passthrough
+        or response.mimetype == "text/event-stream"  # Proxies and browsers must see each event at once
+    ):
+        return response
+    if not response.is_streamed and (response.content_length or 0) < min_size:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    elif encoding == "br":
+        response.set_data(brotli.compress(response.get_data(), quality=COMPRESS_LEVEL["br"]))
+    else:
+        response.set_data(gzip.compress(response.get_data(), COMPRESS_LEVEL["gzip"]))
+    response.headers["Content-Encoding"] = encoding
+
+    # The compressed body is a different representation, so a strong ETag must not be reused
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,321 @@
+"""
+Retry policies and circuit breakers for calls to upstream services (TimeEdit and Canvas).
+
+Every call to an upstream goes through call(), which retries transient errors (throttling, 5xx,
+timeouts, connection errors) with exponential backoff and full jitter. Each upstream also has a
+circuit breaker: after a number of consecutive transient failures the breaker opens and calls fail
+fast with CircuitOpenError until the reset timeout has passed. After that a single probe call is let
+through (half-open); if it succeeds the breaker closes again, otherwise it reopens.
+
+Non-transient errors (e.g. 404, SOAP faults, validation errors) are raised immediately and count as
+a successful round-trip as far as the breaker is concerned, since the service did answer.
+
+Every attempt is counted in the current sync run, if any (see te_canvas.ledger).
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import requests
+import zeep.exceptions
+from canvasapi.exceptions import CanvasException, RateLimitExceeded
+
+from te_canvas import ledger
+from te_canvas.log import get_logger
+
+T = TypeVar("T")
+
+# Status codes which indicate that the request was not processed and can safely be repeated, also
+# for non-idempotent calls.
+THROTTLE_STATUS = {429, 503}
+
+# canvasapi raises a generic CanvasException for status codes it has no dedicated exception for,
+# with the status code only available in the message.
+_CANVAS_STATUS_RE = re.compile(r"status code (\d{3})")
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open.
+    """
+
+    def __init__(self, upstream: str):
+        super().__init__(f"Circuit breaker for {upstream} is open")
+        self.upstream = upstream
+        self.message = str(self)  # Same attribute as CanvasException, used in log messages
+
+
+def status_code(e: Exception) -> Optional[int]:
+    """
+    Extract the HTTP status code from an upstream exception, if there is one.
+    """
+    if isinstance(e, RateLimitExceeded):
+        return 403
+    if isinstance(e, zeep.exceptions.TransportError):
+        return e.status_code
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return e.response.status_code
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code
+    if isinstance(e, CanvasException):
+        m = _CANVAS_STATUS_RE.search(str(e))
+        return int(m.group(1)) if m else None
+    return None
+
+
+def is_transient(e: Exception, idempotent: bool = True) -> bool:
+    """
+    Should the call that raised e be retried?
+
+    Non-idempotent calls (e.g. creating a Canvas event) are only retried when we know that the
+    request was never processed: throttling and failure to connect.
+    """
+    if isinstance(e, RateLimitExceeded):
+        return True
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return idempotent or not _may_have_been_sent(e)
+    if isinstance(e, requests.exceptions.Timeout):
+        return idempotent
+    if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(e, httpx.TransportError):
+        return idempotent
+    code = status_code(e)
+    if code is None:
+        return False
+    if code in THROTTLE_STATUS:
+        return True
+    return idempotent and code >= 500
+
+
+def _may_have_been_sent(e: requests.exceptions.ConnectionError) -> bool:
+    # A refused or reset connection before anything was written shows up as a NewConnectionError
+    # somewhere in the chain of causes.
+    cause: Optional[BaseException] = e
+    while cause is not None:
+        if type(cause).__name__ in ("NewConnectionError", "NameResolutionError"):
+            return False
+        cause = cause.__cause__ or cause.__context__
+    return True
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: before retry n (counting from 0) we sleep a random time in
+    [0, min(max_delay, base_delay * 2^n)].
+    """
+
+    def __init__(self, attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            attempts=int(os.environ.get("RETRY_ATTEMPTS", 4)),
+            base_delay=float(os.environ.get("RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.environ.get("RETRY_MAX_DELAY", 30.0)),
+        )
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class CircuitBreaker:
+    """
+    Thread safe circuit breaker for one upstream.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        return cls(
+            name,
+            failure_threshold=int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("BREAKER_RESET_TIMEOUT", 30.0)),
+        )
+
+    def is_open(self) -> bool:
+        """
+        True if calls would currently be rejected, i.e. the breaker is open and not yet due for a
+        probe.
+        """
+        with self.lock:
+            if self.state == CircuitBreaker.OPEN:
+                return self.clock() - self.opened_at < self.reset_timeout
+            return self.state == CircuitBreaker.HALF_OPEN and self.probing
+
+    def allow(self) -> bool:
+        """
+        May a call be made now? In the half-open state only one probe call is in flight at a time.
+        """
+        with self.lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+            if self.state == CircuitBreaker.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = CircuitBreaker.HALF_OPEN
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CircuitBreaker.CLOSED:
+                get_logger(__name__).info("Circuit breaker for %s closed", self.name)
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """
+        End a call which gave no verdict on the upstream, e.g. because it was cancelled, so that
+        another probe may be made in the half-open state.
+        """
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != CircuitBreaker.OPEN:
+                    get_logger(__name__).warning("Circuit breaker for %s opened", self.name)
+                self.state = CircuitBreaker.OPEN
+                self.opened_at = self.clock()
+
+
+# ---- Per-upstream registry ---------------------------------------------------
+
+_lock = threading.Lock()
+_breakers: dict[str, CircuitBreaker] = {}
+_policy: Optional[RetryPolicy] = None
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    with _lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker.from_env(upstream)
+        return _breakers[upstream]
+
+
+def policy() -> RetryPolicy:
+    global _policy
+    with _lock:
+        if _policy is None:
+            _policy = RetryPolicy.from_env()
+        return _policy
+
+
+def call(upstream: str, fn: Callable[..., T], *args, idempotent: bool = True, **kwargs) -> T:
+    """
+    Call fn(*args, **kwargs) against upstream, retrying transient errors and respecting the
+    upstream's circuit breaker.
+
+    Raises:
+        CircuitOpenError, if the breaker is open (also if it opens while we are backing off).
+        The last exception raised by fn, if it is not transient or we run out of attempts.
+    """
+    b = breaker(upstream)
+    p = policy()
+    retry = 0
+    while True:
+        if not b.allow():
+            raise CircuitOpenError(upstream)
+        ledger.count_call(upstream)
+        try:
+            res = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e, idempotent):
+                b.record_success()
+                raise
+            b.record_failure()
+            if retry + 1 >= p.attempts:
+                raise
+            delay = p.delay(retry)
+            get_logger(__name__).warning(
+                "Transient error from %s (%s: %s), retrying in %.1f s",
+                upstream,
+                e.__class__.__name__,
+                e,
+                delay,
+            )
+            time.sleep(delay)
+            retry += 1
+            continue
+        except BaseException:
+            # Cancellation, KeyboardInterrupt etc.: no verdict, but a half-open probe must end
+            b.release()
+            raise
+        b.record_success()
+        return res
+
+
+async def call_async(upstream: str, fn: Callable[..., Awaitable[T]], *args, idempotent: bool = True, **kwargs) -> T:
+    """
+    Like call(), for coroutine functions. Shares breakers and policy with call().
+    """
+    b = breaker(upstream)
+    p = policy()
+    retry = 0
+    while True:
+        if not b.allow():
+            raise CircuitOpenError(upstream)
+        ledger.count_call(upstream)
+        try:
+            res = await fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e, idempotent):
+                b.record_success()
+                raise
+            b.record_failure()
+            if retry + 1 >= p.attempts:
+                raise
+            delay = p.delay(retry)
+            get_logger(__name__).warning(
+                "Transient error from %s (%s: %s), retrying in %.1f s",
+                upstream,
+                e.__class__.__name__,
+                e,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            retry += 1
+            continue
+        except BaseException:
+            b.release()
+            raise
+        b.record_success()
+        return res
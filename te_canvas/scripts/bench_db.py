@@ -0,0 +1,123 @@
+# Usage:
+# python -m te_canvas.scripts.bench_db [<n_connections> [<n_templates>]]
+#
+# Measure the latency of the hot sync and API queries on connections and template_config, without and
+# with the indexes added by te_canvas.migrations.
+#
+# Uses the database given by env vars POSTGRES_*, in a scratch schema bench_db which is dropped
+# afterwards. Run it against a development database.
+
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+from te_canvas import migrations
+from te_canvas.db import DB, Base
+
+SCHEMA = "bench_db"
+
+# Indexes managed by te_canvas.migrations, dropped to get the schema as it was before them
+INDEXES = [
+    "ix_connections_canvas_group_delete_flag",
+    "ix_connections_te_group",
+    "ix_template_config_canvas_group",
+    "uq_template_config",
+]
+
+QUERIES = {
+    "flagged connections": "SELECT te_group FROM connections WHERE canvas_group = :g AND delete_flag",
+    "connected te groups": (
+        "SELECT te_group FROM connections WHERE canvas_group = :g AND NOT delete_flag ORDER BY te_group"
+    ),
+    "reverse lookup": "SELECT canvas_group FROM connections WHERE te_group = :t",
+    "group template": "SELECT * FROM template_config WHERE canvas_group = :g",
+    "default template": "SELECT * FROM template_config WHERE canvas_group IS NULL",
+}
+
+
+def populate(conn, n_connections: int, n_templates: int):
+    # 10 connections per Canvas group, TimeEdit objects shared by about 5 groups each, 2% flagged
+    conn.execute(
+        text(
+            "INSERT INTO connections (canvas_group, te_group, te_type, delete_flag)"
+            " SELECT (100000 + i / 10)::text, 'object_' || (i * 7919 % (:n / 5)), 'room', i % 50 = 0"
+            " FROM generate_series(0, :n - 1) i"
+        ),
+        {"n": n_connections},
+    )
+    # 3 template rows per Canvas group, and a default template
+    conn.execute(
+        text(
+            "INSERT INTO template_config (config_type, te_type, te_field, canvas_group)"
+            " SELECT (ARRAY['title', 'location', 'description'])[i % 3 + 1], 'room', 'general.title',"
+            " CASE WHEN i < 3 THEN NULL ELSE (100000 + i / 3)::text END"
+            " FROM generate_series(0, :n - 1) i"
+        ),
+        {"n": n_templates},
+    )
+
+
+def measure(conn, n_connections: int, n_templates: int, repeat: int = 500) -> "dict[str, tuple[float, float]]":
+    """
+    Median and 95th percentile latency in ms of each query, with random parameters.
+    """
+    conn.execute(text("ANALYZE connections"))
+    conn.execute(text("ANALYZE template_config"))
+    res = {}
+    for name, query in QUERIES.items():
+        times = []
+        for _ in range(repeat):
+            params = {
+                "g": str(100000 + random.randrange(n_connections // 10)),
+                "t": f"object_{random.randrange(n_connections // 5)}",
+            }
+            if name == "group template":
+                params["g"] = str(100001 + random.randrange(n_templates // 3 - 1))
+            start = time.perf_counter()
+            conn.execute(text(query), params).fetchall()
+            times.append((time.perf_counter() - start) * 1000)
+        res[name] = (statistics.median(times), statistics.quantiles(times, n=20)[-1])
+    return res
+
+
+if __name__ == "__main__":
+    n_connections = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_templates = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    conn_str = DB().conn_str
+    admin = create_engine(conn_str, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    engine = create_engine(conn_str, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            for index in INDEXES:
+                conn.execute(text(f"DROP INDEX {index}"))
+            populate(conn, n_connections, n_templates)
+
+        with engine.begin() as conn:
+            before = measure(conn, n_connections, n_templates)
+
+        with engine.begin() as conn:
+            start = time.perf_counter()
+            migrations.migrate(conn)
+            migrate_time = time.perf_counter() - start
+
+        with engine.begin() as conn:
+            after = measure(conn, n_connections, n_templates)
+    finally:
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    print(f"{n_connections} connections, {n_templates} template rows, migrations applied in {migrate_time:.2f} s")
+    print()
+    print(f"{'query':<22} {'before p50':>11} {'p95':>8} {'after p50':>11} {'p95':>8} {'speedup':>8}")
+    for name in QUERIES:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"{name:<22} {b50:>11.3f} {b95:>8.3f} {a50:>11.3f} {a95:>8.3f} {b50 / a50:>7.1f}x")
@@ -0,0 +1,52 @@
+# Usage:
+# python -m te_canvas.scripts.bench_responses [<n_objects>]
+#
+# Compare JSON serializers and response compression on a synthetic /api/timeedit/objects payload.
+
+import gzip
+import json
+import sys
+import time
+
+from te_canvas import responses
+
+
+def objects(n: int) -> "list[dict]":
+    return [
+        {
+            "extid": f"room_{i:06d}",
+            "general.id": f"R{i:06d}",
+            "general.title": f"Lecture hall {i} (building {i % 40}, floor {i % 7})",
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - start)
+    return res, best
+
+
+if __name__ == "__main__":
+    data = objects(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
+
+    print(f"{len(data)} objects")
+    print(f"{'serializer':<12} {'ms':>8}")
+    body, t = timed(lambda: json.dumps(data).encode())
+    print(f"{'json':<12} {t * 1000:>8.1f}")
+    if responses.orjson is not None:
+        _, t = timed(lambda: responses._dumps_orjson(data))
+        print(f"{'orjson':<12} {t * 1000:>8.1f}")
+
+    print()
+    print(f"{'encoding':<12} {'ms':>8} {'bytes':>10} {'ratio':>7}")
+    print(f"{'identity':<12} {0:>8.1f} {len(body):>10} {1:>7.2f}")
+    compressed, t = timed(lambda: gzip.compress(body, responses.COMPRESS_LEVEL["gzip"]))
+    print(f"{'gzip':<12} {t * 1000:>8.1f} {len(compressed):>10} {len(body) / len(compressed):>7.2f}")
+    if responses.brotli is not None:
+        compressed, t = timed(lambda: responses.brotli.compress(body, quality=responses.COMPRESS_LEVEL["br"]))
+        print(f"{'br':<12} {t * 1000:>8.1f} {len(compressed):>10} {len(body) / len(compressed):>7.2f}")
@@ -0,0 +1,102 @@
+"""
+Collapsing of recurring events into Canvas event series, used by the syncers with SYNC_SERIES=true.
+
+TimeEdit has no notion of recurrence, a weekly lecture is a separate reservation per week. Canvas can
+however create a whole series in one request, using the "duplicate" parameter of the create calendar
+event endpoint. Here we find translated events with identical content (title, location, description,
+time of day and duration) at a regular daily or weekly interval, and turn each such run into one
+event with a duplicate count.
+
+The description of each event ends with a link to its reservation on TimeEdit. Since all events in a
+Canvas series share a description, the link is ignored when comparing content and the series links
+to its first reservation.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# Canvas does not allow more duplicates than this in one request
+MAX_DUPLICATES = 200
+
+FREQUENCIES = {
+    timedelta(days=1): "daily",
+    timedelta(weeks=1): "weekly",
+}
+INTERVALS = {f: i for i, f in FREQUENCIES.items()}
+
+# Start of the TimeEdit link added to each description by Translator.canvas_event
+EDIT_LINK_PREFIX = '<br><br><a href="'
+
+
+def _content(event: dict):
+    description = event.get("description", "")
+    i = description.rfind(EDIT_LINK_PREFIX)
+    if i >= 0:
+        description = description[:i]
+    rest = tuple(sorted((k, str(v)) for k, v in event.items() if k not in ("description", "start_at", "end_at")))
+    return (description, rest, event["end_at"] - event["start_at"], event["start_at"].time())
+
+
+def collapse(events: "list[tuple[dict, list[str]]]") -> "list[tuple[dict, list[str]]]":
+    """
+    Collapse runs of recurring events into series.
+
+    Args:
+        events: Pairs of Canvas event and the ids of the reservations it was translated from.
+
+    Returns:
+        Pairs of Canvas event, possibly with a "duplicate" parameter, and the ids of all reservations
+        it covers. Ordered by start.
+    """
+    groups = defaultdict(list)
+    res = []
+    for event, ids in events:
+        if not isinstance(event.get("start_at"), datetime) or not isinstance(event.get("end_at"), datetime):
+            res.append((event, ids))
+            continue
+        groups[_content(event)].append((event, ids))
+
+    for members in groups.values():
+        members.sort(key=lambda m: m[0]["start_at"])
+        i = 0
+        while i < len(members):
+            j = i + 1
+            interval = None
+            if j < len(members):
+                interval = members[j][0]["start_at"] - members[i][0]["start_at"]
+            if interval in FREQUENCIES:
+                while (
+                    j < len(members)
+                    and members[j][0]["start_at"] - members[j - 1][0]["start_at"] == interval
+                    and j - i <= MAX_DUPLICATES
+                ):
+                    j += 1
+            run = members[i:j]
+            if len(run) == 1:
+                res.append(run[0])
+            else:
+                first = run[0][0] | {
+                    "duplicate": {
+                        "count": len(run) - 1,
+                        "interval": 1,
+                        "frequency": FREQUENCIES[interval],
+                    }
+                }
+                res.append((first, [id for _, ids in run for id in ids]))
+            i = j
+
+    return sorted(res, key=lambda m: str(m[0].get("start_at")))
+
+
+def occurrence_days(event: dict) -> "list[date]":
+    """
+    Days touched by an event, including all events of a series.
+    """
+    start_at = event.get("start_at")
+    if not isinstance(start_at, datetime):
+        return []
+    duplicate = event.get("duplicate")
+    if duplicate is None:
+        return [start_at.date()]
+    interval = INTERVALS[duplicate["frequency"]]
+    return [(start_at + k * interval).date() for k in range(duplicate["count"] + 1)]
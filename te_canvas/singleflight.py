@@ -0,0 +1,173 @@
+"""
+Coalescing of identical concurrent upstream calls.
+
+When many users open the tool at once, the API receives many identical requests (the same type list,
+the same object, the same search) at the same time. With Group.do, concurrent calls with the same key
+share one in-flight call and its result (or exception) instead of each calling the upstream.
+
+SharedGroup extends this across processes, i.e. gunicorn workers: the first process to call takes a
+Postgres advisory lock for the key, calls the upstream and stores the result in the database for
+SINGLEFLIGHT_TTL seconds (db.SingleflightResult). Processes arriving meanwhile wait for the lock and
+then use the stored result. Results must be JSON serializable for this, and are returned as read back
+from JSON (e.g. datetimes as strings) by the first process too, so that all callers get the same.
+
+Each held lock, and each process waiting for it, takes a pooled connection from the DB engine
+(pool_size 50 per process) for the duration of the upstream call. To leave connections for the rest
+of the API, at most SINGLEFLIGHT_MAX_LOCKS calls per process coalesce across processes at a time;
+further calls only coalesce in-process. A lock is held at most lock_timeout seconds, after which
+Postgres ends the transaction and other processes call the upstream themselves.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from te_canvas.db import DB, SingleflightResult
+from te_canvas.log import get_logger
+
+_MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Group:
+    """
+    In-process coalescing. Thread safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Call fn, unless a call with the same key is already in flight, in which case wait for it and
+        return its result or raise its exception.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._call(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def _call(self, key: str, fn: Callable[[], Any]) -> Any:
+        return fn()
+
+
+class SharedGroup(Group):
+    """
+    Coalescing across processes sharing a database, on top of in-process coalescing.
+    """
+
+    def __init__(
+        self, db: DB, ttl: Optional[float] = None, lock_timeout: float = 30.0, max_locks: Optional[int] = None
+    ):
+        super().__init__()
+        self.logger = get_logger(__name__)
+        try:
+            self.ttl = float(os.environ.get("SINGLEFLIGHT_TTL", 5)) if ttl is None else ttl
+            max_locks = int(os.environ.get("SINGLEFLIGHT_MAX_LOCKS", 8)) if max_locks is None else max_locks
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.lock_timeout = lock_timeout
+        self.locks = threading.BoundedSemaphore(max_locks)
+        self.db = db
+
+    def _call(self, key: str, fn: Callable[[], Any]) -> Any:
+        if self.ttl <= 0:
+            return fn()
+
+        result = _MISSING
+        try:
+            found, stored = self.__stored(key)
+            if found:
+                return stored
+            if not self.locks.acquire(blocking=False):
+                return _json(fn())
+            try:
+                with self.db.engine.connect() as conn, conn.begin():
+                    # The lock is released when the transaction ends, at the latest after lock_timeout
+                    timeout = f"{int(self.lock_timeout * 1000)}ms"
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{timeout}'"))
+                    conn.execute(text(f"SET LOCAL idle_in_transaction_session_timeout = '{timeout}'"))
+                    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _lock_id(key)})
+                    found, stored = self.__stored(key)
+                    if found:
+                        return stored
+                    result = _json(fn())
+                    self.__store(key, result)
+                    return result
+            finally:
+                self.locks.release()
+        except SQLAlchemyError as e:
+            self.logger.warning("Singleflight store unavailable: %s", e)
+            return _json(fn()) if result is _MISSING else result
+
+    def __stored(self, key: str) -> "tuple[bool, Any]":
+        with self.db.sqla_session() as session:
+            row = session.get(SingleflightResult, key)
+            if row is None or row.expires_at <= datetime.now(timezone.utc):
+                return False, None
+            return True, row.value
+
+    def __store(self, key: str, result: Any):
+        now = datetime.now(timezone.utc)
+        with self.db.sqla_session() as session:
+            session.query(SingleflightResult).filter(SingleflightResult.expires_at <= now).delete()
+            session.merge(
+                SingleflightResult(
+                    key=key,
+                    value=result,
+                    expires_at=now + timedelta(seconds=self.ttl),
+                )
+            )
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def key(*parts) -> str:
+    """
+    Key for a call, from its name and arguments.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _json(value: Any) -> Any:
+    # The value as stored in and read back from the database
+    return json.loads(json.dumps(value, default=str))
+
+
+def _lock_id(key: str) -> int:
+    # Advisory locks take a signed 64 bit key
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big", signed=True)
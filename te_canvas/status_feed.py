@@ -0,0 +1,181 @@
+"""
+Push feed of sync status and progress, for the Server-Sent Events endpoint
+/api/connection/status/stream.
+
+The syncer publishes with Postgres NOTIFY on db.SYNC_STATUS_CHANNEL: every sync status written
+(DB.update_sync_status, and the resets of DB.apply_connections) and, while events are written to Canvas, the progress of a group at most
+every PROGRESS_INTERVAL seconds (ProgressReporter).
+
+Each API process runs one StatusFeed: a thread holding a dedicated database connection that
+LISTENs on the channel and hands notifications to the subscriptions of the streams connected to
+the process. So N clients watching M groups cost one database connection per process and nothing
+per client, instead of N * M polls. If the connection is lost, the thread reconnects and sends the
+current status of all subscribed groups, since notifications in between are lost.
+
+Each stream holds a request thread for as long as it is open, so the number of streams per process
+is capped by SSE_MAX_STREAMS (keep it well below WEB_THREADS). Clients beyond that get 503 and
+should fall back to polling /api/connection/status.
+"""
+
+import json
+import os
+import queue
+import select
+import sys
+import threading
+import time
+from typing import Optional
+
+from te_canvas.db import DB, SYNC_STATUS_CHANNEL
+from te_canvas.log import get_logger
+
+PROGRESS_INTERVAL = 1.0
+
+
+class Subscription:
+    """
+    Events for a set of Canvas groups, as (kind, data) tuples with kind "status" or "progress".
+    """
+
+    def __init__(self, canvas_groups: "set[str]"):
+        self.canvas_groups = canvas_groups
+        self.queue: "queue.Queue[tuple[str, dict]]" = queue.Queue(maxsize=1000)
+
+    def put(self, kind: str, data: dict):
+        try:
+            self.queue.put_nowait((kind, data))
+        except queue.Full:
+            # A client this far behind is gone or stuck, drop rather than grow
+            pass
+
+
+class StatusFeed:
+    def __init__(self, db: DB):
+        self.logger = get_logger(__name__)
+        try:
+            self.max_streams = int(os.environ.get("SSE_MAX_STREAMS", 16))
+            self.heartbeat = float(os.environ.get("SSE_HEARTBEAT", 15))
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.db = db
+        self.lock = threading.Lock()
+        self.subscriptions: set[Subscription] = set()
+        self.thread: Optional[threading.Thread] = None
+
+    def subscribe(self, canvas_groups: "list[str]") -> Optional[Subscription]:
+        """
+        Subscribe to a set of Canvas groups. The listener thread is started on first use, i.e. in
+        each worker process after forking.
+
+        Returns:
+            The subscription, or None if the process already has SSE_MAX_STREAMS streams.
+        """
+        with self.lock:
+            if len(self.subscriptions) >= self.max_streams:
+                return None
+            sub = Subscription(set(canvas_groups))
+            self.subscriptions.add(sub)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__listen, name="status-feed", daemon=True)
+                self.thread.start()
+            return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self.lock:
+            self.subscriptions.discard(sub)
+
+    def publish(self, message: dict):
+        """
+        Hand a notification to the subscriptions of its Canvas group.
+        """
+        canvas_group = message.get("canvas_group")
+        kind = "progress" if "progress" in message else "status"
+        with self.lock:
+            subs = [s for s in self.subscriptions if canvas_group in s.canvas_groups]
+        for sub in subs:
+            sub.put(kind, message)
+
+    def __resync(self):
+        with self.lock:
+            groups = sorted(set().union(*[s.canvas_groups for s in self.subscriptions]))
+        if groups:
+            for canvas_group, status in self.db.get_sync_statuses(groups).items():
+                self.publish({"canvas_group": canvas_group, "status": status})
+
+    def __listen(self):
+        first = True
+        while True:
+            try:
+                raw = self.db.engine.raw_connection()
+                conn = raw.driver_connection  # None once detached
+                raw.detach()  # LISTEN is session state, keep this connection out of the pool
+                conn.autocommit = True
+                try:
+                    conn.cursor().execute(f"LISTEN {SYNC_STATUS_CHANNEL}")
+                    if not first:
+                        self.__resync()
+                    first = False
+                    while True:
+                        if select.select([conn], [], [], 60) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            notify = conn.notifies.pop(0)
+                            try:
+                                self.publish(json.loads(notify.payload))
+                            except ValueError:
+                                self.logger.warning("Invalid sync status notification: %s", notify.payload)
+                finally:
+                    raw.close()
+            except Exception as e:
+                self.logger.warning("Sync status listener failed, reconnecting: %s", e)
+                first = False
+                time.sleep(1)
+
+
+class ProgressReporter:
+    """
+    Publish the progress of writing events for a Canvas group, at most every PROGRESS_INTERVAL
+    seconds and when done. Thread safe.
+    """
+
+    def __init__(self, db: DB, canvas_group: str, total: int):
+        self.logger = get_logger(__name__)
+        self.db = db
+        self.canvas_group = canvas_group
+        self.total = total
+        self.written = 0
+        self.lock = threading.Lock()
+        self.last = 0.0
+
+    def advance(self, n: int = 1):
+        """
+        Count n more events written, and publish if due.
+        """
+        written = self.count(n)
+        if written is not None:
+            self.publish(written)
+
+    def count(self, n: int = 1) -> Optional[int]:
+        """
+        Count n more events written. Return the number to publish if due, else None. Does no I/O,
+        for the event loop of AsyncSyncer, which publishes in a thread.
+        """
+        with self.lock:
+            self.written += n
+            now = time.monotonic()
+            if now - self.last < PROGRESS_INTERVAL and self.written < self.total:
+                return None
+            self.last = now
+            return self.written
+
+    def publish(self, written: int):
+        """
+        Notify subscribers that written of the events are written.
+        """
+        try:
+            self.db.notify_sync_progress(self.canvas_group, written, self.total)
+        except Exception as e:
+            # Progress is informational, never fail a sync over it
+            self.logger.warning("%s: Failed to publish progress: %s", self.canvas_group, e)
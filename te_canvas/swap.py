@@ -0,0 +1,85 @@
+"""
+Ordering of a blue-green event swap, used by the syncers in SYNC_MODE=swap.
+
+In a swap the new set of events for a Canvas group is created before the old set is deleted, so that
+the calendar is never empty. Rather than waiting for the whole new set before deleting anything,
+old events are deleted day by day: the old events of day D are deleted as soon as every new event
+touching days D-1, D or D+1 has been created. This lets deletes overlap with the remaining creates
+while students see at most a brief duplicate, never a gap. The one-day margin absorbs the difference
+between TimeEdit's local times and the UTC times Canvas returns.
+
+Old and new events are told apart by event id: the old set is the tagged events present when the
+swap starts.
+"""
+
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from canvasapi.calendar_event import CalendarEvent
+
+
+def event_day(start_at) -> Optional[date]:
+    """
+    Day of an event start, given as a datetime or an ISO 8601 string.
+    """
+    if start_at is None:
+        return None
+    if isinstance(start_at, str):
+        start_at = datetime.fromisoformat(start_at.replace("Z", "+00:00"))
+    return start_at.date()
+
+
+def _window(day: date) -> "list[date]":
+    return [day - timedelta(days=1), day, day + timedelta(days=1)]
+
+
+class SwapPlan:
+    """
+    Book-keeping for one swap. Thread safe.
+
+    Each new event (or event series) is identified by its index and described by the days it
+    touches. Call ready() once at the start and created(i) each time new event i has been created;
+    both return the old events that may now be deleted. Every old event is returned exactly once, at
+    the latest when all new events have been created.
+    """
+
+    def __init__(self, old_events: "list[CalendarEvent]", new_days: "list[Iterable[date]]"):
+        self.lock = threading.Lock()
+        self.new_days = [set(d for d in days if d is not None) for days in new_days]
+        self.pending: Counter = Counter()
+        for days in self.new_days:
+            for d in days:
+                self.pending[d] += 1
+        self.remaining = len(self.new_days)
+
+        # Old events without a known start day are deleted last
+        self.old: dict[Optional[date], list[CalendarEvent]] = defaultdict(list)
+        for e in old_events:
+            self.old[event_day(getattr(e, "start_at", None))].append(e)
+
+    def __release(self, days: "Iterable[Optional[date]]") -> "list[CalendarEvent]":
+        res = []
+        for d in days:
+            if d not in self.old:
+                continue
+            if d is None and self.remaining > 0:
+                continue
+            if d is not None and any(self.pending[w] > 0 for w in _window(d)):
+                continue
+            res += self.old.pop(d)
+        return res
+
+    def ready(self) -> "list[CalendarEvent]":
+        with self.lock:
+            return self.__release(list(self.old.keys()))
+
+    def created(self, i: int) -> "list[CalendarEvent]":
+        with self.lock:
+            self.remaining -= 1
+            for d in self.new_days[i]:
+                self.pending[d] -= 1
+            if self.remaining == 0:
+                return self.__release(list(self.old.keys()))
+            return self.__release({w for d in self.new_days[i] for w in _window(d)})
@@ -1,6 +1,10 @@
+import contextvars
+import hashlib
 import os
+import signal
 import sys
-import traceback
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
@@ -10,13 +14,26 @@ from apscheduler.schedulers.background import BlockingScheduler
 from canvasapi.exceptions import CanvasException
 from pytz import utc
 
+from te_canvas import ledger, metrics, retry, tracing
+from te_canvas.cache import MetadataCache
 from te_canvas.canvas import Canvas
-from te_canvas.db import DB, Connection, flat_list
-from te_canvas.log import get_logger
+from te_canvas.courses import CourseCatalogue
+from te_canvas.db import DB, Connection, bump_version, flat_list
+from te_canvas.log import get_logger, summarize
+from te_canvas.mirror import ObjectMirror
+from te_canvas.profiling import Profiler
+from te_canvas.series import collapse, occurrence_days
+from te_canvas.status_feed import ProgressReporter
+from te_canvas.swap import SwapPlan
 from te_canvas.timeedit import TimeEdit
 from te_canvas.translator import TemplateError, Translator
 from te_canvas.types.sync_state import SyncState
 
+# Reservations whose events have been created are added to the group checkpoint in batches, every
+# CHECKPOINT_BATCH events or CHECKPOINT_INTERVAL seconds, whichever comes first
+CHECKPOINT_BATCH = 50
+CHECKPOINT_INTERVAL = 1.0
+
 
 class Syncer:
     """
@@ -28,8 +45,22 @@ class Syncer:
     detected, all events added by te-canvas are deleted and re-added. A sync is thus either full or
     not at all, we don't sync on individual event level.
 
+    How events are replaced is determined by env var SYNC_MODE. With "replace" (the default) all old
+    events are deleted first and the new ones created after, so the calendar is empty or partial
+    while a sync is running. With "swap" the new events are created first and the old ones deleted
+    as their days are covered, concurrently using SWAP_CONCURRENCY threads per group for creating and
+    as many for deleting (see te_canvas.swap). Note that the Canvas rate limit is shared by all
+    MAX_WORKERS * 2 * SWAP_CONCURRENCY threads.
+
+    With env var SYNC_SERIES=true, recurring events are created as Canvas event series, one request
+    per series instead of one per event (see te_canvas.series).
+
     Data used for change detection is in-memory only, so on restart te-canvas will perform a full
-    resync of all Canvas groups.
+    resync of all Canvas groups. The progress of each group sync is however checkpointed in the
+    database (see db.SyncCheckpoint), so that a sync interrupted by a crash or shutdown while adding
+    events is resumed where it stopped instead of deleting and re-adding everything. Progress is
+    written in batches (see CheckpointWriter), so a crash may re-add the events of the last batch.
+    On SIGTERM we stop starting new work, let in-flight groups write their checkpoint and exit.
 
     The syncer is mildly parallel with each thread handling the syncing of one Canvas group. Each
     such sync consist of a number of API calls which are performed sequentially within the group.
@@ -42,6 +73,14 @@ class Syncer:
     calendar events has determined that the limit seems to lie around 60. Rate limiting on TimeEdit
     should not be a concern.
 
+    Calls to TimeEdit and Canvas are retried with backoff on transient errors, and each upstream has
+    a circuit breaker (see te_canvas.retry). While a breaker is open syncing is paused: groups that
+    have not started are left untouched until the upstream answers a probe call again.
+
+    Each group sync is recorded in a ledger of sync runs with its timing, upstream call counts and
+    outcome (see te_canvas.ledger), written once per sync cycle and kept for SYNC_RUNS_RETENTION
+    days.
+
     We distinguish te-canvas events from other manually added events in Canvas by the string
     TAG_TITLE which is added as a suffix to each te-canvas event.
 
@@ -68,7 +107,7 @@ class Syncer:
     """
 
     def __init__(self, db: DB = None, timeedit: TimeEdit = None, canvas: Canvas = None):
-        self.logger = get_logger()
+        self.logger = get_logger(__name__)
 
         try:
             self.max_workers = int(os.environ["MAX_WORKERS"])
@@ -76,9 +115,23 @@ class Syncer:
             self.logger.critical("Missing env var: %s", e)
             sys.exit(1)
 
+        self.sync_mode = os.environ.get("SYNC_MODE", "replace")
+        if self.sync_mode not in ("replace", "swap"):
+            self.logger.critical("Invalid SYNC_MODE: %s", self.sync_mode)
+            sys.exit(1)
+        self.swap_concurrency = int(os.environ.get("SWAP_CONCURRENCY", 4))
+        metrics.SYNC_WORKERS.set(self.max_workers)
+        self.series = os.environ.get("SYNC_SERIES", "false") == "true"
+        try:
+            self.runs_retention = float(os.environ.get("SYNC_RUNS_RETENTION", 30))
+        except ValueError as e:
+            self.logger.critical("Invalid env var: %s", e)
+            sys.exit(1)
+
         self.db: DB = db or DB()
         self.canvas = canvas or Canvas()
         self.timeedit = timeedit or TimeEdit()
+        self.timeedit.cache = self.timeedit.cache or MetadataCache(self.db)
 
         # Mapping canvas_group to in-memory State:s
         self.states: dict[str, SyncState] = {}
@@ -86,6 +139,22 @@ class Syncer:
         # Set to false at start of each sync, set to true at completion
         self.sync_complete: dict[str, bool] = {}
 
+        # Set on shutdown, in-flight syncs stop at the next checkpoint
+        self.stopping = threading.Event()
+
+        # Runs of the current sync cycle, written to the ledger when the cycle ends
+        self.cycle = ""
+        self.profiler = Profiler()
+        self.runs: list[ledger.GroupRun] = []
+        self.runs_lock = threading.Lock()
+
+    def stop(self):
+        """
+        Ask in-flight syncs to stop at their next checkpoint, and skip groups not yet started.
+        """
+        self.logger.info("Stopping syncer")
+        self.stopping.set()
+
     def __state_te(self, canvas_group: str) -> SyncState:
         """
         Get the TimeEdit state relevant for canvas_group. Number comments reference "modifications
@@ -93,52 +162,99 @@ class Syncer:
         """
         with self.db.sqla_session() as session:
             # 1
-            te_groups = flat_list(
-                session.query(Connection.te_group)
-                .filter(
-                    Connection.canvas_group == canvas_group,
-                    Connection.delete_flag == False,
-                )
-                .order_by(Connection.canvas_group, Connection.te_group)
-            )
+            te_groups = connected_te_groups(session, canvas_group, include_flagged=False)
 
             te_events = self.timeedit.find_reservations_all(te_groups, {})
 
-            # 3,4
-            te_event_ids = [str(e["id"]) for e in te_events]
-
-            # 2
-            te_event_modify_date = "" if len(te_events) == 0 else str(max([e["modified"] for e in te_events]))
-
-            sep = ":"
-            return {
-                "te_groups": sep.join(te_groups),
-                "te_event_ids": sep.join(te_event_ids),
-                "te_event_modify_date": te_event_modify_date,
-            }
+            return state_te(te_groups, te_events)
 
     def __state_canvas(self, canvas_group: str) -> SyncState:
         """
         Get the Canvas state relevant for canvas_group. Number comments reference "modifications to
         detect", see class docstring.
         """
-        canvas_events = self.canvas.get_events(int(canvas_group))
+        return state_canvas(self.canvas.get_events(int(canvas_group)))
 
-        # 6,7
-        canvas_event_ids = [str(e.id) for e in canvas_events]
+    def _set_status(self, canvas_group: str, status: str):
+        ledger.set_status(status)
+        self.db.update_sync_status(canvas_group, status)
 
-        # 5
-        canvas_event_modify_date = "" if len(canvas_events) == 0 else str(max([e.updated_at for e in canvas_events]))
+    def _finish_run(self, run: ledger.GroupRun, synced: bool, error: Optional[BaseException] = None):
+        run.finish(synced, error)
+        metrics.SYNC_GROUP_SECONDS.observe(run.duration(), outcome=run.outcome)
+        tracing.current().set(
+            outcome=run.outcome, status=run.status or "", reservations=run.reservations, events=run.events
+        )
+        with self.runs_lock:
+            self.runs.append(run)
 
-        sep = ":"
-        return {
-            "canvas_event_ids": sep.join(canvas_event_ids),
-            "canvas_event_modify_date": canvas_event_modify_date,
-        }
+    def _write_runs(self):
+        """
+        Write the runs of the sync cycle to the ledger, with one batched upsert.
+        """
+        with self.runs_lock:
+            runs, self.runs = self.runs, []
+        try:
+            self.db.add_sync_runs([r.row() for r in runs], self.runs_retention)
+        except Exception as e:
+            self.logger.warning("Failed to write %s sync runs: %s", len(runs), e)
 
     def __has_changed(self, prev_state: Optional[SyncState], state: SyncState) -> bool:
         return state != prev_state
 
+    def __swap(self, canvas_group: str, events: "list[tuple[dict, list[str]]]") -> bool:
+        """
+        Replace the tagged events of canvas_group with events, creating before deleting (see
+        te_canvas.swap).
+
+        Returns:
+            False if interrupted by stop(), otherwise True.
+
+        Raises:
+            The first error from Canvas. Creates not yet started are then skipped, and old events
+            are only deleted for days whose new events were all created.
+        """
+        old_events = self.canvas.get_events(int(canvas_group))
+        plan = SwapPlan(old_events, [occurrence_days(event) for event, _ in events])
+        progress = ProgressReporter(self.db, canvas_group, len(events))
+        failed = threading.Event()
+        lock = threading.Lock()
+
+        # Deletes have their own threads, so that they start as soon as their day is covered instead of
+        # queueing behind all the creates
+        with (
+            ThreadPoolExecutor(max_workers=self.swap_concurrency) as create_executor,
+            ThreadPoolExecutor(max_workers=self.swap_concurrency) as delete_executor,
+        ):
+            # Threads get a copy of the context, to count upstream calls in the current sync run
+            def submit(executor: ThreadPoolExecutor, fn, *args):
+                return executor.submit(contextvars.copy_context().run, fn, *args)
+
+            deletes = [submit(delete_executor, self.canvas.delete_event, e) for e in plan.ready()]
+
+            def create(i: int) -> bool:
+                if self.stopping.is_set() or failed.is_set():
+                    return False
+                try:
+                    self.canvas.create_event(events[i][0])
+                except Exception:
+                    failed.set()
+                    raise
+                progress.advance()
+                for e in plan.created(i):
+                    with lock:
+                        deletes.append(submit(delete_executor, self.canvas.delete_event, e))
+                return True
+
+            creates = [submit(create_executor, create, i) for i in range(len(events))]
+            completed = all([f.result() for f in creates])
+
+            # All creates are done, so no more deletes will be submitted
+            deleted = [e for e in [f.result() for f in deletes] if e is not None]
+
+        self.logger.info("%s: Swapped in %s events, deleted %s", canvas_group, len(events), len(deleted))
+        return completed
+
     def sync_all(self):
         """
         Sync events for all configured Canvas groups.
@@ -147,14 +263,31 @@ class Syncer:
         of size MAX_WORKERS.
         """
         self.logger.info("Sync job started")
-        self.logger.info("1. [=== In sync_all() ===]")
-        self.logger.info(f"db={self.db}")
+
+        if upstream_down():
+            self.logger.warning("Sync job skipped: upstream unavailable")
+            return
 
         with self.db.sqla_session() as session:  # Any exception -> session.rollback()
             groups = flat_list(session.query(Connection.canvas_group).distinct().order_by(Connection.canvas_group))
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            res = list(executor.map(self.sync_one, groups))
+        self.cycle = datetime.now(utc).isoformat(timespec="seconds")
+        metrics.SYNC_GROUPS_PENDING.set(len(groups))
+
+        def start(canvas_group: str) -> bool:
+            metrics.SYNC_GROUPS_PENDING.dec()
+            return self.sync_one(canvas_group)
+
+        try:
+            with (
+                self.profiler.cycle(),
+                metrics.SYNC_CYCLE_SECONDS.time(),
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor,
+            ):
+                res = list(executor.map(start, groups))
+        finally:
+            metrics.SYNC_GROUPS_PENDING.set(0)
+            self._write_runs()
 
         self.logger.info(
             "Sync job completed: %s Canvas groups synced:  %s skipped",
@@ -164,12 +297,34 @@ class Syncer:
 
     def sync_one(self, canvas_group: str) -> bool:
         """
-        Sync events for one Canvas group.
+        Sync events for one Canvas group, recording the run in the ledger.
 
         Returns:
             False if the group was skipped due to change detection or template error, otherwise True.
         """
-        self.logger.info(f"** inside sync_one() [canvas_group:{canvas_group}]**")
+        metrics.SYNC_WORKERS_BUSY.inc()
+        try:
+            with (
+                self.profiler.group(canvas_group),
+                tracing.trace("sync_one", canvas_group=canvas_group),
+                ledger.run(self.cycle or datetime.now(utc).isoformat(timespec="seconds"), canvas_group) as run,
+            ):
+                try:
+                    synced = self.__sync_one(canvas_group)
+                except BaseException as e:
+                    self._finish_run(run, False, e)
+                    raise
+                self._finish_run(run, synced)
+                return synced
+        finally:
+            metrics.SYNC_WORKERS_BUSY.dec()
+
+    def __sync_one(self, canvas_group: str) -> bool:
+        if self.stopping.is_set():
+            return False
+        if upstream_down():
+            self.logger.warning("%s: Upstream unavailable, postponing", canvas_group)
+            return False
         with self.db.sqla_session() as session:  # Any exception -> session.rollback()
             self.logger.info("%s: Processing", canvas_group)
 
@@ -180,58 +335,71 @@ class Syncer:
                 translator = Translator(self.db, self.timeedit)
             except TemplateError:
                 self.logger.warning("%s: Template error, skipping", canvas_group)
-                self.db.update_sync_status(canvas_group, "error")
+                self._set_status(canvas_group, "error")
                 return False
 
             # Change detection
             prev_state = self.states.get(canvas_group)
             try:
-                new_state = (
-                    self.__state_te(canvas_group)
-                    | self.__state_canvas(canvas_group)
-                    | translator.get_state(canvas_group)
-                )
+                with ledger.phase("state"):
+                    new_state = (
+                        self.__state_te(canvas_group)
+                        | self.__state_canvas(canvas_group)
+                        | translator.get_state(canvas_group)
+                    )
                 self.states[canvas_group] = new_state
-                self.logger.debug("State: %s", new_state)
-                self.logger.info("************** [Sync.one.prev_state] ***************")
-                self.logger.info(prev_state)
-                self.logger.info("************** [Sync.one.new_state] ***************")
-                self.logger.info(new_state)
-                self.logger.info("*-----------------------------------------------------")
+                self.logger.debug(
+                    "%s: State: %s, previous: %s", canvas_group, summarize(new_state), summarize(prev_state)
+                )
                 if not self.__has_changed(prev_state, new_state) and self.sync_complete.get(canvas_group, False):
                     self.logger.info("%s: Nothing changed, skipping", canvas_group)
-                    self.db.update_sync_status(canvas_group, "success")
+                    self._set_status(canvas_group, "success")
                     return False
             except CanvasException as e:
                 self.logger.error("Canvas API error while getting state: %s", e.message)
-                self.db.update_sync_status(canvas_group, "error")
+                self._set_status(canvas_group, "error")
                 return False
             except Exception as e:
-                self.logger.info(f"ERROR=>{e}")
-                self.logger.error(traceback.format_exc())
-                self.logger.error("Error while getting state", stack_info=True)
-                self.db.update_sync_status(canvas_group, "error")
+                self.logger.error("%s: Error while getting state: %s", canvas_group, e, exc_info=True)
+                self._set_status(canvas_group, "error")
                 return False
 
             self.sync_complete[canvas_group] = False
 
             # Update sync status.
             self.logger.info("Updating sync state to in_progress for %s", canvas_group)
-            self.db.update_sync_status(canvas_group, "in_progress")
+            self._set_status(canvas_group, "in_progress")
 
-            # Remove all events previously added by us to this Canvas group
-            self.logger.info("%s: Deleting events", canvas_group)
-            try:
-                deleted = self.canvas.delete_events(int(canvas_group))
-                self.logger.info("%s: Deleted %s events", canvas_group, len(deleted))
-            except CanvasException as e:
-                self.logger.error("Canvas API error: %s", e.message)
-                self.db.update_sync_status(canvas_group, "error")
-                return False
-            except Exception as e:
-                self.logger.error("Non-defined Canvas API error")
-                self.db.update_sync_status(canvas_group, "error")
-                return False
+            # Resume from checkpoint if a previous sync of the same state was interrupted while
+            # adding events, otherwise start over.
+            #
+            # A swap needs no checkpoint: if interrupted, old and new events are left side by side
+            # and the next swap replaces them all.
+            state_hash = fingerprint(new_state)
+            checkpoint = self.db.get_checkpoint(canvas_group) if self.sync_mode != "swap" else None
+            written: set[str] = set()
+            if checkpoint is not None and checkpoint[0] == "creating" and checkpoint[1] == state_hash:
+                written = set(checkpoint[2])
+                self.logger.info("%s: Resuming from checkpoint, %s events already added", canvas_group, len(written))
+            elif self.sync_mode != "swap":
+                self.db.set_checkpoint(canvas_group, "deleting", state_hash)
+
+                # Remove all events previously added by us to this Canvas group
+                self.logger.info("%s: Deleting events", canvas_group)
+                try:
+                    with ledger.phase("delete"):
+                        deleted = self.canvas.delete_events(int(canvas_group))
+                    self.logger.info("%s: Deleted %s events", canvas_group, len(deleted))
+                except CanvasException as e:
+                    self.logger.error("Canvas API error: %s", e.message)
+                    self._set_status(canvas_group, "error")
+                    return False
+                except Exception as e:
+                    self.logger.error("Non-defined Canvas API error")
+                    self._set_status(canvas_group, "error")
+                    return False
+
+                self.db.set_checkpoint(canvas_group, "creating", state_hash)
 
             # Delete flagged connections
             deleted_flagged_count = (
@@ -242,6 +410,8 @@ class Syncer:
                 )
                 .delete()
             )
+            if deleted_flagged_count > 0:
+                bump_version(session, "connections")
             self.logger.info(
                 "%s: Deleted %s flagged connections",
                 canvas_group,
@@ -249,43 +419,65 @@ class Syncer:
             )
 
             # Get te_groups
-            te_groups = flat_list(
-                session.query(Connection.te_group)
-                .filter(Connection.canvas_group == canvas_group)
-                .order_by(Connection.canvas_group, Connection.te_group)
-            )
+            te_groups = connected_te_groups(session, canvas_group, include_flagged=True)
 
-            reservations = self.timeedit.find_reservations_all(te_groups, translator.get_return_types(canvas_group))
-            self.logger.info("************** [Sync.one.canvas_group] ***************")
-            self.logger.info(canvas_group)
-            self.logger.info("************** [Sync.one.te_groups] ***************")
-            self.logger.info(te_groups)
-            self.logger.info("************** [Sync.one.return_types] ***************")
-            self.logger.info(translator.return_types)
-            self.logger.info("************** [Sync.one.get_return_types] ***************")
-            self.logger.info(translator.get_return_types(canvas_group))
-            self.logger.info("*-----------------------------------------------------")
+            try:
+                with ledger.phase("fetch"):
+                    reservations = self.timeedit.find_reservations_all(
+                        te_groups, translator.get_return_types(canvas_group)
+                    )
+            except Exception as e:
+                self.logger.error("%s: TimeEdit error while getting reservations: %s", canvas_group, e)
+                self._set_status(canvas_group, "error")
+                return False
+            self.logger.debug("%s: Return types: %s", canvas_group, translator.get_return_types(canvas_group))
             self.logger.info(
                 "%s: Adding events: %s (%s events)",
                 canvas_group,
-                te_groups,
+                summarize(te_groups),
                 len(reservations),
             )
 
             try:
-                self.logger.info("************** [Sync.one.Reservations] ***************")
-                self.logger.info(reservations)
-                self.logger.info("*-----------------------------------------------------")
-                for r in reservations:
-                    new_events = translator.canvas_event(r, canvas_group) | {"context_code": f"course_{canvas_group}"}
-                    self.canvas.create_event(new_events)
+                self.logger.debug("%s: Reservations: %s", canvas_group, summarize(reservations))
+                with ledger.phase("translate"):
+                    events = [
+                        (
+                            translator.canvas_event(r, canvas_group) | {"context_code": f"course_{canvas_group}"},
+                            [str(r["id"])],
+                        )
+                        for r in reservations
+                        if str(r["id"]) not in written
+                    ]
+                    if self.series:
+                        events = collapse(events)
+                ledger.set_sizes(len(reservations), len(events))
+                with ledger.phase("write"):
+                    if self.sync_mode == "swap":
+                        if not self.__swap(canvas_group, events):
+                            self.logger.info("%s: Stopping, swap interrupted", canvas_group)
+                            return False
+                    else:
+                        progress = ProgressReporter(self.db, canvas_group, len(events))
+                        checkpoint_writer = CheckpointWriter(self.db, canvas_group)
+                        try:
+                            for event, reservation_ids in events:
+                                if self.stopping.is_set():
+                                    self.logger.info("%s: Stopping, progress saved in checkpoint", canvas_group)
+                                    return False
+                                self.canvas.create_event(event)
+                                checkpoint_writer.add(reservation_ids)
+                                progress.advance()
+                        finally:
+                            # Also on errors, so that a retry does not re-add the events created
+                            checkpoint_writer.flush()
             except CanvasException as e:
                 self.logger.error("Canvas API error: %s", e.message)
-                self.db.update_sync_status(canvas_group, "error")
+                self._set_status(canvas_group, "error")
                 return False
             except Exception as e:
                 self.logger.error("Non-defined Canvas API error")
-                self.db.update_sync_status(canvas_group, "error")
+                self._set_status(canvas_group, "error")
                 return False
 
             # Record new Canvas state
@@ -295,18 +487,123 @@ class Syncer:
             # from the calls to Canvas.create_event instead of doing a state get afterwards.
             #
             prev_state = self.states[canvas_group]  # Implicit assert that this is not None
-            new_state = prev_state | self.__state_canvas(canvas_group)
+            with ledger.phase("state"):
+                new_state = prev_state | self.__state_canvas(canvas_group)
             self.states[canvas_group] = new_state
 
             self.sync_complete[canvas_group] = True
+            self.db.delete_checkpoint(canvas_group)
 
             # Update sync status.
             self.logger.info("Updating sync state to success for %s", canvas_group)
-            self.db.update_sync_status(canvas_group, "success")
+            self._set_status(canvas_group, "success")
 
             return True
 
 
+# ---- Helper functions --------------------------------------------------------
+#
+# Shared with the asyncio engine in te_canvas.async_sync.
+
+
+def state_te(te_groups: "list[str]", te_events: list) -> SyncState:
+    """
+    TimeEdit state from the connected TimeEdit groups and their reservations. Number comments
+    reference "modifications to detect", see Syncer docstring.
+    """
+    # 3,4
+    te_event_ids = [str(e["id"]) for e in te_events]
+
+    # 2
+    te_event_modify_date = "" if len(te_events) == 0 else str(max([e["modified"] for e in te_events]))
+
+    sep = ":"
+    return {
+        "te_groups": sep.join(te_groups),
+        "te_event_ids": sep.join(te_event_ids),
+        "te_event_modify_date": te_event_modify_date,
+    }
+
+
+def state_canvas(canvas_events: list) -> SyncState:
+    """
+    Canvas state from the tagged events of a group. Number comments reference "modifications to
+    detect", see Syncer docstring.
+    """
+    # 6,7
+    canvas_event_ids = [str(e.id) for e in canvas_events]
+
+    # 5
+    canvas_event_modify_date = "" if len(canvas_events) == 0 else str(max([e.updated_at for e in canvas_events]))
+
+    sep = ":"
+    return {
+        "canvas_event_ids": sep.join(canvas_event_ids),
+        "canvas_event_modify_date": canvas_event_modify_date,
+    }
+
+
+def fingerprint(state: SyncState) -> str:
+    """
+    Hash of the parts of a state that determine which events a sync writes, i.e. everything but the
+    Canvas state. Used to check that a checkpoint is still valid.
+    """
+    relevant = sorted((k, v) for k, v in state.items() if not k.startswith("canvas_"))
+    return hashlib.sha256(repr(relevant).encode("utf-8")).hexdigest()
+
+
+class CheckpointWriter:
+    """
+    Add the reservations whose events have been created to the checkpoint of a Canvas group, in
+    batches of CHECKPOINT_BATCH events or at least every CHECKPOINT_INTERVAL seconds. Call flush()
+    when done writing, also when stopping or on errors. Thread safe.
+    """
+
+    def __init__(self, db: DB, canvas_group: str, clock=time.monotonic):
+        self.db = db
+        self.canvas_group = canvas_group
+        self.clock = clock
+        self.pending: list[str] = []
+        self.lock = threading.Lock()
+        self.last = clock()
+
+    def add(self, reservation_ids: "list[str]"):
+        """
+        Record the reservations of an event created, writing the batch if it is due.
+        """
+        with self.lock:
+            self.pending.extend(reservation_ids)
+            now = self.clock()
+            if len(self.pending) < CHECKPOINT_BATCH and now - self.last < CHECKPOINT_INTERVAL:
+                return
+            self.last = now
+        self.flush()
+
+    def flush(self):
+        """
+        Write the reservations recorded and not yet written.
+        """
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self.db.add_checkpoint_written(self.canvas_group, batch)
+
+
+def upstream_down() -> bool:
+    return any(retry.breaker(upstream).is_open() for upstream in ("timeedit", "canvas"))
+
+
+def connected_te_groups(session, canvas_group: str, include_flagged: bool) -> "list[str]":
+    """
+    TimeEdit groups connected to canvas_group, optionally including connections flagged for
+    deletion.
+    """
+    query = session.query(Connection.te_group).filter(Connection.canvas_group == canvas_group)
+    if not include_flagged:
+        query = query.filter(Connection.delete_flag == False)
+    return flat_list(query.order_by(Connection.canvas_group, Connection.te_group))
+
+
 class JobScheduler(object):
     """
     Thin wrapper around APScheduler.
@@ -314,10 +611,10 @@ class JobScheduler(object):
 
     def __init__(self):
         self.scheduler = BlockingScheduler(timezone=utc)
-        self.logger = get_logger()
+        self.logger = get_logger(__name__)
 
         def listener(event):
-            self.logger.warning(f"Job raised an Exception: {event.exception.__class__.__name__}: {event.exception}")
+            self.logger.warning("Job raised an Exception: %s: %s", event.exception.__class__.__name__, event.exception)
 
         self.scheduler.add_listener(listener, EVENT_JOB_ERROR)
 
@@ -344,7 +641,34 @@ class JobScheduler(object):
 
 
 if __name__ == "__main__":
-    syncer = Syncer()
+    if os.environ.get("SYNC_ENGINE", "threads") == "asyncio":
+        from te_canvas.async_sync import AsyncSyncer
+
+        syncer = AsyncSyncer()
+    else:
+        syncer = Syncer()
     jobs = JobScheduler()
     jobs.add(syncer.sync_all, 10, {})
+
+    mirror = ObjectMirror(syncer.db, syncer.timeedit)
+    if mirror.interval > 0:
+        jobs.add(mirror.refresh_all, mirror.interval, {})
+
+    metrics_port = int(os.environ.get("METRICS_PORT", 9100))
+    if metrics_port > 0:
+        metrics.serve(metrics_port)
+
+    courses = CourseCatalogue(syncer.db, Canvas())
+    if courses.interval > 0:
+        jobs.add(courses.refresh, courses.interval, {})
+
+    # Drain in-flight work on shutdown: syncs stop at their next checkpoint, and the scheduler waits
+    # for the running job to return.
+    def shutdown(signum, frame):
+        syncer.stop()
+        jobs.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
     jobs.start()
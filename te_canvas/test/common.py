@@ -1 +1,74 @@
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+from te_canvas.bench import servers
+from te_canvas.bench.dataset import Dataset
+from te_canvas.bench.fake_canvas import FakeCanvas
+from te_canvas.bench.fake_timeedit import FakeTimeEdit
+
 CANVAS_GROUP = 169
+
+# The test database from docker-compose.yml
+TEST_DB = {
+    "hostname": "localhost",
+    "port": "5433",
+    "username": "test_user",
+    "password": "test_password",
+    "database": "test_db",
+}
+
+
+class StandInTestCase(unittest.TestCase):
+    """
+    Runs the TimeEdit and Canvas stand-ins (te_canvas.bench) for the tests of the class, and sets the
+    env vars for te-canvas to use them.
+    """
+
+    dataset = Dataset(groups=2, reservations=20)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fake_te = FakeTimeEdit(cls.dataset)
+        cls.fake_canvas = FakeCanvas()
+        cls.servers = [servers.timeedit_server(cls.fake_te), servers.canvas_server(cls.fake_canvas)]
+        for s in cls.servers:
+            threading.Thread(target=s.serve_forever, daemon=True).start()
+        te_port, canvas_port = (s.server_port for s in cls.servers)
+        cls.env = patch.dict(
+            os.environ,
+            {
+                "TE_WSDL_URL": f"http://127.0.0.1:{te_port}/wsdl",
+                "TE_CERT": "bench",
+                "TE_USERNAME": "bench",
+                "TE_PASSWORD": "bench",
+                "TE_ID": "bench",
+                "TE_USERGROUP": "bench",
+                "TE_SEARCH_FIELDS": "courseevt.code",
+                "TE_RETURN_FIELDS": "courseevt.code",
+                "CANVAS_URL": f"http://127.0.0.1:{canvas_port}",
+                "CANVAS_KEY": "bench",
+                "MAX_WORKERS": "2",
+            },
+        )
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        for s in cls.servers:
+            s.shutdown()
+            s.server_close()
+
+    def canvas_events(self, canvas_group: str) -> "list[dict]":
+        """
+        The events of a Canvas group in the Canvas stand-in.
+        """
+        with self.fake_canvas.lock:
+            return list(self.fake_canvas.events.get(f"course_{canvas_group}", {}).values())
+
+    def clear_canvas(self):
+        with self.fake_canvas.lock:
+            self.fake_canvas.events.clear()
+            self.fake_canvas.contexts.clear()
@@ -2,6 +2,7 @@ import typing
 import unittest
 
 from te_canvas.api import create_app
+from te_canvas.api_ns.config import LTI_ADMIN
 from te_canvas.db import DB, Connection, Test
 
 
@@ -161,6 +162,37 @@ class TestAPI(unittest.TestCase):
         response = self.client.delete("/api/connection", data={"te_group": "foo", "canvas_group": "bar"})
         self.assertEqual(response.status_code, 409)
 
+    def test_api_connection_bulk(self):
+        admin = {"X-LTI-ROLES": LTI_ADMIN}
+        add = [{"canvas_group": "bulk", "te_group": f"foo_{i}", "te_type": "test_type"} for i in range(3)]
+
+        response = self.client.post("/api/connection/bulk", json={"add": add})
+        self.assertEqual(response.status_code, 403)  # Admins only
+
+        response = self.client.post("/api/connection/bulk", json={"add": add}, headers=admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["result"] for r in response.json["add"]], ["created"] * 3)
+
+        response = self.client.post(
+            "/api/connection/bulk",
+            json={
+                "add": add[:1],
+                "delete": [{"canvas_group": "bulk", "te_group": "foo_1"}, {"canvas_group": "bulk", "te_group": "x"}],
+            },
+            headers=admin,
+        )
+        self.assertEqual([r["result"] for r in response.json["add"]], ["exists"])
+        self.assertEqual([r["result"] for r in response.json["delete"]], ["deleted", "not_found"])
+        self.assertEqual([r["status"] for r in response.json["delete"]], [204, 404])
+
+        response = self.client.post(
+            "/api/connection/bulk", json={"add": add[1:2], "delete": add[2:3] + add[2:3]}, headers=admin
+        )
+        self.assertEqual(response.status_code, 400)  # Duplicate pair
+
+        response = self.client.post("/api/connection/bulk", json={"add": add[1:2]}, headers=admin)
+        self.assertEqual([r["status"] for r in response.json["add"]], [409])  # Flagged, not yet deleted
+
 
 if __name__ == "__main__":
     unittest.main()
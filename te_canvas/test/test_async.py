@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+import warnings
+
+from te_canvas.bench.runner import prepare_db
+from te_canvas.db import DB
+from te_canvas.test.common import TEST_DB, StandInTestCase
+from te_canvas.translator import TAG_TITLE
+
+
+class TestAsyncClients(StandInTestCase):
+    """
+    The async clients against the stand-ins.
+    """
+
+    def setUp(self):
+        self.clear_canvas()
+
+    def test_find_reservations(self):
+        """Reservations are the same as from the blocking client."""
+        from te_canvas.async_timeedit import AsyncTimeEdit
+        from te_canvas.timeedit import TimeEdit
+
+        async def run():
+            timeedit = AsyncTimeEdit()
+            try:
+                return await timeedit.afind_reservations_all([self.dataset.te_group(0)], {"room": ["room.name"]})
+            finally:
+                await timeedit.aclose()
+
+        expected = TimeEdit().find_reservations_all([self.dataset.te_group(0)], {"room": ["room.name"]})
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(asyncio.run(run()), expected)
+
+    def test_events(self):
+        """Events are created with all fields, listed if tagged, and deleted."""
+        from te_canvas.async_canvas import AsyncCanvas
+
+        event = {
+            "context_code": "course_2",
+            "title": "Async event" + TAG_TITLE,
+            "start_at": "2030-01-07T08:00:00",
+            "end_at": "2030-01-07T10:00:00",
+            "location_name": "Room 1, Room 2",
+            "description": '<a href="https://example.com/?a=1&b=2">Edit on TimeEdit</a>',
+        }
+
+        async def run():
+            canvas = AsyncCanvas()
+            try:
+                created = await canvas.create_event(event)
+                await canvas.create_event(event | {"title": "Untagged"})
+                listed = await canvas.get_events(2)
+                deleted = await canvas.delete_events(2)
+                return created, listed, deleted
+            finally:
+                await canvas.aclose()
+
+        created, listed, deleted = asyncio.run(run())
+        for k in ("title", "start_at", "location_name", "description"):
+            self.assertEqual(getattr(created, k), event[k])
+        self.assertEqual([e.id for e in listed], [created.id])
+        self.assertEqual([e.id for e in deleted], [created.id])
+        self.assertEqual([e["title"] for e in self.canvas_events("2")], ["Untagged"])
+
+
+class TestAsyncSyncer(StandInTestCase):
+    """
+    The asyncio sync engine against the stand-ins and the test database.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = DB(**TEST_DB)
+
+    def setUp(self):
+        prepare_db(self.db, self.dataset, reset=True)
+        self.clear_canvas()
+
+    def test_sync(self):
+        """All groups are synced, then skipped until TimeEdit changes."""
+        from te_canvas.async_sync import AsyncSyncer
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # canvasapi warns about plain HTTP
+            syncer = AsyncSyncer(db=self.db)
+        reservations = self.dataset.generate()
+
+        syncer.sync_all()
+        for i, group in enumerate(self.dataset.canvas_groups()):
+            te_group = self.dataset.te_group(i)
+            expected = [r for r in reservations if te_group in [o["extid"] for o in r["objects"]]]
+            events = self.canvas_events(group)
+            self.assertEqual(len(events), len(expected))
+            self.assertTrue(all(e["title"].endswith(TAG_TITLE) for e in events))
+            self.assertEqual(self.db.get_sync_status(group), "success")
+
+        group = self.dataset.canvas_groups()[0]
+        self.assertFalse(syncer.sync_one(group))
+        self.fake_te.mutate(1, seed=0)
+        self.assertTrue(syncer.sync_one(group))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import unittest
+import warnings
+from unittest.mock import patch
+
+from te_canvas.bench import servers
+from te_canvas.bench.dataset import Dataset, mutate
+from te_canvas.bench.fake_canvas import FakeCanvas
+from te_canvas.bench.fake_timeedit import FakeTimeEdit
+from te_canvas.bench.runner import BASELINES, compare, exact
+
+DATASET = Dataset(groups=3, reservations=40, overlap=0.5)
+
+
+class TestDataset(unittest.TestCase):
+    def test_deterministic(self):
+        """The data depends on the parameters only."""
+        self.assertEqual(DATASET.generate(), Dataset(**DATASET.params()).generate())
+        self.assertNotEqual(DATASET.generate(), Dataset(groups=3, reservations=40, overlap=0.5, seed=1).generate())
+
+    def test_overlap(self):
+        """A share of the reservations also book the course event of the next group."""
+        reservations = DATASET.generate()
+        shared = [r for r in reservations if len([o for o in r["objects"] if o["type"] == "courseevt"]) == 2]
+        self.assertEqual(len(reservations), 3 * 40)
+        self.assertGreater(len(shared), 0.3 * len(reservations))
+        self.assertLess(len(shared), 0.7 * len(reservations))
+
+    def test_mutate(self):
+        reservations = DATASET.generate()
+        changed = mutate(reservations, 0.25, seed=0)
+        moved = [(a, b) for a, b in zip(DATASET.generate(), reservations) if a != b]
+        self.assertEqual(len(moved), changed)
+        self.assertGreater(changed, 0)
+        for a, b in moved:
+            self.assertEqual((b["begin"] - a["begin"]).total_seconds(), 3600)
+
+
+class TestStandIns(unittest.TestCase):
+    """The stand-ins, exercised through the clients te-canvas uses."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fake_te = FakeTimeEdit(DATASET)
+        cls.fake_canvas = FakeCanvas()
+        cls.servers = [servers.timeedit_server(cls.fake_te), servers.canvas_server(cls.fake_canvas)]
+        for s in cls.servers:
+            threading.Thread(target=s.serve_forever, daemon=True).start()
+        te_port, canvas_port = (s.server_port for s in cls.servers)
+        cls.env = patch.dict(
+            os.environ,
+            {
+                "TE_WSDL_URL": f"http://127.0.0.1:{te_port}/wsdl",
+                "TE_CERT": "bench",
+                "TE_USERNAME": "bench",
+                "TE_PASSWORD": "bench",
+                "TE_ID": "bench",
+                "TE_USERGROUP": "bench",
+                "TE_SEARCH_FIELDS": "courseevt.code",
+                "TE_RETURN_FIELDS": "courseevt.code",
+                "CANVAS_URL": f"http://127.0.0.1:{canvas_port}",
+                "CANVAS_KEY": "bench",
+            },
+        )
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        for s in cls.servers:
+            s.shutdown()
+            s.server_close()
+
+    def test_find_reservations(self):
+        """All reservations of a group are returned, with the fields requested."""
+        from te_canvas.timeedit import TimeEdit
+
+        expected = [r for r in DATASET.generate() if DATASET.te_group(1) in [o["extid"] for o in r["objects"]]]
+        reservations = TimeEdit().find_reservations_all([DATASET.te_group(1)], {"room": ["room.name"]})
+        self.assertEqual([r["id"] for r in reservations], [r["id"] for r in expected])
+        rooms = [o for o in reservations[0]["objects"] if o["type"] == "room"]
+        expected_rooms = [o for o in expected[0]["objects"] if o["type"] == "room"]
+        self.assertEqual(rooms[0]["fields"], expected_rooms[0]["fields"])
+
+    def test_find_objects(self):
+        from te_canvas.timeedit import TimeEdit
+
+        objects = TimeEdit().find_objects("courseevt", 2, 1, None)
+        self.assertEqual([o["extid"] for o in objects], [DATASET.te_group(1), DATASET.te_group(2)])
+
+    def test_canvas_events(self):
+        """Events can be created, listed and deleted."""
+        from te_canvas.canvas import Canvas
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # canvasapi warns about plain HTTP
+            canvas = Canvas()
+        for i in range(25):
+            canvas.create_event(
+                {
+                    "context_code": "course_1",
+                    "title": f"Event {i}",
+                    "start_at": "2030-01-07T08:00:00",
+                    "end_at": "2030-01-07T10:00:00",
+                }
+            )
+        events = list(canvas.canvas.get_calendar_events(context_codes=["course_1"]))
+        self.assertEqual([e.title for e in events], [f"Event {i}" for i in range(25)])
+        for e in events:
+            e.delete()
+        self.assertEqual(list(canvas.canvas.get_calendar_events(context_codes=["course_1"])), [])
+
+
+class TestFakeCanvas(unittest.TestCase):
+    def test_pagination(self):
+        """Lists are paged as by Canvas, with a next link on all but the last page."""
+        fake = FakeCanvas()
+        for i in range(25):
+            fake.handle("POST", "/api/v1/calendar_events", "", b"calendar_event[context_code]=course_1", "")
+        query = "context_codes[]=course_1&page={}"
+        _, headers, body = fake.handle("GET", "/api/v1/calendar_events", query.format(1), b"", "http://canvas")
+        self.assertEqual(len(json.loads(body)), 10)  # Default per_page
+        self.assertIn('page=2>; rel="next"', headers["Link"])
+        _, headers, body = fake.handle("GET", "/api/v1/calendar_events", query.format(3), b"", "http://canvas")
+        self.assertEqual(len(json.loads(body)), 5)
+        self.assertNotIn('rel="next"', headers["Link"])
+
+    def test_rate_limit(self):
+        """Requests overflowing the leaky bucket are rejected with 403."""
+        fake = FakeCanvas(capacity=100, leak_rate=0, request_cost=20)
+        statuses = []
+        for _ in range(5):
+            status, headers, _ = fake.handle("GET", "/api/v1/calendar_events", "context_codes[]=course_1", b"", "")
+            statuses.append(status)
+        # Each request needs its cost and the pre-flight penalty of 50 free, and leaves its cost used
+        self.assertEqual(statuses, [200, 200, 403, 403, 403])
+        self.assertEqual(headers["X-Rate-Limit-Remaining"], "60.0")
+        self.assertEqual(fake.stats()["throttled"], 3)
+
+
+class TestCompare(unittest.TestCase):
+    def result(self, seconds: float, calls: int, rss: int) -> dict:
+        cycle = {
+            "seconds": seconds,
+            "timeedit": {"calls": {"findReservations": calls}},
+            "canvas": {"calls": {"POST calendar_events": calls}},
+            "max_rss_kib": rss,
+        }
+        return {"engine": "threads", "dataset": DATASET.params(), "options": {}, "cycles": {"initial": cycle}}
+
+    def test_no_regression(self):
+        self.assertEqual(compare(self.result(11, 10, 1000), self.result(10, 10, 1000), 0.2), [])
+
+    def test_regressions(self):
+        regressions = compare(self.result(13, 13, 1300), self.result(10, 10, 1000), 0.2)
+        self.assertEqual(len(regressions), 4)
+        self.assertTrue(regressions[0].startswith("initial seconds: 13 vs 10"))
+
+    def test_not_comparable(self):
+        other = self.result(10, 10, 1000) | {"dataset": Dataset(groups=1).params()}
+        with self.assertRaises(ValueError):
+            compare(self.result(10, 10, 1000), other, 0.2)
+
+    def test_exact(self):
+        """Exact baselines ignore timings and memory, but any other difference is reported."""
+        result = self.result(10, 10, 1000) | {"created": "2030-01-07T08:00:00+00:00"}
+        result["cycles"]["initial"] |= {"outcomes": {"synced": 3}, "canvas_events": 120}
+        baseline = exact(result)
+        self.assertNotIn("seconds", baseline["cycles"]["initial"])
+
+        slower = self.result(20, 10, 2000) | {"created": "2030-01-08T08:00:00+00:00"}
+        slower["cycles"]["initial"] |= {"outcomes": {"synced": 3}, "canvas_events": 120}
+        self.assertEqual(compare(slower, baseline, 0.2), [])
+
+        fewer = self.result(10, 9, 1000)
+        fewer["cycles"]["initial"] |= {"outcomes": {"synced": 2, "error": 1}, "canvas_events": 120}
+        regressions = compare(fewer, baseline, 0.2)
+        self.assertEqual(
+            [r.split(":")[0] for r in regressions], ["initial outcomes", "initial timeedit", "initial canvas"]
+        )
+
+    def test_seeded_baseline(self):
+        """The committed baseline is exact, for the dataset of the command in baselines/README.md."""
+        with open(os.path.join(BASELINES, "seeded.json")) as f:
+            baseline = json.load(f)
+        self.assertTrue(baseline["exact"])
+        self.assertEqual(baseline["dataset"], Dataset(groups=5, reservations=30).params())
+        self.assertEqual(list(baseline["cycles"]), ["initial", "unchanged", "changed"])
+        self.assertEqual(baseline["cycles"]["unchanged"]["canvas"]["calls"].get("POST calendar_events", 0), 0)
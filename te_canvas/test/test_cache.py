@@ -0,0 +1,79 @@
+import unittest
+
+from te_canvas.cache import MetadataCache
+
+
+class FakeDB:
+    """
+    In-memory stand-in for the cache table.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get_cache_entries(self, keys):
+        return {k: self.entries[k] for k in keys if k in self.entries}
+
+    def set_cache_entries(self, entries, expires_at):
+        for k, v in entries.items():
+            self.entries[k] = (v, expires_at)
+
+    def delete_cache_entries(self):
+        n = len(self.entries)
+        self.entries.clear()
+        return n
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.db = FakeDB()
+        self.cache = MetadataCache(self.db, ttl=3600, local_ttl=60, clock=lambda: self.now)
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        return {"extid": "room", "name": "Room"}
+
+    def test_hit(self):
+        self.assertEqual(self.cache.get("type:room", self.fetch), {"extid": "room", "name": "Room"})
+        self.assertEqual(self.cache.get("type:room", self.fetch), {"extid": "room", "name": "Room"})
+        self.assertEqual(self.calls, 1)
+
+    def test_shared(self):
+        """A second process finds the entry in the database."""
+        self.cache.get("type:room", self.fetch)
+        other = MetadataCache(self.db, ttl=3600, local_ttl=60)
+        other.get("type:room", self.fetch)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate(self):
+        self.cache.get("type:room", self.fetch)
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.cache.get("type:room", self.fetch)
+        self.assertEqual(self.calls, 2)
+
+    def test_get_many(self):
+        """Only missing keys are fetched, in one call."""
+        self.cache.get("type:room", self.fetch)
+        fetched = []
+
+        def fetch_many(keys):
+            fetched.append(keys)
+            return {k: k.upper() for k in keys}
+
+        res = self.cache.get_many(["type:room", "type:person", "type:course", "type:person"], fetch_many)
+        self.assertEqual(fetched, [["type:person", "type:course"]])
+        self.assertEqual(res["type:room"], {"extid": "room", "name": "Room"})
+        self.assertEqual(res["type:course"], "TYPE:COURSE")
+
+    def test_disabled(self):
+        cache = MetadataCache(self.db, ttl=0)
+        cache.get("type:room", self.fetch)
+        cache.get("type:room", self.fetch)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.db.entries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import warnings
+from unittest.mock import patch
+
+from te_canvas import sync
+from te_canvas.bench.runner import prepare_db
+from te_canvas.db import DB
+from te_canvas.sync import CheckpointWriter, Syncer
+from te_canvas.test.common import TEST_DB, StandInTestCase
+
+
+class FakeDB:
+    def __init__(self):
+        self.batches = []
+
+    def add_checkpoint_written(self, canvas_group, reservation_ids):
+        self.batches.append(reservation_ids)
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class TestCheckpointWriter(unittest.TestCase):
+    def test_batch_size(self):
+        db = FakeDB()
+        writer = CheckpointWriter(db, "1", clock=Clock())
+        with patch.object(sync, "CHECKPOINT_BATCH", 3):
+            for i in range(7):
+                writer.add([str(i)])
+            self.assertEqual(db.batches, [["0", "1", "2"], ["3", "4", "5"]])
+            writer.flush()
+        self.assertEqual(db.batches[-1], ["6"])
+        writer.flush()  # Nothing pending, nothing written
+        self.assertEqual(len(db.batches), 3)
+
+    def test_interval(self):
+        db = FakeDB()
+        clock = Clock()
+        writer = CheckpointWriter(db, "1", clock=clock)
+        writer.add(["1"])
+        writer.add(["2", "3"])
+        self.assertEqual(db.batches, [])
+        clock.t = sync.CHECKPOINT_INTERVAL
+        writer.add(["4"])
+        self.assertEqual(db.batches, [["1", "2", "3", "4"]])
+
+
+class TestCheckpoint(StandInTestCase):
+    """
+    Interrupted syncs, against the stand-ins and the test database.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = DB(**TEST_DB)
+        cls.group = cls.dataset.canvas_groups()[0]
+        te_group = cls.dataset.te_group(0)
+        cls.reservations = [r for r in cls.dataset.generate() if te_group in [o["extid"] for o in r["objects"]]]
+
+    def setUp(self):
+        prepare_db(self.db, self.dataset, reset=True)
+        self.clear_canvas()
+
+    def syncer(self) -> Syncer:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # canvasapi warns about plain HTTP
+            return Syncer(db=self.db)
+
+    def test_stop_and_resume(self):
+        """Events created before stop() are checkpointed, and not re-added by the next sync."""
+        syncer = self.syncer()
+        create_event = syncer.canvas.create_event
+        created = []
+
+        def create_and_stop(event):
+            created.append(create_event(event))
+            if len(created) == 5:
+                syncer.stop()
+
+        with patch.object(syncer.canvas, "create_event", create_and_stop):
+            self.assertFalse(syncer.sync_one(self.group))
+        phase, _, written = self.db.get_checkpoint(self.group)
+        self.assertEqual(phase, "creating")
+        self.assertEqual(len(written), 5)
+        self.assertEqual(len(self.canvas_events(self.group)), 5)
+
+        # As after a restart
+        self.assertTrue(self.syncer().sync_one(self.group))
+        self.assertIsNone(self.db.get_checkpoint(self.group))
+        ids = [e["id"] for e in self.canvas_events(self.group)]
+        self.assertEqual(len(ids), len(self.reservations))
+        self.assertTrue(all(e.id in ids for e in created))
+
+    def test_state_changed(self):
+        """A checkpoint for another state is discarded, and all events deleted and re-added."""
+        self.assertTrue(self.syncer().sync_one(self.group))
+        old = [e["id"] for e in self.canvas_events(self.group)]
+        self.db.set_checkpoint(self.group, "creating", "other", [str(r["id"]) for r in self.reservations[:5]])
+
+        self.assertTrue(self.syncer().sync_one(self.group))
+        self.assertIsNone(self.db.get_checkpoint(self.group))
+        new = [e["id"] for e in self.canvas_events(self.group)]
+        self.assertEqual(len(new), len(self.reservations))
+        self.assertFalse(set(old) & set(new))
+
+
+if __name__ == "__main__":
+    unittest.main()
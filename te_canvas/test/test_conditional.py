@@ -0,0 +1,81 @@
+import unittest
+
+from flask import Flask
+from flask_restx import Api, Resource
+
+from te_canvas.conditional import conditional
+from te_canvas.db import DB, bump_version
+from te_canvas.test.common import TEST_DB
+
+
+class TestConditional(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DB(**TEST_DB)
+        calls = cls.calls = []
+        db = cls.db
+
+        class Versioned(Resource):
+            @conditional(lambda self: db.get_versions(["test_conditional"]))
+            def get(self):
+                calls.append("versioned")
+                return {"data": 1}
+
+        class Hashed(Resource):
+            @conditional(max_age=60)
+            def get(self):
+                calls.append("hashed")
+                return {"data": 2}
+
+        flask = Flask(__name__)
+        api = Api(flask)
+        api.add_resource(Versioned, "/versioned")
+        api.add_resource(Hashed, "/hashed")
+        cls.client = flask.test_client()
+
+    def setUp(self):
+        self.calls.clear()
+
+    def test_versioned(self):
+        """A matching If-None-Match gets a 304 without running the endpoint."""
+        response = self.client.get("/versioned")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        self.assertEqual(response.headers["Cache-Control"], "private, no-cache")
+        self.assertEqual(response.headers["Vary"], "X-LTI-ROLES")
+
+        response = self.client.get("/versioned", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.headers["Vary"], "X-LTI-ROLES")
+        self.assertEqual(self.calls, ["versioned"])
+
+        # The tag depends on the query and the LTI roles
+        self.assertNotEqual(self.client.get("/versioned?a=1").headers["ETag"], etag)
+        response = self.client.get("/versioned", headers={"If-None-Match": etag, "X-LTI-ROLES": "Admin"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_version_bump(self):
+        """A new version of the data invalidates the tag."""
+        etag = self.client.get("/versioned").headers["ETag"]
+        with self.db.sqla_session() as session:
+            bump_version(session, "test_conditional")
+        response = self.client.get("/versioned", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_hashed(self):
+        """Without versions the tag is a hash of the body, and the endpoint always runs."""
+        response = self.client.get("/hashed")
+        etag = response.headers["ETag"]
+        self.assertEqual(response.headers["Cache-Control"], "private, max-age=60")
+        response = self.client.get("/hashed", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["Vary"], "X-LTI-ROLES")
+        self.assertEqual(response.data, b"")
+        self.assertEqual(self.calls, ["hashed", "hashed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
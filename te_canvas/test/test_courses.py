@@ -0,0 +1,104 @@
+import unittest
+
+from canvasapi.course import Course
+
+from te_canvas.courses import CourseCatalogue
+from te_canvas.db import DB, CanvasCourse
+from te_canvas.test.common import TEST_DB
+
+
+class FakeCanvas:
+    def __init__(self, courses: "list[dict]"):
+        self.courses = courses
+        self.calls = 0
+
+    def get_courses(self) -> "list[Course]":
+        self.calls += 1
+        return [Course(None, c) for c in self.courses]
+
+
+def course(id: int, name: str, code: str, term: int) -> dict:
+    return {"id": id, "name": name, "course_code": code, "enrollment_term_id": term, "workflow_state": "available"}
+
+
+class TestCourseCatalogue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DB(**TEST_DB)
+
+    def setUp(self):
+        with self.db.sqla_session() as session:
+            session.query(CanvasCourse).delete()
+        self.canvas = FakeCanvas(
+            [
+                course(1, "Mathematics", "MA_101", 1),
+                course(2, "Algebra", "MA1010", 1),
+                course(3, "Biology", "BI101", 2),
+                course(4, "Chemistry", "KE101", 2),
+            ]
+        )
+        self.courses = CourseCatalogue(self.db, self.canvas)
+
+    def ids(self, **kwargs) -> "list[int]":
+        courses, _ = self.courses.query(**kwargs)
+        return [c["id"] for c in courses]
+
+    def test_fresh(self):
+        """Courses are listed from Canvas until the catalogue is refreshed, and after COURSES_MAX_AGE."""
+        self.assertFalse(self.courses.is_fresh())
+        self.assertEqual(self.ids(), [2, 3, 4, 1])
+        self.assertEqual(self.canvas.calls, 1)
+
+        self.courses.refresh()
+        self.assertTrue(self.courses.is_fresh())
+        self.assertEqual(self.ids(), [2, 3, 4, 1])
+        self.assertEqual(self.canvas.calls, 2)  # Only the refresh
+
+        self.courses.max_age = 0
+        self.assertFalse(self.courses.is_fresh())
+
+    def test_refresh(self):
+        """Changed courses are updated, and courses no longer listed removed."""
+        self.courses.refresh()
+        self.canvas.courses[0]["name"] = "Statistics"
+        del self.canvas.courses[1]
+        with self.assertLogs("te-canvas.courses", "INFO") as logs:
+            self.courses.refresh()
+        self.assertIn("3 courses, 1 written, 1 removed", logs.output[0])
+        courses, _ = self.courses.query()
+        self.assertEqual([c["name"] for c in courses], ["Biology", "Chemistry", "Statistics"])
+
+        # An empty listing leaves the catalogue as it was
+        self.canvas.courses = []
+        self.courses.refresh()
+        self.assertEqual(self.ids(), [3, 4, 1])
+
+    def test_filter(self):
+        """The catalogue and the fallback to Canvas filter alike."""
+        for refreshed in (False, True):
+            if refreshed:
+                self.courses.refresh()
+            with self.subTest(refreshed=refreshed):
+                self.assertEqual(self.ids(term=2), [3, 4])
+                self.assertEqual(self.ids(search="ma"), [2, 1])
+                self.assertEqual(self.ids(search="A_1"), [1])  # _ is not a wildcard
+                self.assertEqual(self.ids(search="ma", term=2), [])
+                self.assertEqual(self.ids(ids=[4, 1, 99]), [4, 1])
+                self.assertEqual(self.ids(ids=[]), [])
+
+    def test_paging(self):
+        """Pages are ordered by name, with the total number of matching courses."""
+        for refreshed in (False, True):
+            if refreshed:
+                self.courses.refresh()
+            with self.subTest(refreshed=refreshed):
+                courses, total = self.courses.query(limit=2, offset=1)
+                self.assertEqual([c["name"] for c in courses], ["Biology", "Chemistry"])
+                self.assertEqual(total, 4)
+                self.assertEqual(courses[0], {"id": 3, "name": "Biology", "course_code": "BI101", "term_id": 2})
+                courses, total = self.courses.query(term=1, offset=5)
+                self.assertEqual((courses, total), ([], 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import http.client
+import os
+import statistics
+import threading
+import time
+import unittest
+import warnings
+from unittest.mock import patch
+
+from canvasapi.exceptions import RateLimitExceeded
+
+from te_canvas import retry
+from te_canvas.bench import servers
+from te_canvas.bench.dataset import Dataset
+from te_canvas.bench.fake_canvas import FakeCanvas
+from te_canvas.bench.fake_timeedit import FakeTimeEdit
+from te_canvas.bench.faults import Faults
+
+ENV = {
+    "TE_CERT": "bench",
+    "TE_USERNAME": "bench",
+    "TE_PASSWORD": "bench",
+    "TE_ID": "bench",
+    "TE_USERGROUP": "bench",
+    "TE_SEARCH_FIELDS": "courseevt.code",
+    "TE_RETURN_FIELDS": "courseevt.code",
+    "CANVAS_KEY": "bench",
+}
+
+
+class TestFaults(unittest.TestCase):
+    def test_parse(self):
+        faults = Faults.parse("latency=0.5; latency=lognormal:0.2:0.5@findReservations; error=502:0.1; drip=100")
+        self.assertEqual([r.kind for r in faults.rules], ["latency", "latency", "error", "drip"])
+        self.assertEqual(faults.rules[0].distribution, "const")
+        self.assertEqual(faults.rules[1].operation, "findReservations")
+        self.assertEqual(Faults.parse("").rules, [])
+
+    def test_parse_invalid(self):
+        for spec in ["latency", "latency=gamma:1:2", "latency=uniform:1", "error=502", "error=200:0.1", "truncate=2"]:
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                Faults.parse(spec)
+
+    def test_operations(self):
+        """Rules apply to all operations, or to an operation or Canvas method."""
+        faults = Faults.parse("latency=1; latency=2@findReservations; latency=4@POST; latency=8@GET calendar_events")
+        self.assertEqual(faults.plan("findReservations").delay, 3)
+        self.assertEqual(faults.plan("findObjects").delay, 1)
+        self.assertEqual(faults.plan("POST calendar_events").delay, 5)
+        self.assertEqual(faults.plan("GET calendar_events").delay, 9)
+        self.assertEqual(faults.stats()["delay_seconds"], 18)
+
+    def test_rates(self):
+        """Faults are injected at the given rates, reproducibly for a seed."""
+        spec = "error=502:0.1; truncate=0.05"
+        faults = Faults.parse(spec, seed=1)
+        plans = [faults.plan("getTypes") for _ in range(2000)]
+        errors = len([p for p in plans if p.status == 502])
+        self.assertAlmostEqual(errors / 2000, 0.1, delta=0.02)
+        self.assertAlmostEqual(len([p for p in plans if p.truncate]) / 2000, 0.05, delta=0.015)
+        self.assertEqual(faults.stats()["injected"]["getTypes 502"], errors)
+        again = Faults.parse(spec, seed=1)
+        self.assertEqual(plans, [again.plan("getTypes") for _ in range(2000)])
+
+    def test_latency_distributions(self):
+        faults = Faults.parse("latency=lognormal:0.2:0.5")
+        delays = [faults.plan("x").delay for _ in range(2000)]
+        self.assertAlmostEqual(statistics.median(delays), 0.2, delta=0.02)
+        self.assertGreater(max(delays), 0.5)  # Long tail
+        faults = Faults.parse("latency=uniform:1:2")
+        self.assertTrue(all(1 <= faults.plan("x").delay <= 2 for _ in range(100)))
+
+
+class TestInjection(unittest.TestCase):
+    """Faults injected by the stand-ins, as seen by the te-canvas clients."""
+
+    def serve(self, server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_port
+
+    def canvas(self, spec: str) -> "tuple[FakeCanvas, Faults, int]":
+        fake, faults = FakeCanvas(), Faults.parse(spec)
+        port = self.serve(servers.canvas_server(fake, faults=faults))
+        env = patch.dict(os.environ, ENV | {"CANVAS_URL": f"http://127.0.0.1:{port}"})
+        env.start()
+        self.addCleanup(env.stop)
+        return fake, faults, port
+
+    def test_retried_errors(self):
+        """Intermittent 502s are retried by the Canvas client."""
+        from te_canvas.canvas import Canvas
+
+        _, faults, _ = self.canvas("error=502:0.3")
+        with (
+            warnings.catch_warnings(),
+            patch.object(retry, "_policy", retry.RetryPolicy(attempts=10, base_delay=0.001)),
+            patch.dict(retry._breakers, clear=True),
+        ):
+            warnings.simplefilter("ignore")
+            canvas = Canvas()
+            for _ in range(10):
+                self.assertEqual(canvas.get_events(1), [])
+        self.assertGreater(faults.stats()["injected"]["GET calendar_events 502"], 0)
+
+    def test_throttling(self):
+        """An injected 403 is Canvas' rate limit response."""
+        from te_canvas.canvas import Canvas
+
+        _, faults, _ = self.canvas("error=403:1@POST")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            canvas = Canvas()
+        with self.assertRaises(RateLimitExceeded):
+            canvas.canvas.create_calendar_event({"context_code": "course_1", "title": "Event"})
+        self.assertEqual(faults.stats()["injected"], {"POST calendar_events 403": 1})
+
+    def test_truncate(self):
+        """A truncated response promises more body than is sent, and drops the connection."""
+        _, _, port = self.canvas("truncate=1")
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("POST", "/api/v1/calendar_events", body="calendar_event[context_code]=course_1")
+        with self.assertRaises(http.client.IncompleteRead):
+            conn.getresponse().read()
+        conn.close()
+
+    def test_drip(self):
+        fake, _, port = self.canvas("drip=2000@GET")
+        for _ in range(10):
+            fake.handle("POST", "/api/v1/calendar_events", "", b"calendar_event[context_code]=course_1", "")
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        start = time.perf_counter()
+        conn.request("GET", "/api/v1/calendar_events?context_codes[]=course_1")
+        body = conn.getresponse().read()
+        conn.close()
+        self.assertGreater(len(body), 1000)
+        self.assertGreater(time.perf_counter() - start, len(body) / 2000 * 0.9)
+
+    def test_timeedit_operations(self):
+        """TimeEdit faults are matched to the SOAP operation called."""
+        from te_canvas.timeedit import TimeEdit
+
+        dataset = Dataset(groups=2, reservations=5)
+        faults = Faults.parse("latency=0.3@register")
+        port = self.serve(servers.timeedit_server(FakeTimeEdit(dataset), faults=faults))
+        with patch.dict(os.environ, ENV | {"TE_WSDL_URL": f"http://127.0.0.1:{port}/wsdl"}):
+            start = time.perf_counter()
+            timeedit = TimeEdit()
+            self.assertGreater(time.perf_counter() - start, 0.3)
+            self.assertEqual(len(timeedit.find_objects("courseevt", 10, 0, None)), 2)
+        self.assertEqual(faults.stats()["delay_seconds"], 0.3)
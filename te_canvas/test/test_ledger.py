@@ -0,0 +1,52 @@
+import contextvars
+import threading
+import unittest
+
+from te_canvas import ledger, retry
+
+
+class TestLedger(unittest.TestCase):
+    def test_outcome(self):
+        """Outcome is derived from the return value and the last status written."""
+        cases = [
+            (True, None, None, "synced"),
+            (False, "success", None, "unchanged"),
+            (False, "error", None, "error"),
+            (False, None, None, "skipped"),
+            (False, "in_progress", ValueError(), "error"),
+        ]
+        for synced, status, error, outcome in cases:
+            run = ledger.GroupRun("cycle", "1")
+            if status is not None:
+                run.set_status(status)
+            run.finish(synced, error)
+            self.assertEqual(run.outcome, outcome)
+
+    def test_error_class(self):
+        """The exception being handled when the error status is written is recorded."""
+        with ledger.run("cycle", "1") as run:
+            try:
+                raise KeyError("x")
+            except KeyError:
+                ledger.set_status("error")
+        self.assertEqual(run.error_class, "KeyError")
+
+    def test_count_calls(self):
+        """Upstream calls are counted in the current run, also from threads given its context."""
+        with ledger.run("cycle", "1") as run:
+            with ledger.phase("fetch"):
+                retry.call("timeedit", lambda: None)
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(retry.call, "canvas", lambda: None))
+            thread.start()
+            thread.join()
+        retry.call("canvas", lambda: None)  # Outside of the run
+
+        row = run.row()
+        self.assertEqual(row["timeedit_calls"], 1)
+        self.assertEqual(row["canvas_calls"], 1)
+        self.assertIn("fetch", row["phases"])
+        self.assertIsNone(ledger.current())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from te_canvas import log
+
+
+def record(lineno: int = 1, level: int = logging.INFO, **extra) -> logging.LogRecord:
+    r = logging.LogRecord("te-canvas.sync", level, "sync.py", lineno, "%s: Processing", ("1",), None)
+    r.__dict__.update(extra)
+    return r
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_limit(self):
+        """Messages from a call site beyond the limit are suppressed, and counted after the window."""
+        f = log.RateLimitFilter(limit=2, window=60)
+        with patch("time.monotonic", return_value=0):
+            self.assertEqual([f.filter(record()) for _ in range(4)], [True, True, False, False])
+            self.assertTrue(f.filter(record(lineno=2)))
+        with patch("time.monotonic", return_value=61):
+            r = record()
+            self.assertTrue(f.filter(r))
+        self.assertIn("2 similar messages suppressed", r.getMessage())
+
+    def test_exempt(self):
+        """Errors and messages logged with NO_RATE_LIMIT are never suppressed."""
+        f = log.RateLimitFilter(limit=1, window=60)
+        self.assertTrue(all(f.filter(record(level=logging.ERROR)) for _ in range(3)))
+        self.assertTrue(all(f.filter(record(**log.NO_RATE_LIMIT)) for _ in range(3)))
+
+    def test_default(self):
+        """Without LOG_RATE_LIMIT nothing is suppressed, e.g. the per-group lines of a sync."""
+        with patch.object(log, "_handler", None), patch.dict("os.environ", clear=True):
+            handler = log._configure()
+        logging.getLogger(log.ROOT).removeHandler(handler)
+        self.assertTrue(all(handler.filter(record()) for _ in range(100)))
+
+
+class TestLog(unittest.TestCase):
+    def test_summarize(self):
+        """Payloads are formatted only when emitted, and cut."""
+
+        class Payload:
+            def __repr__(self):
+                raise AssertionError("formatted")
+
+        logger = log.get_logger("te_canvas.test_log")
+        logger.setLevel(logging.INFO)
+        logger.debug("%s", log.summarize(Payload()))
+
+        with patch.object(log, "_payload_chars", 10):
+            s = str(log.summarize(list(range(100))))
+        self.assertTrue(s.startswith("list of 100: [0, 1, 2, ... ("))
+
+    def test_names(self):
+        """Module loggers are children of te-canvas, so per-module levels apply."""
+        self.assertEqual(log.get_logger("te_canvas.timeedit").name, "te-canvas.timeedit")
+        self.assertEqual(log.get_logger("te_canvas.api_ns.config").name, "te-canvas.api_ns.config")
+        self.assertEqual(log.get_logger().name, "te-canvas")
+        self.assertEqual(log._level("warning"), logging.WARNING)
+        with self.assertRaises(ValueError):
+            log._level("loud")
@@ -0,0 +1,42 @@
+import json
+import unittest
+
+from te_canvas.metrics import Registry, endpoint
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        """Buckets are rendered cumulatively, with sum and count."""
+        registry = Registry()
+        h = registry.histogram("latency_seconds", "Latency.", ("operation",), buckets=(0.1, 1))
+        for v in (0.05, 0.5, 5):
+            h.observe(v, operation="op")
+        out = registry.render()
+        self.assertIn('latency_seconds_bucket{operation="op",le="0.1"} 1', out)
+        self.assertIn('latency_seconds_bucket{operation="op",le="1.0"} 2', out)
+        self.assertIn('latency_seconds_bucket{operation="op",le="+Inf"} 3', out)
+        self.assertIn('latency_seconds_count{operation="op"} 3', out)
+
+    def test_merge(self):
+        """Snapshots of other processes are merged: counters summed, gauges as declared."""
+        registry = Registry()
+        c = registry.counter("calls_total", "Calls.", ("result",))
+        g = registry.gauge("remaining", "Remaining.", merge="min")
+        c.inc(2, result="ok")
+        g.set(50)
+        other = json.loads(json.dumps(registry.snapshot()))
+        c.inc(1, result="ok")
+        g.set(70)
+
+        out = registry.render([other])
+        self.assertIn('calls_total{result="ok"} 5', out)
+        self.assertIn("remaining 50", out)
+
+    def test_endpoint(self):
+        """Ids are removed from Canvas paths, to keep label cardinality low."""
+        self.assertEqual(endpoint("https://canvas/api/v1/calendar_events/123?x=1"), "/api/v1/calendar_events/:id")
+        self.assertEqual(endpoint("/api/v1/courses/5/calendar_events"), "/api/v1/courses/:id/calendar_events")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+from flask_restx import Api
+from psycopg2.errors import UniqueViolation
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import te_canvas.api_ns.config as config_api
+from te_canvas.db import DB, Base, TemplateConfig
+from te_canvas.migrations import MIGRATIONS
+from te_canvas.test.common import TEST_DB
+
+
+class TestMigrations(unittest.TestCase):
+    def test_versions(self):
+        """Versions are numbered 1, 2, ... in order."""
+        self.assertEqual([m.version for m in MIGRATIONS], list(range(1, len(MIGRATIONS) + 1)))
+
+    def test_model_indexes(self):
+        """Indexes declared on tables that predate migrations are also created by a migration."""
+        statements = " ".join(s for m in MIGRATIONS for s in m.statements)
+        for table in ("connections", "template_config"):
+            for index in Base.metadata.tables[table].indexes:
+                self.assertIn(f"IF NOT EXISTS {index.name} ", statements)
+
+    def test_template_duplicates(self):
+        """Template rows that the unique index would reject are removed, keeping the oldest."""
+        rows = [
+            ("title", "courseevt", "a", None),
+            ("title", "courseevt", "a", ""),  # Duplicate, no canvas_group is ''
+            ("title", "courseevt", "a", "1"),
+            ("title", "courseevt", "a", "1"),  # Duplicate
+            ("title", "courseevt", None, "1"),
+            ("title", "courseevt", None, "1"),  # Not a duplicate for the index, nulls differ
+        ]
+        db = DB(**TEST_DB)
+        with db.engine.connect() as conn, conn.begin() as transaction:
+            conn.execute(text("DROP INDEX IF EXISTS uq_template_config"))
+            conn.execute(text("DELETE FROM template_config"))
+            ids = []
+            for row in rows:
+                ids.append(
+                    conn.execute(
+                        text(
+                            "INSERT INTO template_config (config_type, te_type, te_field, canvas_group)"
+                            " VALUES (:c, :t, :f, :g) RETURNING id"
+                        ),
+                        dict(zip("ctfg", row)),
+                    ).scalar_one()
+                )
+            (migration,) = [m for m in MIGRATIONS if m.version == 2]
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            left = [r[0] for r in conn.execute(text("SELECT id FROM template_config ORDER BY id"))]
+            self.assertEqual(left, [ids[0], ids[2], ids[4], ids[5]])
+            transaction.rollback()
+
+
+class TestTemplateUnique(unittest.TestCase):
+    """
+    Adding a template that uq_template_config would reject.
+    """
+
+    def setUp(self):
+        self.db = DB(**TEST_DB)
+        self.clear()
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        with self.db.sqla_session() as session:
+            session.query(TemplateConfig).delete()
+
+    def test_no_group(self):
+        """No canvas_group and '' are the same group, as for the index."""
+        self.db.add_template_config("title", "courseevt", "a", None)
+        with self.assertRaises(UniqueViolation):
+            self.db.add_template_config("title", "courseevt", "a", "")
+        self.db.add_template_config("title", "courseevt", "b", "")
+        self.db.add_template_config("title", "courseevt", "c", None)
+        with self.assertRaises(UniqueViolation):
+            self.db.add_template_config("title", "courseevt", "d", "")  # Fourth of the group
+
+    def test_api_race(self):
+        """A template added concurrently, after the duplicate check, is a 400 and not a 500."""
+        flask = Flask(__name__)
+        api = Api(flask, prefix="/api")
+        api.add_resource(
+            config_api.Template, "/config/template", resource_class_kwargs={"db": self.db, "timeedit": None}
+        )
+        form = {
+            "config_type": "title",
+            "te_type": "courseevt",
+            "te_field": "a",
+            "canvas_group": "1",
+            "default": "false",
+        }
+        with patch.object(self.db, "add_template_config", side_effect=IntegrityError("INSERT", {}, Exception())):
+            response = flask.test_client().post("/api/config/template", query_string=form)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"message": "Type and field combination already exist"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from te_canvas.db import DB, MirroredObject, MirrorState, WhitelistTypes
+from te_canvas.mirror import ObjectMirror
+from te_canvas.test.common import TEST_DB, StandInTestCase
+from te_canvas.timeedit import TimeEdit
+
+
+class TestMirror(StandInTestCase):
+    """
+    ObjectMirror against the TimeEdit stand-in and the test database.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = DB(**TEST_DB)
+        cls.objects = cls.fake_te.objects["courseevt"]
+        cls.extids = sorted(cls.objects)
+
+    def setUp(self):
+        with self.db.sqla_session() as session:
+            session.query(MirroredObject).delete()
+            session.query(MirrorState).delete()
+            session.query(WhitelistTypes).delete()
+            session.add(WhitelistTypes(extid="courseevt"))
+        self.mirror = ObjectMirror(self.db, TimeEdit())
+
+    def set_code(self, extid: str, code: str):
+        fields = self.objects[extid]["fields"]
+        self.addCleanup(fields.__setitem__, "courseevt.code", fields["courseevt.code"])
+        fields["courseevt.code"] = code
+
+    def refresh(self) -> str:
+        with self.assertLogs("te-canvas.mirror", "INFO") as logs:
+            self.mirror.refresh_all()
+        return logs.output[-1].split("Mirror: courseevt: ")[1]
+
+    def test_refresh(self):
+        """Only new and changed objects are written, and objects gone from TimeEdit are removed."""
+        n = len(self.extids)
+        self.assertEqual(self.refresh(), f"{n} objects, {n} written, 0 removed")
+        self.assertEqual(self.refresh(), f"{n} objects, 0 written, 0 removed")
+
+        self.set_code(self.extids[0], "CHANGED")
+        removed = self.objects.pop(self.extids[1])
+        self.addCleanup(self.objects.__setitem__, self.extids[1], removed)
+        self.assertEqual(self.refresh(), f"{n - 1} objects, 1 written, 1 removed")
+
+        objects = self.mirror.find_objects("courseevt", 100, 0, None)
+        self.assertEqual([o["extid"] for o in objects], [self.extids[0]] + self.extids[2:])
+        self.assertEqual(objects[0]["courseevt.code"], "CHANGED")
+
+    def test_has_type(self):
+        """Types are served once refreshed, until the refresh is older than MIRROR_MAX_AGE."""
+        self.assertFalse(self.mirror.has_type("courseevt"))
+        self.mirror.refresh_all()
+        self.assertTrue(self.mirror.has_type("courseevt"))
+        self.assertFalse(self.mirror.has_type("room"))  # Not whitelisted
+        self.mirror.max_age = 0
+        self.assertFalse(self.mirror.has_type("courseevt"))
+
+        # No longer whitelisted
+        self.mirror.max_age = 86400
+        with self.db.sqla_session() as session:
+            session.query(WhitelistTypes).delete()
+        self.mirror.refresh_all()
+        self.assertFalse(self.mirror.has_type("courseevt"))
+        self.assertEqual(self.mirror.find_objects("courseevt", 100, 0, None), [])
+
+    def test_search(self):
+        """Search is a case insensitive substring match, where % and _ are not wildcards."""
+        self.set_code(self.extids[0], "Lab_10%")
+        self.set_code(self.extids[1], "LAB110")
+        self.mirror.refresh_all()
+
+        def search(s: str) -> "list[str]":
+            return [o["extid"] for o in self.mirror.find_objects("courseevt", 100, 0, s)]
+
+        self.assertEqual(search("lab_1"), [self.extids[0]])
+        self.assertEqual(search("0%"), [self.extids[0]])
+        self.assertEqual(search("lab"), self.extids[:2])
+        self.assertEqual(search("\\"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
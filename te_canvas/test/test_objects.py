@@ -0,0 +1,157 @@
+import base64
+import json
+import threading
+import time
+import typing
+import unittest
+from unittest.mock import patch
+
+import zeep
+
+from te_canvas import offload
+from te_canvas.api import create_app
+from te_canvas.bench.dataset import Dataset
+from te_canvas.db import DB, MirrorState, SingleflightResult, WhitelistTypes
+from te_canvas.offload import OffloadPool, UpstreamTimeout
+from te_canvas.retry import CircuitOpenError
+from te_canvas.test.common import TEST_DB, StandInTestCase
+from te_canvas.timeedit import TimeEdit
+
+
+class TestObjects(StandInTestCase):
+    """
+    /api/timeedit/objects against the TimeEdit stand-in, with more objects than fit in one page.
+
+    The offload pool errors are tested here too, since the API can only be created once per process.
+    """
+
+    dataset = Dataset(groups=1500, reservations=1, overlap=0)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = DB(**TEST_DB)
+        with cls.db.sqla_session() as session:
+            # Not served from the mirror
+            session.query(WhitelistTypes).delete()
+            session.query(MirrorState).delete()
+        cls.client = create_app(cls.db).test_client()
+        cls.extids = [cls.dataset.te_group(i) for i in range(cls.dataset.groups)]
+
+    def setUp(self):
+        # Results shared between API processes would let a test reuse the pages of the previous one
+        with self.db.sqla_session() as session:
+            session.query(SingleflightResult).delete()
+
+    def test_stream(self):
+        """All objects are streamed as one JSON array, fetching one page at a time."""
+        self.fake_te.reset_stats()
+        response = self.client.get("/api/timeedit/objects", query_string={"type": "courseevt"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual([o["extid"] for o in typing.cast(list, response.json)], self.extids)
+        self.assertEqual(self.fake_te.stats()["calls"]["findObjects"], 3)  # Count and two pages
+
+    def stream_error(self, response) -> "tuple[list, dict]":
+        """The objects and the error line of a stream that ended early."""
+        self.assertEqual(response.status_code, 200)
+        data, error, end = response.get_data(as_text=True).split("\n")
+        self.assertEqual(end, "")
+        return json.loads(data), json.loads(error)
+
+    def test_stream_timeout(self):
+        """If a later page times out, the array is closed and followed by an error line."""
+        with patch("te_canvas.api_ns.timeedit.pool") as pool:
+            pool.return_value.run.side_effect = UpstreamTimeout
+            response = self.client.get("/api/timeedit/objects", query_string={"type": "courseevt"})
+            objects, error = self.stream_error(response)
+        self.assertEqual([o["extid"] for o in objects], self.extids[:1000])
+        self.assertEqual(error, {"error": {"status": 504, "message": "Upstream request timed out"}})
+
+    def test_stream_upstream_error(self):
+        """If TimeEdit fails on a later page, the status of the error follows the array."""
+        iter_objects_all = TimeEdit.iter_objects_all
+        cases = [
+            (zeep.exceptions.Fault("Internal error"), 502, "TimeEdit request failed"),
+            (CircuitOpenError("timeedit"), 503, "timeedit is temporarily unavailable"),
+        ]
+        for exception, status, message in cases:
+
+            def failing(timeedit, type, search_string):
+                pages = iter_objects_all(timeedit, type, search_string)
+                yield next(pages)
+                raise exception
+
+            with self.subTest(status=status), patch.object(TimeEdit, "iter_objects_all", failing):
+                response = self.client.get("/api/timeedit/objects", query_string={"type": "courseevt"})
+                objects, error = self.stream_error(response)
+                self.assertEqual(len(objects), 1000)
+                self.assertEqual(error, {"error": {"status": status, "message": message}})
+
+    def test_cursor(self):
+        """Following next_cursor returns all objects once, and ends with a null cursor."""
+        query = {"type": "courseevt", "number_of_objects": 600, "cursor": ""}
+        objects = []
+        cursors = []
+        while query["cursor"] is not None:
+            response = self.client.get("/api/timeedit/objects", query_string=query)
+            self.assertEqual(response.status_code, 200)
+            page = typing.cast(dict, response.json)
+            objects += page["objects"]
+            cursors.append(page["next_cursor"])
+            query["cursor"] = page["next_cursor"]
+        self.assertEqual([o["extid"] for o in objects], self.extids)
+        self.assertEqual(len(cursors), 3)
+        decoded = json.loads(base64.urlsafe_b64decode(cursors[0]))
+        self.assertEqual(decoded, {"type": "courseevt", "search_string": None, "index": 600})
+
+    def test_cursor_max(self):
+        """Pages are at most 1000 objects, and a larger number_of_objects does not end the listing."""
+        query = {"type": "courseevt", "number_of_objects": 2000, "cursor": ""}
+        page = typing.cast(dict, self.client.get("/api/timeedit/objects", query_string=query).json)
+        self.assertEqual(len(page["objects"]), 1000)
+        self.assertIsNotNone(page["next_cursor"])
+        query["cursor"] = page["next_cursor"]
+        page = typing.cast(dict, self.client.get("/api/timeedit/objects", query_string=query).json)
+        self.assertEqual([o["extid"] for o in page["objects"]], self.extids[1000:])
+        self.assertIsNone(page["next_cursor"])
+
+    def test_cursor_invalid(self):
+        """Cursors that cannot be decoded or are for another query are rejected."""
+        other = base64.urlsafe_b64encode(
+            json.dumps({"type": "room", "search_string": None, "index": 600}).encode()
+        ).decode()
+        for cursor in ["not a cursor", base64.urlsafe_b64encode(b"{}").decode(), other]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    "/api/timeedit/objects", query_string={"type": "courseevt", "cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json, {"message": "Invalid cursor"})
+
+    def test_overloaded(self):
+        """Requests beyond the offload pool and its queue get a 503."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        pool = OffloadPool(workers=1, queue=0)
+        threading.Thread(target=pool.run, args=(release.wait,), daemon=True).start()
+        while pool.pending < 1:
+            time.sleep(0.01)
+        with patch.object(offload, "_pool", pool):
+            response = self.client.get("/api/timeedit/object", query_string={"extid": "room_1"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "5")
+
+    def test_timeout(self):
+        """Requests not done within the request timeout get a 504."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        pool = OffloadPool(workers=1, queue=0, timeout=0.1)
+        with patch.object(offload, "_pool", pool), patch.object(TimeEdit, "get_object", lambda *_: release.wait()):
+            response = self.client.get("/api/timeedit/object", query_string={"extid": "room_1"})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json, {"message": "Upstream request timed out"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import time
+import typing
+import unittest
+from unittest.mock import patch
+
+from flask import Flask, request
+from flask_restx import Api, Resource
+
+from te_canvas import offload
+from te_canvas.offload import OffloadPool, Overloaded, UpstreamTimeout, offloaded
+
+
+class TestOffloadPool(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def block(self, pool: OffloadPool, n: int):
+        """Occupy n places of the pool until the test ends."""
+        started = threading.Semaphore(0)
+
+        def blocked():
+            started.release()
+            self.release.wait()
+
+        threads = [threading.Thread(target=pool.run, args=(blocked,), daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for _ in range(min(n, pool.workers)):
+            started.acquire()
+        while pool.pending < n:
+            time.sleep(0.01)
+
+    def test_run(self):
+        pool = OffloadPool(workers=2, queue=0)
+        self.assertEqual(pool.run(lambda a, b=0: a + b, 1, b=2), 3)
+        with self.assertRaises(ValueError):
+            pool.run(int, "not a number")
+        self.assertEqual(pool.pending, 0)
+
+    def test_queue_bound(self):
+        """Requests beyond the threads and the queue are rejected at once, until a place is free."""
+        pool = OffloadPool(workers=2, queue=1)
+        self.block(pool, 3)
+        start = time.monotonic()
+        with self.assertRaises(Overloaded):
+            pool.run(lambda: 1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(pool.pending, 3)
+
+        self.release.set()
+        while pool.pending:
+            time.sleep(0.01)
+        self.assertEqual(pool.run(lambda: 1), 1)
+
+    def test_timeout(self):
+        """A timed out call keeps its place in the pool until it returns."""
+        pool = OffloadPool(workers=1, queue=0, timeout=0.1)
+        with self.assertRaises(UpstreamTimeout):
+            pool.run(self.release.wait)
+        self.assertEqual(pool.pending, 1)
+        with self.assertRaises(Overloaded):
+            pool.run(lambda: 1)
+        self.release.set()
+        while pool.pending:
+            time.sleep(0.01)
+
+    def test_from_env(self):
+        env = {"UPSTREAM_WORKERS": "4", "UPSTREAM_QUEUE": "8", "REQUEST_TIMEOUT": "2.5"}
+        with patch.dict("os.environ", env):
+            pool = OffloadPool.from_env()
+        self.assertEqual((pool.workers, pool.queue, pool.timeout), (4, 8, 2.5))
+        with patch.dict("os.environ", {"UPSTREAM_WORKERS": "many"}), self.assertRaises(SystemExit):
+            OffloadPool.from_env()
+
+
+class TestOffloaded(unittest.TestCase):
+    def test_offloaded(self):
+        """The method runs on a pool thread, in the context of its request."""
+        flask = Flask(__name__)
+        api = Api(flask)
+
+        class Echo(Resource):
+            @offloaded
+            def get(self):
+                return {"thread": threading.current_thread().name, "q": request.args["q"]}
+
+        api.add_resource(Echo, "/echo")
+        with patch.object(offload, "_pool", OffloadPool(workers=1, queue=0)):
+            response = flask.test_client().get("/echo?q=1")
+        self.assertEqual(response.status_code, 200)
+        data = typing.cast(dict, response.json)
+        self.assertTrue(data["thread"].startswith("upstream"))
+        self.assertEqual(data["q"], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
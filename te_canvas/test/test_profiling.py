@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from te_canvas.profiling import Profiler
+
+
+def busy(seconds: float) -> list:
+    data = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        data.append(bytearray(1000))
+    return data
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def profiler(self, **env) -> Profiler:
+        with patch.dict(os.environ, {"PROFILE_DIR": self.dir, "PROFILE_INTERVAL": "0.001"} | env):
+            return Profiler()
+
+    def files(self) -> "list[str]":
+        return sorted(n for n in os.listdir(self.dir))
+
+    def test_disabled(self):
+        """Without PROFILE_DIR nothing is profiled."""
+        with patch.dict(os.environ, {"PROFILE_DIR": "", "PROFILE_EVERY": "1", "PROFILE_GROUPS": "1"}):
+            profiler = Profiler()
+        with profiler.cycle(), profiler.group("1"):
+            pass
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(self.files(), [])
+
+    def test_every(self):
+        """Every Nth cycle is profiled, writing collapsed stacks and an allocation report."""
+        profiler = self.profiler(PROFILE_EVERY="2")
+        for _ in range(2):
+            with profiler.cycle():
+                data = busy(0.1)
+        self.assertFalse(tracemalloc.is_tracing())
+        alloc, collapsed = self.files()
+        self.assertTrue(collapsed.endswith("-cycle.collapsed"))
+        self.assertTrue(alloc.endswith("-cycle.alloc.txt"))
+
+        with open(os.path.join(self.dir, collapsed)) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines))
+        self.assertTrue(any("MainThread;" in line and "busy@test_profiling.py" in line for line in lines))
+
+        with open(os.path.join(self.dir, alloc)) as f:
+            self.assertIn("test_profiling.py", f.read())
+        self.assertTrue(data)
+
+    def test_trigger(self):
+        """A trigger file profiles the next cycle, or the groups it lists, and is removed."""
+        profiler = self.profiler()
+        with open(os.path.join(self.dir, "trigger"), "w") as f:
+            f.write("2\n")
+        with profiler.cycle():
+            with profiler.group("1"):
+                busy(0.01)
+            with profiler.group("2"):
+                busy(0.01)
+        self.assertEqual([n.split("-", 1)[1] for n in self.files()], ["group-2.alloc.txt", "group-2.collapsed"])
+
+        # Triggered groups are profiled in the next cycle only
+        with profiler.cycle(), profiler.group("2"):
+            pass
+        self.assertEqual(len(self.files()), 2)
+
+    def test_prune(self):
+        """Only the last PROFILE_KEEP profiles are kept."""
+        profiler = self.profiler(PROFILE_GROUPS="1,2,3", PROFILE_KEEP="2")
+        for g in ["1", "2", "3"]:
+            with profiler.group(g):
+                pass
+        self.assertEqual(len(self.files()), 4)
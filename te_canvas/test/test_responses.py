@@ -0,0 +1,122 @@
+import gzip
+import json
+import os
+import unittest
+import zlib
+from datetime import date, datetime
+from unittest.mock import patch
+
+from flask import Flask, Response
+
+from te_canvas import responses
+
+ITEMS = [{"extid": f"room_{i}", "room.name": f"Room {i}"} for i in range(200)]
+
+
+class TestSerializer(unittest.TestCase):
+    def test_serializers(self):
+        """Both serializers produce the same JSON, also for values json cannot serialize itself."""
+        data = {"items": ITEMS, "at": datetime(2030, 1, 7, 8), "on": date(2030, 1, 7), 1: "non-string key"}
+        expected = {"items": ITEMS, "at": "2030-01-07T08:00:00", "on": "2030-01-07", "1": "non-string key"}
+        for name in ("json", "orjson"):
+            if name == "orjson" and responses.orjson is None:
+                continue
+            with self.subTest(serializer=name), patch.dict(os.environ, {"JSON_SERIALIZER": name}):
+                dumps = responses._serializer()
+                self.assertEqual(dumps.__name__, f"_dumps_{name}")
+                self.assertEqual(json.loads(dumps(data)), expected)
+
+    def test_unknown_serializer(self):
+        with patch.dict(os.environ, {"JSON_SERIALIZER": "simplejson"}):
+            self.assertIs(responses._serializer(), responses._dumps_json)
+
+
+class TestCompress(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        flask = Flask(__name__)
+        flask.after_request(responses.compress)
+
+        @flask.route("/large")
+        def large():
+            response = responses.output_json(ITEMS, 200)
+            response.set_etag("abc")
+            return response
+
+        @flask.route("/small")
+        def small():
+            return responses.output_json(ITEMS[:1], 200)
+
+        @flask.route("/stream")
+        def stream():
+            return Response((responses.dumps(item) + b"\n" for item in ITEMS), mimetype="application/x-ndjson")
+
+        @flask.route("/events")
+        def events():
+            return Response((f"data: {i}\n\n" for i in range(100)), mimetype="text/event-stream")
+
+        @flask.route("/not-modified")
+        def not_modified():
+            return Response(b"x" * 2000, 304)
+
+        cls.client = flask.test_client()
+
+    def get(self, path: str, encoding: str):
+        return self.client.get(path, headers={"Accept-Encoding": encoding})
+
+    def test_gzip(self):
+        response = self.get("/large", "gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(response.data)), ITEMS)
+        self.assertLess(len(response.data), len(responses.dumps(ITEMS)))
+        self.assertEqual(response.headers["ETag"], 'W/"abc"')  # Strong tag made weak
+
+    @unittest.skipIf(responses.brotli is None, "brotli not installed")
+    def test_brotli(self):
+        """Brotli is preferred when the client accepts it."""
+        response = self.get("/large", "gzip, br")
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(json.loads(responses.brotli.decompress(response.data)), ITEMS)
+
+    def test_stream(self):
+        """Streamed responses stay streamed, compressed chunk by chunk."""
+        for encoding in ("gzip", "br"):
+            if encoding == "br" and responses.brotli is None:
+                continue
+            with self.subTest(encoding=encoding):
+                response = self.get("/stream", encoding)
+                self.assertTrue(response.is_streamed)
+                self.assertEqual(response.headers["Content-Encoding"], encoding)
+                self.assertNotIn("Content-Length", response.headers)
+                decompress = gzip.decompress if encoding == "gzip" else responses.brotli.decompress
+                lines = decompress(response.data).splitlines()
+                self.assertEqual([json.loads(line) for line in lines], ITEMS)
+
+    def test_stream_chunks(self):
+        """Each chunk is flushed, so that it can be decompressed as soon as it arrives."""
+        chunks = responses._compress_stream(iter([b'{"a":1}', "\n", b'{"b":2}']), "gzip")
+        decompressor = zlib.decompressobj(31)
+        self.assertEqual(decompressor.decompress(next(chunks)), b'{"a":1}')
+        self.assertEqual(decompressor.decompress(next(chunks)), b"\n")
+        self.assertEqual(decompressor.decompress(next(chunks)), b'{"b":2}')
+        decompressor.decompress(b"".join(chunks))
+        self.assertTrue(decompressor.eof)
+
+    def test_exempt(self):
+        """Small, 304 and event-stream responses, and clients not accepting compression, are left as is."""
+        for path, encoding in [("/small", "gzip"), ("/not-modified", "gzip"), ("/events", "gzip"), ("/large", "")]:
+            with self.subTest(path=path, encoding=encoding):
+                response = self.get(path, encoding)
+                self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(self.get("/events", "gzip").data, b"".join(f"data: {i}\n\n".encode() for i in range(100)))
+
+    def test_min_size(self):
+        with patch.dict(os.environ, {"COMPRESS_MIN_SIZE": "10"}):
+            self.assertEqual(self.get("/small", "gzip").headers["Content-Encoding"], "gzip")
+        with patch.dict(os.environ, {"COMPRESS_MIN_SIZE": "100000"}):
+            self.assertNotIn("Content-Encoding", self.get("/large", "gzip").headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
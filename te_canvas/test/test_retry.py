@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import requests
+import zeep.exceptions
+from canvasapi.exceptions import (
+    CanvasException,
+    RateLimitExceeded,
+    ResourceDoesNotExist,
+)
+
+from te_canvas import retry
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class TestRetry(unittest.TestCase):
+    def test_is_transient(self):
+        """Throttling, 5xx and timeouts are transient, client errors are not."""
+        self.assertTrue(retry.is_transient(RateLimitExceeded("")))
+        self.assertTrue(retry.is_transient(CanvasException("Encountered an error: status code 502")))
+        self.assertTrue(retry.is_transient(CanvasException("Encountered an error: status code 429")))
+        self.assertTrue(retry.is_transient(zeep.exceptions.TransportError(status_code=503)))
+        self.assertTrue(retry.is_transient(requests.exceptions.ReadTimeout()))
+        self.assertFalse(retry.is_transient(ResourceDoesNotExist("Not Found")))
+        self.assertFalse(retry.is_transient(zeep.exceptions.Fault("Invalid login")))
+        self.assertFalse(retry.is_transient(ValueError()))
+
+    def test_is_transient_non_idempotent(self):
+        """Non-idempotent calls are only retried when the request was surely not processed."""
+        self.assertTrue(retry.is_transient(RateLimitExceeded(""), idempotent=False))
+        self.assertTrue(retry.is_transient(zeep.exceptions.TransportError(status_code=429), idempotent=False))
+        self.assertFalse(retry.is_transient(zeep.exceptions.TransportError(status_code=502), idempotent=False))
+        self.assertFalse(retry.is_transient(requests.exceptions.ReadTimeout(), idempotent=False))
+
+    def test_backoff(self):
+        """Delays grow exponentially and are capped."""
+        p = retry.RetryPolicy(attempts=10, base_delay=1, max_delay=5)
+        with patch("random.uniform", lambda a, b: b):
+            self.assertEqual([p.delay(n) for n in range(5)], [1, 2, 4, 5, 5])
+
+    def test_breaker(self):
+        """Breaker opens after threshold failures, lets one probe through after timeout."""
+        clock = Clock()
+        b = retry.CircuitBreaker("test", failure_threshold=2, reset_timeout=10, clock=clock)
+        b.record_failure()
+        self.assertTrue(b.allow())
+        b.record_failure()
+        self.assertTrue(b.is_open())
+        self.assertFalse(b.allow())
+
+        clock.t = 10
+        self.assertFalse(b.is_open())
+        self.assertTrue(b.allow())  # The probe
+        self.assertFalse(b.allow())  # Only one probe at a time
+        b.record_failure()
+        self.assertFalse(b.allow())  # Reopened
+
+        clock.t = 20
+        self.assertTrue(b.allow())
+        b.record_success()
+        self.assertEqual(b.state, retry.CircuitBreaker.CLOSED)
+        self.assertTrue(b.allow())
+
+    def test_call(self):
+        """call() retries transient errors and gives up on others."""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitExceeded("")
+            return "ok"
+
+        def broken():
+            raise ResourceDoesNotExist("Not Found")
+
+        with patch.object(retry, "_policy", retry.RetryPolicy(attempts=4, base_delay=0)), patch.object(
+            retry, "_breakers", {"test": retry.CircuitBreaker("test", failure_threshold=10)}
+        ):
+            self.assertEqual(retry.call("test", flaky), "ok")
+            self.assertEqual(len(attempts), 3)
+            with self.assertRaises(ResourceDoesNotExist):
+                retry.call("test", broken)
+
+    def test_call_open(self):
+        """call() fails fast while the breaker is open."""
+        b = retry.CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+        b.record_failure()
+        with patch.object(retry, "_breakers", {"test": b}):
+            with self.assertRaises(retry.CircuitOpenError):
+                retry.call("test", lambda: "never called")
+
+    def test_cancelled_probe(self):
+        """A half-open probe ended by a BaseException, e.g. cancellation, lets the next probe through."""
+        clock = Clock()
+        b = retry.CircuitBreaker("test", failure_threshold=1, reset_timeout=10, clock=clock)
+        b.record_failure()
+        clock.t = 10
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        def interrupted():
+            raise KeyboardInterrupt()
+
+        with patch.object(retry, "_breakers", {"test": b}):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(retry.call_async("test", cancelled))
+            self.assertFalse(b.is_open())
+            with self.assertRaises(KeyboardInterrupt):
+                retry.call("test", interrupted)
+            self.assertEqual(retry.call("test", lambda: "ok"), "ok")
+        self.assertEqual(b.state, retry.CircuitBreaker.CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
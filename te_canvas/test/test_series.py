@@ -0,0 +1,50 @@
+import unittest
+from datetime import date, datetime, timedelta
+
+from te_canvas.series import collapse, occurrence_days
+
+
+def event(start_at: datetime, title: str = "Lecture", id: str = "1") -> dict:
+    return {
+        "title": title,
+        "start_at": start_at,
+        "end_at": start_at + timedelta(hours=2),
+        "description": f'Room 1<br><br><a href="https://timeedit/{id}">Edit</a>',
+    }
+
+
+class TestSeries(unittest.TestCase):
+    def test_weekly(self):
+        start = datetime(2022, 10, 3, 10)
+        events = [(event(start + timedelta(weeks=k), id=str(k)), [str(k)]) for k in range(4)]
+        res = collapse(events)
+        self.assertEqual(len(res), 1)
+        first, ids = res[0]
+        self.assertEqual(first["start_at"], start)
+        self.assertEqual(first["duplicate"], {"count": 3, "interval": 1, "frequency": "weekly"})
+        self.assertEqual(ids, ["0", "1", "2", "3"])
+
+    def test_gap(self):
+        """A missing week ends the run."""
+        start = datetime(2022, 10, 3, 10)
+        events = [(event(start + timedelta(weeks=k)), [str(k)]) for k in (0, 1, 3)]
+        res = collapse(events)
+        self.assertEqual([ids for _, ids in res], [["0", "1"], ["3"]])
+        self.assertNotIn("duplicate", res[1][0])
+
+    def test_different_content(self):
+        start = datetime(2022, 10, 3, 10)
+        events = [
+            (event(start), ["0"]),
+            (event(start + timedelta(weeks=1), title="Lab"), ["1"]),
+        ]
+        self.assertEqual(collapse(events), events)
+
+    def test_occurrence_days(self):
+        e = event(datetime(2022, 10, 3, 10)) | {"duplicate": {"count": 2, "interval": 1, "frequency": "daily"}}
+        self.assertEqual(occurrence_days(e), [date(2022, 10, 3), date(2022, 10, 4), date(2022, 10, 5)])
+        self.assertEqual(occurrence_days({"start_at": datetime(2022, 10, 3, 10)}), [date(2022, 10, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from te_canvas.db import DB, SingleflightResult
+from te_canvas.singleflight import Group, SharedGroup, key
+from te_canvas.test.common import TEST_DB
+
+
+class TestSingleflight(unittest.TestCase):
+    def test_coalesce(self):
+        """Concurrent calls with the same key share one call."""
+        group = Group()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(group.do("k", fn))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 5)
+
+    def test_error(self):
+        """The exception of a failed call is raised, and the next call starts over."""
+        group = Group()
+
+        def fail():
+            raise ValueError("upstream")
+
+        with self.assertRaises(ValueError):
+            group.do("k", fail)
+        self.assertEqual(group.do("k", lambda: 1), 1)
+
+
+class TestSharedGroup(unittest.TestCase):
+    """
+    Coalescing across processes, each simulated by a SharedGroup of its own.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DB(**TEST_DB)
+
+    def setUp(self):
+        with self.db.sqla_session() as session:
+            session.query(SingleflightResult).delete()
+        self.calls = []
+
+    def fn(self, result="result", wait: float = 0.0):
+        def call():
+            self.calls.append(1)
+            time.sleep(wait)
+            return result
+
+        return call
+
+    def test_coalesce(self):
+        """Concurrent calls in different processes share one call."""
+        results = []
+
+        def do():
+            results.append(SharedGroup(self.db, ttl=5).do("k", self.fn(wait=0.2)))
+
+        threads = [threading.Thread(target=do) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, ["result"] * 3)
+
+    def test_json(self):
+        """The first process gets the result as read back from the database, like the others."""
+        result = {"at": datetime(2030, 1, 7, 8), "ids": (1, 2)}
+        expected = {"at": "2030-01-07 08:00:00", "ids": [1, 2]}
+        self.assertEqual(SharedGroup(self.db, ttl=5).do("k", self.fn(result)), expected)
+        self.assertEqual(SharedGroup(self.db, ttl=5).do("k", self.fn(result)), expected)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_ttl(self):
+        """Stored results expire, and ttl 0 disables sharing."""
+        SharedGroup(self.db, ttl=0.1).do("k", self.fn())
+        time.sleep(0.2)
+        SharedGroup(self.db, ttl=0.1).do("k", self.fn())
+        self.assertEqual(len(self.calls), 2)
+
+        SharedGroup(self.db, ttl=0).do("other", self.fn())
+        with self.db.sqla_session() as session:
+            self.assertIsNone(session.get(SingleflightResult, "other"))
+
+    def test_max_locks(self):
+        """Calls beyond max_locks go to the upstream without waiting for a lock."""
+        group = SharedGroup(self.db, ttl=5, max_locks=1)
+        release = threading.Event()
+        leader = threading.Thread(target=group.do, args=("a", release.wait))
+        leader.start()
+        while group.locks._value:  # type: ignore
+            time.sleep(0.01)
+        self.assertEqual(group.do("b", self.fn()), "result")
+        release.set()
+        leader.join()
+        with self.db.sqla_session() as session:
+            self.assertEqual(session.get(SingleflightResult, "a").value, True)
+            self.assertIsNone(session.get(SingleflightResult, "b"))
+
+    def test_lock_timeout(self):
+        """A lock is held at most lock_timeout, then the result is still returned."""
+        group = SharedGroup(self.db, ttl=5, lock_timeout=0.2)
+        with self.assertLogs("te-canvas.singleflight", "WARNING"):
+            self.assertEqual(group.do("k", self.fn(wait=0.5)), "result")
+        self.assertEqual(group.locks._value, 8)  # type: ignore
+        self.assertEqual(SharedGroup(self.db, ttl=5).do("k", self.fn()), "result")
+        self.assertEqual(len(self.calls), 1)  # Stored nevertheless
+
+    def test_key(self):
+        self.assertEqual(key("a", [1, 2]), key("a", [1, 2]))
+        self.assertNotEqual(key("a", [1, 2]), key("a", [2, 1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import queue
+import unittest
+
+from te_canvas.db import DB, Connection
+from te_canvas.status_feed import ProgressReporter, StatusFeed
+from te_canvas.test.common import TEST_DB
+
+
+class FakeDB:
+    def __init__(self):
+        self.progress = []
+
+    def notify_sync_progress(self, canvas_group, written, total):
+        self.progress.append((canvas_group, written, total))
+
+
+class TestStatusFeed(unittest.TestCase):
+    def test_publish(self):
+        """Notifications reach the subscriptions of their Canvas group only."""
+        feed = StatusFeed(FakeDB())
+        feed.thread = object()  # Do not start the listener
+        a = feed.subscribe(["1", "2"])
+        b = feed.subscribe(["3"])
+
+        feed.publish({"canvas_group": "2", "status": "in_progress"})
+        feed.publish({"canvas_group": "2", "progress": {"written": 1, "total": 2, "percent": 50}})
+
+        self.assertEqual([a.queue.get_nowait()[0] for _ in range(2)], ["status", "progress"])
+        self.assertTrue(b.queue.empty())
+
+        feed.unsubscribe(a)
+        feed.publish({"canvas_group": "2", "status": "success"})
+        self.assertTrue(a.queue.empty())
+
+    def test_max_streams(self):
+        feed = StatusFeed(FakeDB())
+        feed.thread = object()
+        feed.max_streams = 1
+        self.assertIsNotNone(feed.subscribe(["1"]))
+        self.assertIsNone(feed.subscribe(["1"]))
+
+    def test_progress_throttled(self):
+        """Progress is published at most every PROGRESS_INTERVAL seconds, and when done."""
+        db = FakeDB()
+        progress = ProgressReporter(db, "1", 100)
+        for _ in range(100):
+            progress.advance()
+        self.assertEqual(db.progress, [("1", 1, 100), ("1", 100, 100)])
+
+    def test_progress_count(self):
+        """count only tells when to publish, for the async syncer to publish in a thread."""
+        db = FakeDB()
+        progress = ProgressReporter(db, "1", 3)
+        self.assertEqual([progress.count() for _ in range(3)], [1, None, 3])
+        self.assertEqual(db.progress, [])
+
+
+class TestStatusFeedNotify(unittest.TestCase):
+    """
+    Notifications from the database to a subscription.
+    """
+
+    groups = ["feed_1", "feed_2"]
+
+    def setUp(self):
+        self.db = DB(**TEST_DB)
+        self.addCleanup(self.delete_connections)
+        self.feed = StatusFeed(self.db)
+        self.sub = self.feed.subscribe(self.groups)
+        assert self.sub is not None
+        # Wait for the listener to LISTEN
+        for _ in range(50):
+            self.db.update_sync_status("feed_1", "success")
+            try:
+                self.sub.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        while not self.sub.queue.empty():
+            self.sub.queue.get_nowait()
+
+    def delete_connections(self):
+        with self.db.sqla_session() as session:
+            session.query(Connection).filter(Connection.canvas_group.in_(self.groups)).delete()
+
+    def test_bulk_reset(self):
+        """The sync status reset by a bulk change reaches the stream of each affected group."""
+        self.db.apply_connections([("feed_1", "te_1", "courseevt"), ("feed_2", "te_2", "courseevt")], [])
+        events = sorted((self.sub.queue.get(timeout=5) for _ in self.groups), key=lambda e: e[1]["canvas_group"])
+        self.assertEqual(
+            events,
+            [
+                ("status", {"canvas_group": "feed_1", "status": ""}),
+                ("status", {"canvas_group": "feed_2", "status": ""}),
+            ],
+        )
+        self.assertEqual(self.db.get_sync_statuses(self.groups), {"feed_1": "", "feed_2": ""})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import threading
+import unittest
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from canvasapi.calendar_event import CalendarEvent
+
+from te_canvas.swap import SwapPlan, event_day
+from te_canvas.sync import Syncer
+
+
+def old_event(id: int, start_at: str) -> CalendarEvent:
+    return CalendarEvent(None, {"id": id, "start_at": start_at})
+
+
+class TestSwap(unittest.TestCase):
+    def test_event_day(self):
+        self.assertEqual(event_day(datetime(2022, 10, 1, 10)), date(2022, 10, 1))
+        self.assertEqual(event_day("2022-10-01T22:00:00Z"), date(2022, 10, 1))
+        self.assertEqual(event_day(None), None)
+
+    def test_plan(self):
+        """Old events are released once all new events within a day of them are created."""
+        old = [
+            old_event(1, "2022-10-01T10:00:00Z"),
+            old_event(2, "2022-10-10T10:00:00Z"),
+            old_event(3, "2022-12-24T10:00:00Z"),  # No new events nearby
+        ]
+        new_days = [[date(2022, 10, 1)], [date(2022, 10, 2)], [date(2022, 10, 10)]]
+        plan = SwapPlan(old, new_days)
+
+        self.assertEqual([e.id for e in plan.ready()], [3])
+        self.assertEqual(plan.created(0), [])  # 2022-10-02 is still pending
+        self.assertEqual([e.id for e in plan.created(2)], [2])
+        self.assertEqual([e.id for e in plan.created(1)], [1])
+
+    def test_plan_no_day(self):
+        """Old events without a start are released last."""
+        plan = SwapPlan([old_event(1, None)], [[date(2022, 10, 1)]])
+        self.assertEqual(plan.ready(), [])
+        self.assertEqual([e.id for e in plan.created(0)], [1])
+
+    def test_plan_no_new_events(self):
+        """With nothing to create, everything is released immediately."""
+        plan = SwapPlan([old_event(1, "2022-10-01T10:00:00Z"), old_event(2, None)], [])
+        self.assertEqual(sorted(e.id for e in plan.ready()), [1, 2])
+
+    def test_delete_not_queued(self):
+        """An old event is deleted once its day is covered, also while creates are pending."""
+        canvas = MagicMock()
+        canvas.get_events.return_value = [old_event(1, "2022-10-01T10:00:00Z")]
+        deleted = threading.Event()
+        canvas.delete_event.side_effect = lambda e: deleted.set()
+
+        def create_event(event):
+            if event["title"] == "Later":
+                # Only returns early if the delete does not wait for this create
+                self.assertTrue(deleted.wait(5))
+
+        canvas.create_event.side_effect = create_event
+        with patch.dict(os.environ, {"MAX_WORKERS": "1", "SYNC_MODE": "swap", "SWAP_CONCURRENCY": "1"}):
+            syncer = Syncer(db=MagicMock(), timeedit=MagicMock(), canvas=canvas)
+        events = [
+            ({"title": "First", "start_at": datetime(2022, 10, 1, 10)}, ["1"]),
+            ({"title": "Later", "start_at": datetime(2022, 12, 24, 10)}, ["2"]),
+        ]
+        self.assertTrue(syncer._Syncer__swap("1", events))
+        self.assertEqual(canvas.delete_event.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
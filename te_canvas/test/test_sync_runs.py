@@ -0,0 +1,145 @@
+import typing
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+from flask_restx import Api
+
+import te_canvas.api_ns.sync as sync_api
+from te_canvas import responses
+from te_canvas.api_ns.config import LTI_ADMIN
+from te_canvas.db import DB, SyncRun
+from te_canvas.test.common import TEST_DB
+
+NOW = datetime.now(timezone.utc)
+
+
+def run(cycle: str, canvas_group: str, days_ago: float, duration: float, outcome: str = "synced") -> dict:
+    started_at = NOW - timedelta(days=days_ago)
+    return {
+        "cycle": cycle,
+        "canvas_group": canvas_group,
+        "started_at": started_at,
+        "ended_at": started_at + timedelta(seconds=duration),
+        "duration": duration,
+        "outcome": outcome,
+        "error_class": "KeyError" if outcome == "error" else None,
+        "reservations": 10,
+        "events": 10,
+        "phases": {"fetch": duration},
+        "timeedit_calls": 2,
+        "canvas_calls": 20,
+        "timeedit_bytes": 1000,
+        "canvas_bytes": 5000,
+    }
+
+
+class SyncRunsTestCase(unittest.TestCase):
+    """
+    Four runs, of two cycles and two Canvas groups.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DB(**TEST_DB)
+
+    def setUp(self):
+        with self.db.sqla_session() as session:
+            session.query(SyncRun).delete()
+        self.db.add_sync_runs(
+            [
+                run("c1", "g1", 3, 1.0),
+                run("c1", "g2", 3, 4.0, "error"),
+                run("c2", "g1", 1, 2.0, "unchanged"),
+                run("c2", "g2", 1, 3.0),
+            ],
+            retention_days=30,
+        )
+
+
+class TestSyncRuns(SyncRunsTestCase):
+    def runs(self, **kwargs) -> "list[tuple[str, str]]":
+        return [(r["cycle"], r["canvas_group"]) for r in self.db.get_sync_runs(**kwargs)]
+
+    def test_upsert(self):
+        """A run written again, e.g. when it ends, replaces the earlier row."""
+        self.db.add_sync_runs([run("c2", "g1", 1, 5.0, "error")], retention_days=30)
+        (row,) = self.db.get_sync_runs(canvas_group="g1", outcome="error")
+        self.assertEqual((row["cycle"], row["duration"], row["error_class"]), ("c2", 5.0, "KeyError"))
+        self.assertEqual(len(self.runs()), 4)
+
+    def test_retention(self):
+        """Runs started before the retention period are deleted, also when there are no new runs."""
+        self.db.add_sync_runs([run("old", "g1", 10, 1.0)], retention_days=30)
+        self.assertEqual(len(self.runs()), 5)
+        self.db.add_sync_runs([run("c3", "g1", 0, 1.0)], retention_days=2)
+        self.assertEqual(self.runs(), [("c3", "g1"), ("c2", "g1"), ("c2", "g2")])
+        self.db.add_sync_runs([], retention_days=0.5)
+        self.assertEqual(self.runs(), [("c3", "g1")])
+
+    def test_filter(self):
+        self.assertEqual(self.runs(canvas_group="g1"), [("c2", "g1"), ("c1", "g1")])
+        self.assertEqual(self.runs(outcome="error"), [("c1", "g2")])
+        self.assertEqual(sorted(self.runs(since=NOW - timedelta(days=2))), [("c2", "g1"), ("c2", "g2")])
+        self.assertEqual(self.runs(order="duration", limit=2), [("c1", "g2"), ("c2", "g2")])
+
+    def test_summary(self):
+        summary = self.db.get_sync_run_summary(NOW - timedelta(days=7))
+        self.assertEqual([s["canvas_group"] for s in summary], ["g2", "g1"])
+        g2 = summary[0]
+        self.assertEqual((g2["runs"], g2["synced"], g2["errors"]), (2, 1, 1))
+        self.assertEqual((g2["total_duration"], g2["max_duration"]), (7.0, 4.0))
+        self.assertEqual((g2["timeedit_calls"], g2["canvas_calls"], g2["bytes"]), (4, 40, 12000))
+        self.assertEqual(len(self.db.get_sync_run_summary(NOW - timedelta(days=2), limit=1)), 1)
+
+
+class TestSyncRunsApi(SyncRunsTestCase):
+    """
+    /api/sync/runs and /api/sync/runs/summary.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Not create_app, whose namespaces can only be added to one app per process
+        flask = Flask(__name__)
+        api = Api(flask, prefix="/api")
+        api.representations["application/json"] = responses.output_json
+        api.add_resource(sync_api.Runs, "/sync/runs", resource_class_kwargs={"db": cls.db})
+        api.add_resource(sync_api.Summary, "/sync/runs/summary", resource_class_kwargs={"db": cls.db})
+        cls.client = flask.test_client()
+
+    def get(self, path: str, **query):
+        return self.client.get(path, query_string=query, headers={"X-LTI-ROLES": LTI_ADMIN})
+
+    def test_admin_only(self):
+        for path in ("/api/sync/runs", "/api/sync/runs/summary"):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 403)
+
+    def test_runs(self):
+        response = self.get("/api/sync/runs", canvas_group="g2", order="duration")
+        self.assertEqual(response.status_code, 200)
+        runs = typing.cast(list, response.json)
+        self.assertEqual([r["cycle"] for r in runs], ["c1", "c2"])
+        self.assertEqual(runs[0]["phases"], {"fetch": 4.0})
+        self.assertEqual(datetime.fromisoformat(runs[0]["started_at"]), NOW - timedelta(days=3))
+
+        since = (NOW - timedelta(days=2)).isoformat()
+        self.assertEqual(len(typing.cast(list, self.get("/api/sync/runs", since=since).json)), 2)
+        self.assertEqual(len(typing.cast(list, self.get("/api/sync/runs", limit=1).json)), 1)
+
+    def test_invalid(self):
+        for query in ({"outcome": "failed"}, {"order": "name"}, {"limit": 0}, {"since": "yesterday"}):
+            with self.subTest(query=query):
+                self.assertEqual(self.get("/api/sync/runs", **query).status_code, 400)
+
+    def test_summary(self):
+        response = self.get("/api/sync/runs/summary", days=2)
+        self.assertEqual(response.status_code, 200)
+        summary = typing.cast(list, response.json)
+        self.assertEqual([(s["canvas_group"], s["runs"]) for s in summary], [("g2", 1), ("g1", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
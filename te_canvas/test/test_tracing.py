@@ -0,0 +1,91 @@
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from te_canvas import ledger, tracing
+
+
+def exporter(**env) -> tracing.Exporter:
+    with patch.dict(os.environ, env):
+        e = tracing.Exporter()
+    tracing._exporter = e
+    return e
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing._exporter = None
+
+    def test_disabled(self):
+        """Without TRACE_EXPORT nothing is recorded."""
+        e = exporter(TRACE_EXPORT="", TRACE_SAMPLE_RATE="1")
+        with patch.object(e, "export") as export:
+            with tracing.trace("sync_one") as root:
+                with tracing.span("child") as child:
+                    child.set(n=1)
+        self.assertIs(root, tracing.NOOP)
+        self.assertIs(child, tracing.NOOP)
+        export.assert_not_called()
+
+    def test_spans(self):
+        """Spans nest, also across phases and threads given the context, and record errors."""
+        e = exporter(TRACE_EXPORT="file", TRACE_SAMPLE_RATE="1")
+        with patch.object(e, "export") as export:
+            with tracing.trace("sync_one", canvas_group="1"), ledger.run("cycle", "1"):
+                with ledger.phase("fetch"):
+                    with tracing.span("timeedit.findReservations", page=0):
+                        pass
+                    thread = threading.Thread(
+                        target=contextvars.copy_context().run, args=(tracing.record, "canvas.request", 0.5)
+                    )
+                    thread.start()
+                    thread.join()
+                with self.assertRaises(ValueError):
+                    with tracing.span("db.session"):
+                        tracing.current().add("statements")
+                        tracing.current().add("statements")
+                        raise ValueError()
+        spans = {s.name: s for s in export.call_args[0][0]}
+        self.assertEqual(set(spans), {"sync_one", "fetch", "timeedit.findReservations", "canvas.request", "db.session"})
+        self.assertIsNone(spans["sync_one"].parent_id)
+        self.assertEqual(spans["fetch"].parent_id, spans["sync_one"].span_id)
+        self.assertEqual(spans["timeedit.findReservations"].parent_id, spans["fetch"].span_id)
+        self.assertEqual(spans["canvas.request"].parent_id, spans["fetch"].span_id)
+        self.assertAlmostEqual((spans["canvas.request"].end_ns - spans["canvas.request"].start_ns) / 1e9, 0.5)
+        self.assertEqual(spans["db.session"].attributes["statements"], 2)
+        self.assertEqual(spans["db.session"].error, "ValueError")
+        self.assertEqual(len({s.trace.trace_id for s in spans.values()}), 1)
+
+    def test_slow(self):
+        """With TRACE_SLOW_SECONDS, unsampled traces are exported if slow."""
+        e = exporter(TRACE_EXPORT="file", TRACE_SAMPLE_RATE="0", TRACE_SLOW_SECONDS="0.05")
+        with patch.object(e, "export") as export:
+            with tracing.trace("sync_one", canvas_group="fast"):
+                pass
+            with tracing.trace("sync_one", canvas_group="slow"):
+                time.sleep(0.06)
+        self.assertEqual(export.call_count, 1)
+        self.assertEqual(export.call_args[0][0][0].attributes["canvas_group"], "slow")
+
+    def test_file_export(self):
+        """Traces are appended to TRACE_FILE as JSON lines of OTLP spans."""
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "traces.jsonl")
+            e = exporter(TRACE_EXPORT="file", TRACE_SAMPLE_RATE="1", TRACE_FILE=path)
+            for i in range(2):
+                with tracing.trace("sync_one", canvas_group=str(i)):
+                    with tracing.span("translate", reservations=10):
+                        pass
+            e.queue.join()
+            with open(path) as f:
+                traces = [json.loads(line) for line in f]
+        self.assertEqual(len(traces), 2)
+        root, child = traces[0]
+        self.assertEqual(child["parentSpanId"], root["spanId"])
+        self.assertEqual(child["traceId"], root["traceId"])
+        self.assertEqual(child["attributes"], [{"key": "reservations", "value": {"intValue": "10"}}])
@@ -1,14 +1,20 @@
-import os
-import sys
-import zeep
 import base64
 import itertools
+import os
+import sys
 from datetime import datetime
-from typing import Optional, Any, List, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+import zeep
 from zeep.helpers import serialize_object
-from te_canvas.log import get_logger
 
-logger = get_logger()
+from te_canvas import ledger, metrics, retry, singleflight, tracing
+from te_canvas.log import get_logger, summarize
+
+if TYPE_CHECKING:
+    from te_canvas.cache import MetadataCache
+
+logger = get_logger(__name__)
 
 
 class TimeEdit:
@@ -27,22 +33,26 @@ class TimeEdit:
             # Mandatory fields varies across TE instances.
             self.RETURN_FIELDS = os.environ["TE_RETURN_FIELDS"].split(",")
         except Exception as e:
-            logger.critical(f"Missing env var: {e}")
+            logger.critical("Missing env var: %s", e)
             sys.exit(1)
 
-        wsdl = f"https://cloud.timeedit.net/soap/3/{self.ID}/wsdl"
+        # TE_WSDL_URL points the client at another server, e.g. the stand-in in te_canvas.bench
+        wsdl = os.environ.get("TE_WSDL_URL") or f"https://cloud.timeedit.net/soap/3/{self.ID}/wsdl"
+        self.wsdl = wsdl
 
         try:
             self.client = zeep.Client(wsdl)  # type: ignore
+            # Count bytes received in the current sync run, see te_canvas.ledger
+            self.client.transport.session.hooks["response"].append(ledger.requests_hook("timeedit"))
         except Exception as e:
-            logger.critical(f'Failed to load TimeEdit WSDL from "{wsdl}": {e}')
+            logger.critical('Failed to load TimeEdit WSDL from "%s": %s', wsdl, e)
             sys.exit(1)
 
         try:
             cert_encoded = base64.b64encode(cert.encode("utf-8")).decode("ascii")
             key = self.client.service.register(cert).applicationkey
         except Exception as e:
-            logger.critical(f'TimeEdit register() call failed for "{wsdl}" (check TE_CERT): {e}')
+            logger.critical('TimeEdit register() call failed for "%s" (check TE_CERT): %s', wsdl, e)
             sys.exit(1)
 
         self.login = {
@@ -51,45 +61,119 @@ class TimeEdit:
             "applicationkey": key,
         }
 
+        # Set by the API and the syncer, see cache.MetadataCache
+        self.cache: "Optional[MetadataCache]" = None
+        # Coalescing of identical concurrent calls, replaced by a SharedGroup in the API
+        self.singleflight: singleflight.Group = singleflight.Group()
+
+    def _call(self, operation: str, **kwargs):
+        """
+        Call a SOAP operation, with retries and circuit breaking (see te_canvas.retry).
+
+        All TimeEdit operations we use are read-only, so all of them are safe to retry.
+        """
+        fn = metrics.timed(metrics.TIMEEDIT_CALL_SECONDS, getattr(self.client.service, operation), operation=operation)
+        with tracing.span(f"timeedit.{operation}", **_span_attributes(kwargs)):
+            return retry.call("timeedit", fn, **kwargs)
+
+    def _cached(self, key: str, fetch):
+        """
+        Look up TimeEdit metadata in the cache, if there is one.
+        """
+
+        def fetch_once():
+            return self.singleflight.do(f"timeedit:{key}", fetch)
+
+        if self.cache is None:
+            return fetch_once()
+        return self.cache.get(key, fetch_once)
+
+    def _cached_many(self, prefix: str, extids: "list[str]", fetch) -> dict:
+        """
+        Look up TimeEdit metadata for several extids in the cache, if there is one, fetching all
+        misses with one call to fetch.
+
+        Returns:
+            Dict from extid to value.
+        """
+
+        def fetch_once(extids: "list[str]") -> dict:
+            return self.singleflight.do(singleflight.key("timeedit", prefix, extids), lambda: fetch(extids))
+
+        if self.cache is None:
+            return fetch_once(list(dict.fromkeys(extids)))
+        n = len(prefix) + 1
+        res = self.cache.get_many(
+            [f"{prefix}:{e}" for e in extids],
+            lambda keys: {f"{prefix}:{e}": v for e, v in fetch_once([k[n:] for k in keys]).items()},
+        )
+        return {k[n:]: v for k, v in res.items()}
+
+    def warm_cache(self, types: "list[str]"):
+        """
+        Fill the metadata cache for the given types, as used by the UI.
+        """
+        self.find_types_all()
+        self.get_types(types)
+        fields = list(self.find_reservation_fields())
+        for t in types:
+            if t == "reservation":
+                continue
+            self.get_search_fields(t)
+            fields += self.find_object_fields(t)
+        self.get_field_defs_many(fields)
+
     def reservation_url(self, id: str) -> str:
         # These query args are not understood in detail, taken blindly from the URL we get when
         # navigating to an event detail page in web view
         static_args = "h=t&sid=4&types=0&fe=0&fr=t&step=0&ef=2&nocache=2"
         result = f"https://cloud.timeedit.net/{self.ID}/web/{self.USERGROUP}/ri.html?id={id}&{static_args}"
-        logger.info("******************* [TimeEdit.reservation_url] *******************")
-        logger.info(f"{result}")
-        logger.info("==================================================================")
+        logger.debug("reservation_url: %s", result)
         return result
 
     def find_types_all(self):
-        res = self.client.service.findTypes(
+        return self._cached("types", self._find_types_all)
+
+    def _find_types_all(self):
+        res = self._call(
+            "findTypes",
             login=self.login,
             ignorealias=False,
         )
         if len(res) == 0:
             logger.warning("te.find_types_all() returned 0 types.")
-        logger.info("******************* [TimeEdit.find_types_all] *******************")
-        logger.info(f"{res}")
-        logger.info("==================================================================")
+        logger.debug("find_types_all: %s", summarize(res))
         return {t["extid"]: t["name"] for t in res + [{"extid": "reservation", "name": "Reservation"}]}
 
     def get_type(self, extid: str):
-        if extid == "reservation":
-            return {"name": "Reservation"}
-        res = self.client.service.getTypes(login=self.login, ignorealias=False, types=[extid])
-        logger.info("******************* [TimeEdit.get_type] *******************")
-        logger.info(f"{res}")
-        logger.info("==================================================================")
-        return res[0] if len(res) > 0 else {"extid": extid, "name": ""}
+        return self.get_types([extid])[extid]
+
+    def get_types(self, extids: "list[str]") -> "dict[str, dict]":
+        """
+        Get several types with one getTypes request.
+
+        Returns:
+            Dict from extid to type. Unknown types have an empty name.
+        """
+        res = {"reservation": {"name": "Reservation"}} if "reservation" in extids else {}
+        extids = [e for e in extids if e != "reservation"]
+        if extids:
+            res |= self._cached_many("type", extids, self._get_types)
+        return res
 
+    def _get_types(self, extids: "list[str]") -> "dict[str, dict]":
+        res = self._call("getTypes", login=self.login, ignorealias=False, types=extids)
+        logger.debug("get_types: %s", summarize(res))
+        found = {t["extid"]: serialize_object(t, dict) for t in res}
+        return {e: found.get(e, {"extid": e, "name": ""}) for e in extids}
 
     def get_sortable_fields(self, type_name: str) -> List[str]:
         """
         Retrieve the external IDs of all sortable fields for a given object type.
 
-        This function queries the TimeEdit API to get all field definitions for a 
+        This function queries the TimeEdit API to get all field definitions for a
         specific object type and filters them to include only fields that are sortable.
-        It uses the walrus operator to serialize each field and check its 'sortable' 
+        It uses the walrus operator to serialize each field and check its 'sortable'
         property in a single step.
 
         Args:
@@ -101,11 +185,11 @@ class TimeEdit:
             List[str]: A list of external IDs (`extid`) of fields that are sortable.
         """
         # Get all field names for the object type
-        all_fields = self.client.service.getAllFields(login=self.login, type=type_name)
-        
+        all_fields = self._call("getAllFields", login=self.login, type=type_name)
+
         # Get detailed field definitions
-        field_defs = self.client.service.getFieldDefs(login=self.login, fields={"field": all_fields})
-        
+        field_defs = self._call("getFieldDefs", login=self.login, fields={"field": all_fields})
+
         # Filter fields to include only those that are sortable
         SEARCH_FIELDS = [
             p["extid"]  # Extract the external ID
@@ -114,23 +198,29 @@ class TimeEdit:
         ]
         return SEARCH_FIELDS
 
-
     def get_search_fields(self, type_name):
-        fields = self.client.service.getPrimaryFields(
-            login=self.login,
-            type=type_name
-        )
+        return self._cached(f"search_fields:{type_name}", lambda: self._get_search_fields(type_name))
+
+    def _get_search_fields(self, type_name):
+        fields = self._call("getPrimaryFields", login=self.login, type=type_name)
 
         if not fields:
             fields = self.get_sortable_fields(type_name)
 
-        return fields
+        return list(fields)
 
     def find_objects(self, type, number_of_objects, begin_index, search_string):
         """Get max 1000 objects of a given type."""
+        return self.singleflight.do(
+            singleflight.key("timeedit.find_objects", type, number_of_objects, begin_index, search_string),
+            lambda: self._find_objects(type, number_of_objects, begin_index, search_string),
+        )
+
+    def _find_objects(self, type, number_of_objects, begin_index, search_string):
         # SEARCH_FIELDS = self.get_sortable_fields(type_name=type)
         SEARCH_FIELDS = self.get_search_fields(type_name=type)
-        resp = self.client.service.findObjects(
+        resp = self._call(
+            "findObjects",
             login=self.login,
             type=type,
             numberofobjects=number_of_objects,
@@ -143,14 +233,22 @@ class TimeEdit:
             # Can't really warn about this generally since this endpoint is used for searching.
             # logger.warning("te.find_objects(${type}, ${number_of_objects}, ${begin_index}, ${search_string}) returned 0 objects.")
             return []
-        logger.info("******************* [TimeEdit.find_objects] *******************")
-        logger.info(f"{resp}")
-        logger.info("==================================================================")
+        logger.debug("find_objects: %s", summarize(resp))
         return list(map(_unpack_object, resp["objects"]["object"]))
 
     def find_objects_all(self, type, search_string):
         """Get all objects of a given type."""
-        n = self.client.service.findObjects(
+        res = list(itertools.chain.from_iterable(self.iter_objects_all(type, search_string)))
+        logger.debug("find_objects_all: %s", summarize(res))
+        return res
+
+    def iter_objects_all(self, type, search_string) -> "Iterator[list[dict]]":
+        """
+        Get all objects of a given type, one page of max 1000 objects at a time. Each page is only
+        requested when the previous one has been consumed.
+        """
+        n = self._call(
+            "findObjects",
             login=self.login,
             type=type,
             numberofobjects=1,
@@ -158,66 +256,78 @@ class TimeEdit:
             generalsearchstring=search_string,
         ).totalnumberofobjects
 
-        num_pages = -(-n // 1000)
-
-        res = []
-        for i in range(num_pages):
-            page = self.find_objects(type, 1000, i * 1000, search_string)
-            res += page
-        logger.info("******************* [TimeEdit.find_objects_all] *******************")
-        logger.info(f"{res}")
-        logger.info("==================================================================")
-        return res
+        for i in range(0, n, 1000):
+            yield self.find_objects(type, 1000, i, search_string)
 
     def find_object_fields(self, extid: "str") -> list:
         """Get fields specification of type"""
-        res = self.client.service.findObjectFields(login=self.login, types=[extid])
-        logger.info("******************* [TimeEdit.find_object_fields] *******************")
-        logger.info(f"{res}")
-        logger.info("==================================================================")
+        return self._cached(f"object_fields:{extid}", lambda: self._find_object_fields(extid))
+
+    def _find_object_fields(self, extid: str) -> list:
+        res = self._call("findObjectFields", login=self.login, types=[extid])
+        logger.debug("find_object_fields: %s", summarize(res))
         return list(res)
 
     def get_field_defs(self, extid: str) -> dict:
-        res = self.client.service.getFieldDefs(login=self.login, fields=[extid])
-        defs = [
-            {"extid": r["extid"], "name": r["name"]}
+        return self.get_field_defs_many([extid])[extid]
+
+    def get_field_defs_many(self, extids: "list[str]") -> "dict[str, dict]":
+        """
+        Get the definitions of several fields with one getFieldDefs request.
+
+        Returns:
+            Dict from extid to field definition. Unknown fields, and the fields in TE_SEARCH_FIELDS
+            and TE_RETURN_FIELDS, map to an empty dict.
+        """
+        if not extids:
+            return {}
+        return self._cached_many("field_defs", extids, self._get_field_defs_many)
+
+    def _get_field_defs_many(self, extids: "list[str]") -> "dict[str, dict]":
+        res = self._call("getFieldDefs", login=self.login, fields=extids)
+        defs = {
+            r["extid"]: {"extid": r["extid"], "name": r["name"]}
             for r in res
             if r["extid"] not in self.SEARCH_FIELDS + self.RETURN_FIELDS
-        ]
-        logger.info("******************* [TimeEdit.get_field_defs] *******************")
-        logger.info(f"{defs}")
-        logger.info("==================================================================")
-        return defs[0] if len(defs) > 0 else {}
+        }
+        logger.debug("get_field_defs_many: %s", summarize(defs))
+        return {e: defs.get(e, {}) for e in extids}
 
     def get_object(self, extid: str) -> Optional[dict]:
         """Get a specific object based on external id."""
-        resp = self.client.service.getObjects(
+        return self.singleflight.do(singleflight.key("timeedit.get_object", extid), lambda: self._get_object(extid))
+
+    def _get_object(self, extid: str) -> Optional[dict]:
+        resp = self._call(
+            "getObjects",
             login=self.login,
             objects={"object": [extid]},
         )
         if resp is None:
             return None
-        logger.info("******************* [TimeEdit.get_object] *******************")
-        logger.info(f"{resp}")
-        logger.info("==================================================================")
+        logger.debug("get_object: %s", summarize(resp))
         return list(map(_unpack_object, resp))[0]
 
     def find_reservation_fields(self):
-        field_defs = self.client.service.findReservationFields(login=self.login)
+        return self._cached("reservation_fields", self._find_reservation_fields)
+
+    def _find_reservation_fields(self):
+        field_defs = self._call("findReservationFields", login=self.login)
 
-        resp =  list(filter(lambda field_def: field_def.split(".")[0] == "res", field_defs))
-        logger.info("******************* [TimeEdit.find_reservation_fields] *******************")
-        logger.info(f"{resp}")
-        logger.info("==================================================================")
+        resp = list(filter(lambda field_def: field_def.split(".")[0] == "res", field_defs))
+        logger.debug("find_reservation_fields: %s", summarize(resp))
         return resp
 
-    def find_reservations_all(self, extids: "list[str]", return_types: "dict[str, list[str]]"):
-        """Get all reservations for a given set of objects."""
-        # If extids is empty, findReservations will return *all* reservations, which is never what
-        # we want
-        if len(extids) == 0:
-            return []
+    def _reservations_query(
+        self, extids: "list[str]", return_types: "dict[str, list[str]]"
+    ) -> "tuple[list[str], dict]":
+        """
+        Build the arguments for findReservations.
 
+        Returns:
+            The reservation fields to return, and the keyword arguments shared by all pages.
+        """
+        return_types = dict(return_types)
         res_return_fields = []
         if "reservation" in return_types:
             res_return_fields = return_types["reservation"]
@@ -232,59 +342,78 @@ class TimeEdit:
                 for te_type, te_fields in return_types.items()
             ]
         }
-        logger.info("******************* [TimeEdit.find_reservations_all.params] *******************")
-        logger.info(f"{extids}")
-        logger.info(f"{return_types}")
-        logger.info("res_return_fields")
-        logger.info(f"{res_return_fields}")
-        logger.info("return_types_packed")
-        logger.info(f"{return_types_packed}")
-        logger.info("==================================================================")
-        
-        n = self.client.service.findReservations(
+        logger.debug(
+            "find_reservations_all: extids %s, return types %s, return fields %s",
+            summarize(extids),
+            return_types,
+            res_return_fields,
+        )
+
+        return res_return_fields, {
+            "login": self.login,
+            "searchobjects": {"object": [{"extid": ext_id} for ext_id in extids]},
+            "returntypes": return_types_packed,
+            "returnfields": {"field": res_return_fields},
+        }
+
+    def find_reservations_all(self, extids: "list[str]", return_types: "dict[str, list[str]]"):
+        """Get all reservations for a given set of objects."""
+        # If extids is empty, findReservations will return *all* reservations, which is never what
+        # we want
+        if len(extids) == 0:
+            return []
+
+        res_return_fields, query = self._reservations_query(extids, return_types)
+
+        n = self._call(
+            "findReservations",
             login=self.login,
-            searchobjects={"object": [{"extid": id} for id in extids]},
+            searchobjects=query["searchobjects"],
             numberofreservations=1,
         ).totalnumberofreservations
 
         num_pages = -(-n // 1000)
 
         reservations = []
-        
+
         try:
             pages = [
-                self.client.service.findReservations(
-                    login=self.login,
-                    searchobjects={"object": [{"extid": ext_id} for ext_id in extids]},
+                self._call(
+                    "findReservations",
                     numberofreservations=1000,
                     beginindex=i * 1000,
-                    returntypes=return_types_packed,
-                    returnfields= {"field": res_return_fields},
-                )["reservations"]["reservation"]
+                    **query,
+                )[
+                    "reservations"
+                ]["reservation"]
                 for i in range(num_pages)
             ]
-            
+
             reservations = list(itertools.chain.from_iterable(pages))
 
+        except retry.CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error("Error in find_reservations_all(%s): %s", extids, e, stack_info=True)
+            # An unavailable TimeEdit must not look like an empty schedule, or the syncer would
+            # clear the course calendar.
+            if retry.is_transient(e):
+                raise
+            logger.error("Error in find_reservations_all(%s): %s", summarize(extids), e, stack_info=True)
             return []
-        
-        if not reservations:
-            logger.warning("find_reservations_all(%s) returned 0 reservations.", extids)
-        
-        unpacked_reservations = []
-        for r in reservations:
-            unpacked_reservations.append(_unpack_reservation(r, res_return_fields))
-        logger.info("******************* [TimeEdit.find_reservations_all] *******************")
-        logger.info(f"{unpacked_reservations}")
-        logger.info("==================================================================")
-        return unpacked_reservations
+
+        return _unpack_reservations(extids, reservations, res_return_fields)
 
 
 # ---- Helper functions --------------------------------------------------------
 
 
+def _span_attributes(kwargs: dict) -> dict:
+    """Tracing attributes of a SOAP call: the page index of paged calls."""
+    if "beginindex" not in kwargs:
+        return {}
+    return {"page": kwargs["beginindex"] // kwargs.get("numberofreservations", 1000)}
+
+
 def _unpack_object(o):
     res = {"extid": o["extid"]}
     for f in o["fields"]["field"]:
@@ -298,21 +427,34 @@ def _parse_datetime(date_str: str, date_format: str = "%Y%m%dT%H%M%S") -> dateti
         return datetime.strptime(date_str, date_format)
     except (ValueError, TypeError):
         return None
-    
+
+
 def _unpack_reservation_object(obj: dict[str, Any]) -> dict[str, Any]:
     """Extracts a structured representation of a reservation object."""
     return {
         "type": getattr(obj, "type", ""),
         "extid": getattr(obj, "extid", ""),
-        "fields": {f["extid"]: f["value"][0] for f in getattr(getattr(obj, "fields", {}), "field", []) if "value" in f}
+        "fields": {f["extid"]: f["value"][0] for f in getattr(getattr(obj, "fields", {}), "field", []) if "value" in f},
     }
-    
+
+
+def _unpack_reservations(extids, reservations, res_return_fields) -> list:
+    if not reservations:
+        logger.warning("find_reservations_all(%s) returned 0 reservations.", summarize(extids))
+
+    unpacked_reservations = []
+    for r in reservations:
+        unpacked_reservations.append(_unpack_reservation(r, res_return_fields))
+    logger.debug("find_reservations_all: %s", summarize(unpacked_reservations))
+    return unpacked_reservations
+
+
 def _unpack_reservation(reservation, res_return_fields):
-            
+
     # Extract reservation objects safely
     objects_attr = getattr(reservation, "objects", {})
     objects = [_unpack_reservation_object(o) for o in getattr(objects_attr, "object", [])]
-    
+
     unpacked_res = {
         "id": getattr(reservation, "id", None),
         "start_at": _parse_datetime(getattr(reservation, "begin", None)),
@@ -323,12 +465,14 @@ def _unpack_reservation(reservation, res_return_fields):
     }
 
     # We may need to add fields from the reservation object.
-    res_return_fields = set(res_return_fields) 
+    res_return_fields = set(res_return_fields)
     # Ensure 'fields' and 'field' exist and are iterable
     fields_attr = getattr(reservation, "fields", {})
     fields = getattr(fields_attr, "field", [])
     if fields:
         field_mapping = {field["extid"]: field["value"][0] for field in fields if "value" in field}
-        unpacked_res.update({res_field: field_mapping[res_field] for res_field in res_return_fields if res_field in field_mapping})
+        unpacked_res.update(
+            {res_field: field_mapping[res_field] for res_field in res_return_fields if res_field in field_mapping}
+        )
 
     return unpacked_res
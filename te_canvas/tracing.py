@@ -0,0 +1,286 @@
+"""
+Lightweight tracing of group syncs, to dissect slow syncs after the fact.
+
+Each sync of a Canvas group is a trace with root span "sync_one". Child spans cover each TimeEdit
+SOAP call (with the page index for paged calls), each Canvas request, each DB session (with the
+number of statements executed) and the translation of reservations to events. The current span is
+held in a context variable, like the sync run of te_canvas.ledger, so spans nest across asyncio
+tasks and across threads given a copy of the context.
+
+Configuration:
+    TRACE_EXPORT:        "file" or "otlp" to enable tracing, off by default.
+    TRACE_FILE:          For "file", path to append traces to, one JSON line per trace.
+    TRACE_OTLP_ENDPOINT: For "otlp", URL of an OTLP/HTTP collector accepting JSON, e.g.
+                         http://collector:4318/v1/traces.
+    TRACE_SAMPLE_RATE:   Fraction of syncs traced, default 0.1.
+    TRACE_SLOW_SECONDS:  If set, also export every sync that takes at least this long, whether
+                         sampled or not. All syncs are then recorded in memory and the decision is
+                         made when the sync ends.
+
+Spans are exported in OTLP's JSON span format from a background thread, so exporting never delays
+a sync. Outside of a trace (e.g. in the API) all functions here are cheap no-ops.
+"""
+
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import requests
+
+from te_canvas.log import get_logger
+
+SERVICE_NAME = "te-canvas-sync"
+
+# Spans recorded per trace at most, beyond that they are counted as dropped on the root span
+MAX_SPANS = 10000
+
+
+class Trace:
+    def __init__(self, sampled: bool):
+        self.trace_id = random.getrandbits(128).to_bytes(16, "big").hex()
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, span: "Span") -> bool:
+        with self.lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return False
+            self.spans.append(span)
+            return True
+
+
+class Span:
+    def __init__(self, trace: Trace, name: str, parent: "Optional[Span]", attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64).to_bytes(8, "big").hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, n: int = 1):
+        self.attributes[name] = self.attributes.get(name, 0) + n
+
+    def otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # Internal
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, n: int = 1):
+        pass
+
+
+NOOP = _NoopSpan()
+
+_current: "ContextVar[Optional[Span]]" = ContextVar("trace_span", default=None)
+
+
+# ---- Configuration and export ------------------------------------------------
+
+
+class Exporter:
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self.mode = os.environ.get("TRACE_EXPORT", "")
+        if self.mode not in ("", "file", "otlp"):
+            self.logger.critical("Invalid TRACE_EXPORT: %s", self.mode)
+            sys.exit(1)
+        try:
+            self.sample_rate = float(os.environ.get("TRACE_SAMPLE_RATE", 0.1))
+            self.slow_seconds = float(os.environ.get("TRACE_SLOW_SECONDS", 0))
+        except ValueError as e:
+            self.logger.critical(f"Invalid env var: {e}")
+            sys.exit(1)
+        self.path = os.environ.get("TRACE_FILE", "traces.jsonl")
+        self.endpoint = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.queue: "queue.Queue[list[Span]]" = queue.Queue(maxsize=100)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != ""
+
+    def export(self, spans: "list[Span]"):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run, name="trace-export", daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.logger.warning("Trace export queue full, dropping trace")
+
+    def __run(self):
+        while True:
+            spans = self.queue.get()
+            try:
+                if self.mode == "file":
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps([s.otlp() for s in spans]) + "\n")
+                else:
+                    requests.post(self.endpoint, json=_otlp_request(spans), timeout=10).raise_for_status()
+            except Exception as e:
+                self.logger.warning("Failed to export trace: %s", e)
+            finally:
+                self.queue.task_done()
+
+
+_exporter: Optional[Exporter] = None
+_exporter_lock = threading.Lock()
+
+
+def exporter() -> Exporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = Exporter()
+        return _exporter
+
+
+# ---- Recording ---------------------------------------------------------------
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator:
+    """
+    Start a new trace with a root span, subject to sampling.
+    """
+    e = exporter()
+    sampled = e.enabled and random.random() < e.sample_rate
+    if not sampled and not (e.enabled and e.slow_seconds > 0):
+        token = _current.set(None)
+        try:
+            yield NOOP
+        finally:
+            _current.reset(token)
+        return
+
+    t = Trace(sampled)
+    root = Span(t, name, None, attributes)
+    t.add(root)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as ex:
+        root.error = type(ex).__name__
+        raise
+    finally:
+        _current.reset(token)
+        root.end_ns = time.time_ns()
+        if t.dropped:
+            root.set(dropped_spans=t.dropped)
+        if t.sampled or (root.end_ns - root.start_ns) / 1e9 >= e.slow_seconds > 0:
+            e.export(t.spans)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator:
+    """
+    A child span of the current span, if there is one.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield NOOP
+        return
+
+    s = Span(parent.trace, name, parent, attributes)
+    if not parent.trace.add(s):
+        yield NOOP
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as ex:
+        s.error = type(ex).__name__
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+
+
+def record(name: str, seconds: float, **attributes):
+    """
+    Record a child span that just ended after seconds, for calls timed elsewhere (response hooks).
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(parent.trace, name, parent, attributes)
+    s.end_ns = time.time_ns()
+    s.start_ns = s.end_ns - int(seconds * 1e9)
+    parent.trace.add(s)
+
+
+def requests_hook(response, *args, **kwargs):
+    """
+    Response hook for the requests Session of canvasapi, recording a span per Canvas request.
+    """
+    record(
+        "canvas.request",
+        response.elapsed.total_seconds(),
+        method=response.request.method,
+        url=response.request.path_url.split("?")[0],
+        status=response.status_code,
+    )
+
+
+def current():
+    """
+    The current span, or a no-op span outside of a trace.
+    """
+    return _current.get() or NOOP
+
+
+# ---- Helper functions --------------------------------------------------------
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _otlp_request(spans: "list[Span]") -> dict:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "te_canvas"}, "spans": [s.otlp() for s in spans]}],
+            }
+        ]
+    }
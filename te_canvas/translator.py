@@ -4,7 +4,7 @@ with templates related to this.
 """
 
 from te_canvas.db import DB
-from te_canvas.log import get_logger
+from te_canvas.log import get_logger, summarize
 from te_canvas.types.config_type import ConfigType
 from te_canvas.types.sync_state import SyncState
 from te_canvas.types.template_config import TemplateConfig
@@ -41,29 +41,20 @@ class Translator:
         Raises:
             TemplateError, if no valid group or default template config.
         """
-        self.logger = get_logger()
+        self.logger = get_logger(__name__)
         self.db = db
         self.timeedit = timeedit
         template_data = self.__get_template_config()
         self.templates = self.__create_templates(template_data)
         self.return_types = self.__create_return_types(self.templates)
-        self.logger.info("===== [Translator] =====")
-        self.logger.info(f"db= {db}")
-        self.logger.info(f"timeedit= {timeedit}")
-        self.logger.info(f"template_data= {template_data}")
-        self.logger.info(f"self.templates = {self.templates }")
-        self.logger.info(f"self.return_types= {self.return_types}")
-        self.logger.info("*********************************************")
-
-        
-        
+        self.logger.debug("Templates: %s, return types: %s", summarize(self.templates), self.return_types)
+
     def __create_templates(self, template) -> dict[str, TemplateConfig]:
         """
         Create templates from db query.
 
         Used for translating timeedit reservations.
         """
-        self.logger.info("== [__create_templates] ==")
         groups_with_config = set(cg for (_, _, _, _, cg) in template)
         # All groups with atleast one config entry.
         groups = {
@@ -95,7 +86,6 @@ class Translator:
 
         Used in API call to timeedit when getting reservations.
         """
-        self.logger.info("== [__create_return_types()] ==")
         return_types = {}
         for key in templates.keys():
             return_types[key] = self.__extract_fields(templates[key])
@@ -171,15 +161,12 @@ class Translator:
         We need atleast one field for each name.
         Else we raise TemplateError.
         """
-        self.logger.info("== [__get_template_config()] ==")
         res = self.db.get_template_config()
-        self.logger.info(f"res=> {res}")
         name_count = set(name for (_, name, _, _, _) in res)
-        self.logger.info(f"name_count=> {name_count}")
-        self.logger.info(f"len(name_count)=> {len(name_count)}")
-        
+        self.logger.debug("Template config: %s, names: %s", summarize(res), name_count)
+
         if len(name_count) < 3:
-            self.logger.info("== [__get_template_config()].TemplateError ==")
+            self.logger.info("Template config has %s of 3 names", len(name_count))
             raise TemplateError
         return res
 
@@ -196,16 +183,15 @@ class Translator:
             for extid, content in te_reservation.items()
             if {"reservation": extid} in template_config[config_type]
         ]
-        
-        self.logger.info("============ __translate_fields ============")
-        self.logger.info(f"canvas_group={canvas_group}")
-        self.logger.info(f"config_type={config_type}")
-        self.logger.info(f"te_reservation={te_reservation}")
-        self.logger.info(f"template_config={template_config}")
-        self.logger.info(f"template_config[config_type]={template_config[config_type]}")
-        self.logger.info(f"te_reservation[objects]={te_reservation['objects']}")      
-        self.logger.info("********************************************")
-        
+
+        self.logger.debug(
+            "%s: Translating %s of %s with %s",
+            canvas_group,
+            config_type,
+            summarize(te_reservation),
+            template_config[config_type],
+        )
+
         # Then iterate over objects in reservation.
         for o in te_reservation["objects"]:
             te_type = o["type"]